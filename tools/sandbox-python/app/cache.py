@@ -0,0 +1,72 @@
+"""Response cache for read endpoints, keyed by simulation state version."""
+
+from __future__ import annotations
+
+import json
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+def normalize_variables(variables: Any) -> str:
+    """Canonical string form of request variables, independent of key order."""
+    if not variables:
+        return ""
+    return json.dumps(variables, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ResponseCache:
+    """Bounded LRU of serialized responses.
+
+    Keys are (operation, normalized variables); each entry remembers the
+    state tag it was computed at and only hits while the caller presents the
+    same tag. State only changes once per tick, so N clients polling the same
+    query cost one computation per change. A stale entry is replaced in
+    place the first time it is asked for at a newer tag.
+    """
+
+    __slots__ = ("max_entries", "_entries", "hits", "misses", "evictions", "invalidations")
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], tuple[Any, bytes]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, op: str, variables: Any, state: Any, compute: Callable[[], bytes]) -> bytes:
+        key = (op, normalize_variables(variables))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == state:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.invalidations += 1
+
+        self.misses += 1
+        payload = compute()
+        self._entries[key] = (state, payload)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return payload
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+        }
@@ -0,0 +1,79 @@
+"""JSON to bytes for responses and stream frames, via orjson when installed."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Iterable
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: pip install ".[fast]"
+    orjson = None
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+if orjson is not None:
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content)
+
+else:
+
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dumps``.
+
+    Returned directly from an endpoint it also skips FastAPI's
+    ``jsonable_encoder`` pass, so content must already be plain JSON types.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def dumps_array(items: list[bytes]) -> bytes:
+    """JSON array from already-encoded elements."""
+    return b"[" + b",".join(items) + b"]"
+
+
+def sse_frame(payload: bytes, id: str | None = None) -> bytes:
+    """A complete ``data:`` server-sent event around an encoded JSON payload."""
+    if id is None:
+        return b"data: " + payload + b"\r\n\r\n"
+    return b"id: " + id.encode() + b"\r\ndata: " + payload + b"\r\n\r\n"
+
+
+async def iter_json(items: Iterable[bytes], ndjson: bool = False, chunk_bytes: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """A JSON array (or NDJSON lines) of encoded elements, in chunks of about ``chunk_bytes``.
+
+    ``items`` is consumed as the chunks are sent, so only one chunk is held
+    at a time; the event loop gets a turn between chunks.
+    """
+    parts = [] if ndjson else [b"["]
+    size = 0
+    first = True
+    for item in items:
+        if ndjson:
+            parts += (item, b"\n")
+        else:
+            if not first:
+                parts.append(b",")
+            parts.append(item)
+        first = False
+        size += len(item) + 1
+        if size >= chunk_bytes:
+            yield b"".join(parts)
+            parts = []
+            size = 0
+            await asyncio.sleep(0)
+    if not ndjson:
+        parts.append(b"]")
+    if parts:
+        yield b"".join(parts)
@@ -0,0 +1,373 @@
+"""Tick engine thread and the read-only snapshots the read endpoints serve from."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+from .metrics import AcpMetricsSnapshot
+from .query import EventIndex, IndexSnapshot
+from .store import ChangeLog, CreditLedgerSnapshot, LogPrefix, MessageLogSnapshot
+from .types import MetricsSnapshot, SandboxAgent, SandboxEvent, SandboxTask, TaskStatus
+
+if TYPE_CHECKING:
+    from .simulation import Simulation
+    from .stream import StreamItem
+
+T = TypeVar("T")
+
+log = logging.getLogger(__name__)
+
+
+# ── State tags ───────────────────────────────────────────────────────────────
+
+
+class StateView:
+    """Version tags and org lookups shared by the live simulation and its snapshots."""
+
+    __slots__ = ()
+
+    epoch: str
+    version: int
+    collection_versions: dict[str, int]
+    agents_by_id: dict[str, SandboxAgent]
+
+    @property
+    def state_tag(self) -> str:
+        """Opaque identifier of the current state, unique across instances."""
+        return f"{self.epoch}.{self.version}"
+
+    def collection_tag(self, *collections: str) -> str:
+        """Like ``state_tag``, but only moves when one of ``collections`` changes.
+
+        With no collections this is the global ``state_tag``.
+        """
+        if not collections:
+            return self.state_tag
+        versions = self.collection_versions
+        return f"{self.epoch}.{max(versions[c] for c in collections)}"
+
+    def cursor_version(self, cursor: str) -> int | None:
+        """Version encoded in a ``state_tag``/``collection_tag`` cursor.
+
+        A bare integer is taken as a version of the current epoch. Returns
+        None for a cursor from another epoch; raises ValueError if malformed.
+        """
+        epoch, _, version = cursor.rpartition(".")
+        if epoch and epoch != self.epoch:
+            return None
+        return int(version)
+
+    def lineage(self, agent_id: str) -> tuple[str, ...]:
+        """``agent_id`` followed by its managers up to the root."""
+        chain = [agent_id]
+        agent = self.agents_by_id.get(agent_id)
+        while agent is not None and agent.parent_id and agent.parent_id not in chain:
+            chain.append(agent.parent_id)
+            agent = self.agents_by_id.get(agent.parent_id)
+        return tuple(chain)
+
+
+# ── Snapshots ────────────────────────────────────────────────────────────────
+
+
+def freeze_agent(agent: SandboxAgent) -> SandboxAgent:
+    """A copy of ``agent`` that later ticks cannot reach, with an empty projection cache."""
+    return replace(
+        agent,
+        task_ids=list(agent.task_ids),
+        trigger_on=list(agent.trigger_on) if agent.trigger_on is not None else None,
+        inbox=agent.inbox.copy(),
+        stats=replace(agent.stats),
+        _projection=None,
+        _projection_version=-1,
+        _encoded=None,
+        _selections=None,
+        _selections_version=-1,
+    )
+
+
+def freeze_task(task: SandboxTask) -> SandboxTask:
+    return replace(
+        task,
+        depends_on=list(task.depends_on) if task.depends_on is not None else None,
+        subtask_ids=list(task.subtask_ids) if task.subtask_ids is not None else None,
+        _projection=None,
+        _projection_version=-1,
+        _encoded=None,
+        _selections=None,
+        _selections_version=-1,
+    )
+
+
+def _freeze_all(entities: list, previous: dict | None, freeze: Callable) -> tuple[tuple, dict]:
+    """Frozen copies of ``entities``, reusing the previous copy of each unchanged one."""
+    frozen = []
+    for entity in entities:
+        old = previous.get(entity.id) if previous else None
+        frozen.append(old if old is not None and old.version == entity.version else freeze(entity))
+    return tuple(frozen), {e.id: e for e in frozen}
+
+
+class Snapshot(StateView):
+    """Read-only state of a simulation at one version.
+
+    Attribute names match ``Simulation``, so read paths take either. Agents
+    and tasks are frozen copies; a snapshot reuses the previous snapshot's
+    copy of every entity whose version has not moved, and its whole
+    collection when nothing in it changed, so taking one costs the changed
+    entities plus one pass over the collection. Copies also carry the API
+    projection cache, which therefore survives from one snapshot to the next.
+    Logs are views bounded at their length when the snapshot was taken.
+
+    Snapshots are not deep copies. The logs, the event index and the filter
+    indexes' id -> position maps are shared with the simulation, which keeps
+    appending to them on the engine thread. That is safe because every read
+    through a snapshot stops at the log or collection length recorded when it
+    was taken, and appending never changes anything below that bound.
+    Whatever the simulation changes in place (entities, change logs, index
+    groups, task activity) is copied instead.
+    """
+
+    __slots__ = (
+        "epoch",
+        "version",
+        "generation",
+        "tick",
+        "tick_interval_ms",
+        "collection_versions",
+        "agents",
+        "agents_by_id",
+        "tasks",
+        "tasks_by_id",
+        "task_status_counts",
+        "events",
+        "metrics_history",
+        "messages",
+        "credits",
+        "changes",
+        "acp",
+        "agent_index",
+        "task_index",
+        "event_index",
+    )
+
+    epoch: str
+    version: int
+    generation: int
+    tick: int
+    tick_interval_ms: int
+    collection_versions: dict[str, int]
+    agents: tuple[SandboxAgent, ...]
+    agents_by_id: dict[str, SandboxAgent]
+    tasks: tuple[SandboxTask, ...]
+    tasks_by_id: dict[str, SandboxTask]
+    task_status_counts: dict[TaskStatus, int]
+    events: LogPrefix[SandboxEvent]
+    metrics_history: LogPrefix[MetricsSnapshot]
+    messages: MessageLogSnapshot
+    credits: CreditLedgerSnapshot
+    changes: dict[str, ChangeLog]
+    acp: AcpMetricsSnapshot
+    agent_index: IndexSnapshot
+    task_index: IndexSnapshot
+    event_index: EventIndex
+
+    @classmethod
+    def of(cls, sim: Simulation, previous: Snapshot | None = None, now_ms: int = 0, frozen: bool = False) -> Snapshot:
+        """Snapshot ``sim``; call from the thread that owns it.
+
+        ``frozen`` says the entities and change logs of ``sim`` are never
+        modified in place (a ``Replica``), so they are shared, not copied.
+        """
+        snap = cls()
+        snap.epoch = sim.epoch
+        snap.version = sim.version
+        snap.generation = sim.generation
+        snap.tick = sim.tick
+        snap.tick_interval_ms = sim.tick_interval_ms
+        versions = snap.collection_versions = dict(sim.collection_versions)
+        if previous is not None and (previous.epoch, previous.generation) != (sim.epoch, sim.generation):
+            previous = None
+
+        def unchanged(collection: str) -> bool:
+            return previous is not None and previous.collection_versions[collection] == versions[collection]
+
+        if unchanged("agents"):
+            snap.agents, snap.agents_by_id = previous.agents, previous.agents_by_id
+        elif frozen:
+            snap.agents, snap.agents_by_id = tuple(sim.agents), dict(sim.agents_by_id)
+        else:
+            snap.agents, snap.agents_by_id = _freeze_all(sim.agents, previous and previous.agents_by_id, freeze_agent)
+        if unchanged("tasks"):
+            snap.tasks, snap.tasks_by_id = previous.tasks, previous.tasks_by_id
+            snap.task_status_counts = previous.task_status_counts
+        else:
+            if frozen:
+                snap.tasks, snap.tasks_by_id = tuple(sim.tasks), dict(sim.tasks_by_id)
+            else:
+                snap.tasks, snap.tasks_by_id = _freeze_all(sim.tasks, previous and previous.tasks_by_id, freeze_task)
+            snap.task_status_counts = dict(sim.task_status_counts)
+        snap.changes = {
+            name: previous.changes[name] if unchanged(name) else log if frozen else log.copy()
+            for name, log in sim.changes.items()
+        }
+        snap.events = LogPrefix(sim.events)
+        snap.metrics_history = LogPrefix(sim.metrics_history)
+        snap.messages = sim.messages.snapshot()
+        snap.credits = sim.credits.snapshot()
+        snap.acp = sim.acp.snapshot(now_ms or int(time.time() * 1000))
+        snap.agent_index = sim.agent_index.snapshot()
+        snap.task_index = sim.task_index.snapshot()
+        snap.event_index = sim.event_index
+        return snap
+
+
+# ── Engine ───────────────────────────────────────────────────────────────────
+
+
+class Engine:
+    """Runs a simulation on a dedicated thread; the event loop only reads snapshots.
+
+    Ticks and queued commands (``submit``) run on the engine thread, so
+    nothing else mutates the simulation. After each one the engine takes a
+    snapshot and hands it, with the stream items produced meanwhile, to the
+    event loop through ``call_soon_threadsafe``: handlers serve the latest
+    snapshot without waiting for a tick, and stream subscribers are still
+    only touched from the loop. A command's result is delivered after its
+    snapshot, so a client that sees its write acknowledged reads it back.
+
+    A tick that raises is logged and counted, and the engine keeps ticking.
+    If the thread exits anyway, queued and later commands fail instead of
+    waiting forever.
+    """
+
+    __slots__ = ("sim", "loop", "snapshot", "_commands", "_thread", "_running", "ticks", "commands", "tick_errors", "last_tick_ms")
+
+    def __init__(self, sim: Simulation, loop: asyncio.AbstractEventLoop) -> None:
+        self.sim = sim
+        self.loop = loop
+        sim.outbox = []
+        self.snapshot = sim.snapshot()
+        sim.hub.lineage = lambda agent_id: self.snapshot.lineage(agent_id)
+        self._commands: queue.SimpleQueue[tuple[Callable[[Simulation], Any], asyncio.Future] | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self.ticks = 0
+        self.commands = 0
+        self.tick_errors = 0
+        self.last_tick_ms = 0.0
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="simulation-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._commands.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, command: Callable[[Simulation], T]) -> asyncio.Future[T]:
+        """Queue ``command(sim)`` for the engine thread; call from the event loop."""
+        future = self.loop.create_future()
+        self._commands.put((command, future))
+        if not self._running:
+            self._fail_pending()
+        return future
+
+    def _run(self) -> None:
+        try:
+            self._loop()
+        except Exception:
+            log.exception("simulation engine stopped")
+        finally:
+            self._running = False
+            self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        while True:
+            try:
+                item = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                try:
+                    self.loop.call_soon_threadsafe(_resolve, item[1], None, RuntimeError("simulation engine is not running"))
+                except RuntimeError:  # the loop is already closed
+                    return
+
+    def _loop(self) -> None:
+        next_tick = time.monotonic()
+        while self._running:
+            wait = next_tick - time.monotonic()
+            if wait <= 0:
+                started = time.perf_counter()
+                try:
+                    self.sim.step()
+                except Exception:
+                    # Publish whatever the tick changed before it failed.
+                    self.tick_errors += 1
+                    log.exception("tick %d failed", self.sim.tick)
+                self.last_tick_ms = (time.perf_counter() - started) * 1000
+                self.ticks += 1
+                self._publish(self.sim.tick)
+                next_tick = time.monotonic() + self.sim.tick_interval_ms / 1000
+                continue
+            try:
+                item = self._commands.get(timeout=wait)
+            except queue.Empty:
+                continue
+            if item is None:
+                continue
+            command, future = item
+            try:
+                result, error = command(self.sim), None
+            except Exception as exc:
+                result, error = None, exc
+            self.commands += 1
+            try:
+                self._publish()
+            except BaseException:
+                self.loop.call_soon_threadsafe(_resolve, future, None, RuntimeError("simulation engine is not running"))
+                raise
+            self.loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    def _publish(self, tick: int | None = None) -> None:
+        sim = self.sim
+        items, sim.outbox = sim.outbox, []
+        self.loop.call_soon_threadsafe(self._deliver, sim.snapshot(), items, tick)
+
+    def _deliver(self, snapshot: Snapshot, items: list[StreamItem], tick: int | None) -> None:
+        self.snapshot = snapshot
+        hub = self.sim.hub
+        for item in items:
+            hub.publish(item)
+        if tick is not None:
+            hub.flush(tick)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._running,
+            "ticks": self.ticks,
+            "commands": self.commands,
+            "tickErrors": self.tick_errors,
+            "lastTickMs": round(self.last_tick_ms, 2),
+            "snapshotVersion": self.snapshot.version,
+        }
+
+
+def _resolve(future: asyncio.Future, result: Any, error: Exception | None) -> None:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
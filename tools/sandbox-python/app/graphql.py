@@ -0,0 +1,385 @@
+"""Minimal GraphQL document parser, parsed-document cache and field selection.
+
+Covers the executable subset the dashboard sends: operations with variable
+definitions, fields with aliases and arguments, nested selection sets,
+named and inline fragments, and the @skip / @include directives. There is
+no schema: selections are applied to the dicts the handlers return, and a
+selected field missing from the data resolves to null.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+
+class GraphQLSyntaxError(ValueError):
+    pass
+
+
+@dataclass(slots=True, frozen=True)
+class Variable:
+    name: str
+
+
+@dataclass(slots=True, frozen=True)
+class Field:
+    name: str
+    alias: str
+    arguments: tuple[tuple[str, Any], ...] = ()
+    directives: tuple[tuple[str, tuple[tuple[str, Any], ...]], ...] = ()
+    selections: tuple[Field, ...] = ()
+
+
+@dataclass(slots=True, frozen=True)
+class Operation:
+    type: str
+    name: str
+    selections: tuple[Field, ...]
+
+
+@dataclass(slots=True, frozen=True)
+class Document:
+    operations: tuple[Operation, ...]
+
+    def operation(self, name: str | None = None) -> Operation | None:
+        """The operation called ``name``, or the only one when ``name`` is empty."""
+        if name:
+            return next((op for op in self.operations if op.name == name), None)
+        return self.operations[0] if len(self.operations) == 1 else None
+
+
+# ── Lexer ────────────────────────────────────────────────────────────────────
+
+_TOKEN = re.compile(
+    r"""
+    (?P<ignore>[\s,\ufeff]+|\#[^\n\r]*)
+  | (?P<spread>\.\.\.)
+  | (?P<punct>[!$():=@\[\]{}|&])
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<block>\"\"\"(?:[^"\\]|\\.|"(?!""))*\"\"\")
+  | (?P<string>"(?:[^"\\\n\r]|\\.)*")
+    """,
+    re.VERBOSE,
+)
+
+
+def _tokenize(source: str) -> list[tuple[str, str]]:
+    tokens: list[tuple[str, str]] = []
+    pos = 0
+    while pos < len(source):
+        match = _TOKEN.match(source, pos)
+        if match is None:
+            raise GraphQLSyntaxError(f"Unexpected character {source[pos]!r} at {pos}")
+        kind = match.lastgroup
+        if kind != "ignore":
+            tokens.append((kind, match.group()))
+        pos = match.end()
+    return tokens
+
+
+# ── Parser ───────────────────────────────────────────────────────────────────
+
+
+class _Parser:
+    __slots__ = ("tokens", "pos", "fragments")
+
+    def __init__(self, source: str) -> None:
+        self.tokens = _tokenize(source)
+        self.pos = 0
+        self.fragments: dict[str, tuple] = {}
+
+    def peek(self, value: str | None = None, kind: str | None = None) -> bool:
+        if self.pos >= len(self.tokens):
+            return False
+        tok_kind, tok_value = self.tokens[self.pos]
+        return (value is None or tok_value == value) and (kind is None or tok_kind == kind)
+
+    def take(self, value: str | None = None, kind: str | None = None) -> str:
+        if not self.peek(value, kind):
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of document"
+            raise GraphQLSyntaxError(f"Expected {value or kind}, found {found!r}")
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def skip(self, value: str) -> bool:
+        if self.peek(value):
+            self.pos += 1
+            return True
+        return False
+
+    def document(self) -> Document:
+        raw_operations: list[tuple[str, str, tuple]] = []
+        while self.pos < len(self.tokens):
+            if self.peek("{"):
+                raw_operations.append(("query", "", self.selection_set()))
+            elif self.peek("fragment"):
+                self.take()
+                name = self.take(kind="name")
+                self.take("on")
+                self.take(kind="name")
+                self.directives()
+                self.fragments[name] = self.selection_set()
+            elif self.peek("query") or self.peek("mutation") or self.peek("subscription"):
+                op_type = self.take()
+                name = self.take(kind="name") if self.peek(kind="name") else ""
+                if self.peek("("):
+                    self.variable_definitions()
+                self.directives()
+                raw_operations.append((op_type, name, self.selection_set()))
+            else:
+                raise GraphQLSyntaxError(f"Unexpected {self.tokens[self.pos][1]!r}")
+        if not raw_operations:
+            raise GraphQLSyntaxError("Document contains no operations")
+        return Document(tuple(Operation(t, n, self.resolve(sel, ())) for t, n, sel in raw_operations))
+
+    def variable_definitions(self) -> None:
+        self.take("(")
+        while not self.skip(")"):
+            self.take("$")
+            self.take(kind="name")
+            self.take(":")
+            self.type_ref()
+            if self.skip("="):
+                self.value()
+            self.directives()
+
+    def type_ref(self) -> None:
+        if self.skip("["):
+            self.type_ref()
+            self.take("]")
+        else:
+            self.take(kind="name")
+        self.skip("!")
+
+    def selection_set(self) -> tuple:
+        """Raw selections: Field (with raw children) or ("spread", name)."""
+        self.take("{")
+        selections: list = []
+        while not self.skip("}"):
+            if self.skip("..."):
+                if self.peek(kind="name") and not self.peek("on"):
+                    selections.append(("spread", self.take()))
+                    self.directives()
+                else:
+                    if self.skip("on"):
+                        self.take(kind="name")
+                    self.directives()
+                    selections.extend(self.selection_set())
+                continue
+            alias = name = self.take(kind="name")
+            if self.skip(":"):
+                name = self.take(kind="name")
+            arguments = self.arguments() if self.peek("(") else ()
+            directives = self.directives()
+            children = self.selection_set() if self.peek("{") else ()
+            selections.append(Field(name, alias, arguments, directives, children))
+        return tuple(selections)
+
+    def arguments(self) -> tuple[tuple[str, Any], ...]:
+        self.take("(")
+        args = []
+        while not self.skip(")"):
+            name = self.take(kind="name")
+            self.take(":")
+            args.append((name, self.value()))
+        return tuple(args)
+
+    def directives(self) -> tuple[tuple[str, tuple[tuple[str, Any], ...]], ...]:
+        directives = []
+        while self.skip("@"):
+            name = self.take(kind="name")
+            directives.append((name, self.arguments() if self.peek("(") else ()))
+        return tuple(directives)
+
+    def value(self) -> Any:
+        if self.skip("$"):
+            return Variable(self.take(kind="name"))
+        if self.skip("["):
+            items = []
+            while not self.skip("]"):
+                items.append(self.value())
+            return items
+        if self.skip("{"):
+            obj = {}
+            while not self.skip("}"):
+                key = self.take(kind="name")
+                self.take(":")
+                obj[key] = self.value()
+            return obj
+        if self.peek(kind="number"):
+            text = self.take()
+            return float(text) if any(c in text for c in ".eE") else int(text)
+        if self.peek(kind="string"):
+            return json.loads(self.take())
+        if self.peek(kind="block"):
+            return self.take()[3:-3]
+        word = self.take(kind="name")
+        return {"true": True, "false": False, "null": None}.get(word, word)
+
+    def resolve(self, selections: tuple, visiting: tuple[str, ...]) -> tuple[Field, ...]:
+        """Inline fragment spreads and merge fields sharing a response key."""
+        merged: dict[str, Field] = {}
+        for item in selections:
+            if isinstance(item, tuple):
+                name = item[1]
+                if name in visiting:
+                    raise GraphQLSyntaxError(f"Fragment {name!r} spreads itself")
+                if name not in self.fragments:
+                    raise GraphQLSyntaxError(f"Unknown fragment {name!r}")
+                fields = self.resolve(self.fragments[name], visiting + (name,))
+            else:
+                fields = (Field(item.name, item.alias, item.arguments, item.directives, self.resolve(item.selections, visiting)),)
+            for f in fields:
+                existing = merged.get(f.alias)
+                if existing is not None and (existing.selections or f.selections):
+                    f = Field(f.name, f.alias, f.arguments, f.directives, self.resolve(existing.selections + f.selections, visiting))
+                merged[f.alias] = f
+        return tuple(merged.values())
+
+
+def parse(source: str) -> Document:
+    return _Parser(source).document()
+
+
+# ── Execution helpers ────────────────────────────────────────────────────────
+
+
+def resolve_value(value: Any, variables: dict[str, Any]) -> Any:
+    if isinstance(value, Variable):
+        return variables.get(value.name)
+    if isinstance(value, list):
+        return [resolve_value(v, variables) for v in value]
+    if isinstance(value, dict):
+        return {k: resolve_value(v, variables) for k, v in value.items()}
+    return value
+
+
+def field_arguments(field: Field, variables: dict[str, Any]) -> dict[str, Any]:
+    return {name: resolve_value(value, variables) for name, value in field.arguments}
+
+
+def _included(field: Field, variables: dict[str, Any]) -> bool:
+    for name, args in field.directives:
+        condition = bool(resolve_value(dict(args).get("if"), variables))
+        if (name == "skip" and condition) or (name == "include" and not condition):
+            return False
+    return True
+
+
+Plan = tuple[tuple[str, str, "Plan | None"], ...]
+
+
+def compile_plan(fields: tuple[Field, ...], variables: dict[str, Any]) -> Plan:
+    """Resolve directives once per request into hashable (alias, name, sub-plan) triples."""
+    return tuple(
+        (f.alias, f.name, compile_plan(f.selections, variables) if f.selections else None)
+        for f in fields
+        if _included(f, variables)
+    )
+
+
+class Selection:
+    """A compiled plan plus a string key, for cheap memo lookups.
+
+    Nested tuples rehash on every dict lookup; a string caches its hash.
+    """
+
+    __slots__ = ("plan", "key")
+
+    def __init__(self, plan: Plan) -> None:
+        self.plan = plan
+        self.key = repr(plan)
+
+
+def pick(value: Any, plan: Plan) -> Any:
+    """Shape ``value`` to a compiled plan, recursing into lists and sub-objects."""
+    if isinstance(value, list):
+        if all(sub is None for _, _, sub in plan):
+            return [{alias: item.get(name) for alias, name, _ in plan} if isinstance(item, dict) else item for item in value]
+        return [pick(item, plan) for item in value]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    get = value.get
+    for alias, name, sub in plan:
+        v = get(name)
+        out[alias] = v if sub is None or v is None else pick(v, sub)
+    return out
+
+
+def select(value: Any, fields: tuple[Field, ...], variables: dict[str, Any]) -> Any:
+    """Shape ``value`` to ``fields``: pick and alias keys, recursing into lists."""
+    if not fields:
+        return value
+    return pick(value, compile_plan(fields, variables))
+
+
+def select_data(result: dict[str, Any], fields: tuple[Field, ...], variables: dict[str, Any]) -> dict[str, Any]:
+    """Shape a handler result to the operation's root fields.
+
+    Root fields the handler did not produce are left out. A lone root field
+    whose name differs from the handler's lone key still receives its value,
+    so operations keep working under either root name.
+    """
+    if not result:
+        return result
+    if len(fields) == 1 and len(result) == 1 and fields[0].name not in result:
+        (value,) = result.values()
+        return {fields[0].alias: select(value, fields[0].selections, variables)}
+    return {
+        f.alias: select(result[f.name], f.selections, variables)
+        for f in fields
+        if f.name in result and _included(f, variables)
+    }
+
+
+# ── Document cache ───────────────────────────────────────────────────────────
+
+
+def query_hash(query: str) -> str:
+    """SHA-256 hex digest, as used by automatic persisted queries."""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class DocumentCache:
+    """LRU of parsed documents keyed by the SHA-256 of their source.
+
+    Doubles as the persisted-query store: a client that has sent a query
+    once can afterwards send just its hash.
+    """
+
+    __slots__ = ("max_entries", "_docs", "hits", "misses")
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self.max_entries = max_entries
+        self._docs: OrderedDict[str, Document] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def get(self, digest: str) -> Document | None:
+        doc = self._docs.get(digest)
+        if doc is not None:
+            self._docs.move_to_end(digest)
+            self.hits += 1
+        return doc
+
+    def parse(self, query: str) -> tuple[str, Document]:
+        """Parse ``query`` (or reuse the cached document); returns (hash, document)."""
+        digest = query_hash(query)
+        doc = self.get(digest)
+        if doc is None:
+            self.misses += 1
+            doc = parse(query)
+            self._docs[digest] = doc
+            if len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+        return digest, doc
@@ -2,10 +2,16 @@
 
 from __future__ import annotations
 
-import time
-from typing import Any
+from datetime import datetime, timezone
+from typing import Any, Callable
 
-from .types import ACPMessage, SandboxAgent, SandboxEvent, SandboxTask
+from .encoding import dumps
+from .graphql import Selection, pick
+from .types import ACPMessage, CreditEntry, MetricsSnapshot, SandboxAgent, SandboxEvent, SandboxTask
+
+
+# Distinct GraphQL selections remembered per entity before the memo is reset.
+MAX_SELECTIONS_PER_ENTITY = 8
 
 
 # ── Domain → Team mapping ────────────────────────────────────────────────────
@@ -40,6 +46,45 @@ def _reputation_level(level: int) -> str:
     return "NEW"
 
 
+# ── Lookup context ───────────────────────────────────────────────────────────
+
+
+class LookupContext:
+    """Lookup tables built once per request and shared by every mapper call.
+
+    Mappers resolve agent ids through ``agents_by_id`` instead of scanning the
+    agent list per item, and memoize team ids and reputation levels, so
+    mapping n items against m agents costs O(n + m) rather than O(n·m).
+    """
+
+    __slots__ = ("agents", "agents_by_id", "_team_ids", "_reputation_levels")
+
+    def __init__(self, agents: list[SandboxAgent], agents_by_id: dict[str, SandboxAgent] | None = None) -> None:
+        self.agents = agents
+        self.agents_by_id = agents_by_id if agents_by_id is not None else {a.id: a for a in agents}
+        self._team_ids: dict[str, str] = {}
+        self._reputation_levels: dict[int, str] = {}
+
+    def agent(self, agent_id: str | None) -> SandboxAgent | None:
+        return self.agents_by_id.get(agent_id) if agent_id else None
+
+    def agent_name(self, agent_id: str, default: str | None = None) -> str | None:
+        agent = self.agents_by_id.get(agent_id)
+        return agent.name if agent else default
+
+    def team_id(self, domain: str) -> str:
+        team_id = self._team_ids.get(domain)
+        if team_id is None:
+            team_id = self._team_ids[domain] = _domain_to_team_id(domain)
+        return team_id
+
+    def reputation_level(self, level: int) -> str:
+        rep = self._reputation_levels.get(level)
+        if rep is None:
+            rep = self._reputation_levels[level] = _reputation_level(level)
+        return rep
+
+
 TASK_STATUS_MAP: dict[str, str] = {
     "backlog": "BACKLOG",
     "pending": "TODO",
@@ -64,10 +109,40 @@ ACP_ICON: dict[str, str] = {
 # ── Agent mapper ─────────────────────────────────────────────────────────────
 
 
-def map_agent(agent: SandboxAgent, all_agents: list[SandboxAgent]) -> dict[str, Any]:
-    trust_score = min(100, 30 + agent.level * 7 + agent.stats.tasks_completed * 2)
-    now_iso = _iso_now()
-    thirty_days_ago = _iso(time.time() - 30 * 86400)
+def map_agent(agent: SandboxAgent, ctx: LookupContext) -> dict[str, Any]:
+    """Cached projection of ``agent``; rebuilt only after its version changes.
+
+    The returned dict is shared between requests and must not be mutated.
+    """
+    if agent._projection is not None and agent._projection_version == agent.version:
+        return agent._projection
+    projection = _project_agent(agent, ctx)
+    agent._projection = projection
+    agent._projection_version = agent.version
+    agent._encoded = None
+    return projection
+
+
+def encode_agent(agent: SandboxAgent, ctx: LookupContext) -> bytes:
+    """``map_agent`` as JSON bytes, cached alongside the projection."""
+    projection = map_agent(agent, ctx)
+    if agent._encoded is None:
+        agent._encoded = dumps(projection)
+    return agent._encoded
+
+
+def select_agent(agent: SandboxAgent, ctx: LookupContext, selection: Selection) -> dict[str, Any]:
+    """GraphQL selection of ``map_agent``, memoized per version.
+
+    Picked from the cached projection when there is one; otherwise only the
+    selected fields are built.
+    """
+    return _memo_selection(agent, ctx, selection, AGENT_FIELDS)
+
+
+def _project_agent(agent: SandboxAgent, ctx: LookupContext) -> dict[str, Any]:
+    score = trust_score(agent)
+    updated_at = _iso_ms(agent.updated_at)
 
     return {
         "id": agent.id,
@@ -83,17 +158,17 @@ def map_agent(agent: SandboxAgent, all_agents: list[SandboxAgent]) -> dict[str,
         "budgetPeriodLimit": 10000,
         "budgetPeriodSpent": agent.stats.credits_spent,
         "managementFeePct": 5 if agent.level >= 9 else 10,
-        "createdAt": thirty_days_ago,
-        "updatedAt": now_iso,
+        "createdAt": _iso_ms(agent.created_at),
+        "updatedAt": updated_at,
         "parentId": None if agent.parent_id == "human-principal" else agent.parent_id,
         "domain": agent.domain,
-        "trustScore": trust_score,
-        "reputationLevel": _reputation_level(agent.level),
+        "trustScore": score,
+        "reputationLevel": ctx.reputation_level(agent.level),
         "tasksCompleted": agent.stats.tasks_completed,
         "tasksSuccessful": agent.stats.tasks_completed,
-        "lastActivityAt": now_iso,
+        "lastActivityAt": updated_at,
         "lastPromotionAt": None,
-        "teamId": _domain_to_team_id(agent.domain),
+        "teamId": ctx.team_id(agent.domain),
         "avatar": agent.avatar,
         "avatarColor": agent.avatar_color,
         "avatarUrl": agent.avatar_url,
@@ -101,14 +176,58 @@ def map_agent(agent: SandboxAgent, all_agents: list[SandboxAgent]) -> dict[str,
         "trigger": agent.trigger.value,
         "triggerOn": [t.value for t in agent.trigger_on] if agent.trigger_on else None,
         "inboxSize": len(agent.inbox),
+        "inboxCapacity": agent.inbox.capacity,
+        "inboxPolicy": agent.inbox.policy.value,
+        "inboxDropped": agent.inbox.dropped,
+        "inboxCoalesced": agent.inbox.coalesced,
+        "inboxRejected": agent.inbox.rejected,
+        "inboxConsumed": agent.inbox.consumed,
+        "version": agent.version,
     }
 
 
 # ── Task mapper ──────────────────────────────────────────────────────────────
 
 
-def map_task(task: SandboxTask, agents: list[SandboxAgent]) -> dict[str, Any]:
-    assignee = next((a for a in agents if a.id == task.assignee_id), None) if task.assignee_id else None
+def map_task(task: SandboxTask, ctx: LookupContext) -> dict[str, Any]:
+    """Cached projection of ``task``; rebuilt only after its version changes.
+
+    The returned dict is shared between requests and must not be mutated.
+    """
+    if task._projection is not None and task._projection_version == task.version:
+        return task._projection
+    projection = _project_task(task, ctx)
+    task._projection = projection
+    task._projection_version = task.version
+    task._encoded = None
+    return projection
+
+
+def encode_task(task: SandboxTask, ctx: LookupContext) -> bytes:
+    """``map_task`` as JSON bytes, cached alongside the projection."""
+    projection = map_task(task, ctx)
+    if task._encoded is None:
+        task._encoded = dumps(projection)
+    return task._encoded
+
+
+def stream_task(task: SandboxTask, ctx: LookupContext) -> bytes:
+    """``encode_task`` for streamed lists: reuses current cached bytes but caches nothing new.
+
+    Streaming a collection nobody has read yet then leaves no projections behind.
+    """
+    if task._encoded is not None and task._projection_version == task.version:
+        return task._encoded
+    return dumps(_project_task(task, ctx))
+
+
+def select_task(task: SandboxTask, ctx: LookupContext, selection: Selection) -> dict[str, Any]:
+    """GraphQL selection of ``map_task``, memoized per version; see ``select_agent``."""
+    return _memo_selection(task, ctx, selection, TASK_FIELDS)
+
+
+def _project_task(task: SandboxTask, ctx: LookupContext) -> dict[str, Any]:
+    assignee = ctx.agent(task.assignee_id)
     return {
         "id": task.id,
         "identifier": task.id,
@@ -125,46 +244,154 @@ def map_task(task: SandboxTask, agents: list[SandboxAgent]) -> dict[str, Any]:
         "updatedAt": _iso_ms(task.updated_at),
         "completedAt": _iso_ms(task.updated_at) if task.status.value == "done" else None,
         "rejection": None,
+        "version": task.version,
     }
 
 
+def _memo_selection(entity: SandboxAgent | SandboxTask, ctx: LookupContext, selection: Selection, fields: FieldTable) -> dict[str, Any]:
+    selections = entity._selections
+    if selections is None or entity._selections_version != entity.version:
+        selections = entity._selections = {}
+        entity._selections_version = entity.version
+    selected = selections.get(selection.key)
+    if selected is None:
+        if len(selections) >= MAX_SELECTIONS_PER_ENTITY:
+            selections.clear()
+        if entity._projection is not None and entity._projection_version == entity.version:
+            selected = pick(entity._projection, selection.plan)
+        else:
+            selected = _build_selection(entity, ctx, selection.plan, fields)
+        selections[selection.key] = selected
+    return selected
+
+
+def _build_selection(entity: Any, ctx: LookupContext, plan: tuple, fields: FieldTable) -> dict[str, Any]:
+    out = {}
+    for alias, name, sub in plan:
+        build = fields.get(name)
+        v = build(entity, ctx) if build is not None else None
+        out[alias] = v if sub is None or v is None else pick(v, sub)
+    return out
+
+
+# ── Per-field builders ───────────────────────────────────────────────────────
+#
+# The same fields as _project_agent / _project_task, one function each, for
+# selections of entities without a current projection. The full projections
+# stay dict literals: building all fields through these is slower.
+
+FieldTable = dict[str, Callable[[Any, LookupContext], Any]]
+
+
+def trust_score(agent: SandboxAgent) -> int:
+    return min(100, 30 + agent.level * 7 + agent.stats.tasks_completed * 2)
+
+
+def _task_assignee(task: SandboxTask, ctx: LookupContext) -> dict[str, Any] | None:
+    assignee = ctx.agent(task.assignee_id)
+    return {"id": assignee.id, "name": assignee.name} if assignee else None
+
+
+AGENT_FIELDS: FieldTable = {
+    "id": lambda a, ctx: a.id,
+    "agentId": lambda a, ctx: a.id,
+    "name": lambda a, ctx: a.name,
+    "role": lambda a, ctx: (a.domain or "WORKER").upper(),
+    "mode": lambda a, ctx: "ORCHESTRATOR" if a.level >= 7 else "WORKER",
+    "status": lambda a, ctx: "ACTIVE" if a.status.value == "busy" else a.status.value.upper(),
+    "level": lambda a, ctx: a.level,
+    "model": lambda a, ctx: "deterministic",
+    "currentBalance": lambda a, ctx: max(0, a.stats.credits_earned - a.stats.credits_spent),
+    "lifetimeEarnings": lambda a, ctx: a.stats.credits_earned,
+    "budgetPeriodLimit": lambda a, ctx: 10000,
+    "budgetPeriodSpent": lambda a, ctx: a.stats.credits_spent,
+    "managementFeePct": lambda a, ctx: 5 if a.level >= 9 else 10,
+    "createdAt": lambda a, ctx: _iso_ms(a.created_at),
+    "updatedAt": lambda a, ctx: _iso_ms(a.updated_at),
+    "parentId": lambda a, ctx: None if a.parent_id == "human-principal" else a.parent_id,
+    "domain": lambda a, ctx: a.domain,
+    "trustScore": lambda a, ctx: trust_score(a),
+    "reputationLevel": lambda a, ctx: ctx.reputation_level(a.level),
+    "tasksCompleted": lambda a, ctx: a.stats.tasks_completed,
+    "tasksSuccessful": lambda a, ctx: a.stats.tasks_completed,
+    "lastActivityAt": lambda a, ctx: _iso_ms(a.updated_at),
+    "lastPromotionAt": lambda a, ctx: None,
+    "teamId": lambda a, ctx: ctx.team_id(a.domain),
+    "avatar": lambda a, ctx: a.avatar,
+    "avatarColor": lambda a, ctx: a.avatar_color,
+    "avatarUrl": lambda a, ctx: a.avatar_url,
+    "systemPrompt": lambda a, ctx: a.system_prompt,
+    "trigger": lambda a, ctx: a.trigger.value,
+    "triggerOn": lambda a, ctx: [t.value for t in a.trigger_on] if a.trigger_on else None,
+    "inboxSize": lambda a, ctx: len(a.inbox),
+    "inboxCapacity": lambda a, ctx: a.inbox.capacity,
+    "inboxPolicy": lambda a, ctx: a.inbox.policy.value,
+    "inboxDropped": lambda a, ctx: a.inbox.dropped,
+    "inboxCoalesced": lambda a, ctx: a.inbox.coalesced,
+    "inboxRejected": lambda a, ctx: a.inbox.rejected,
+    "inboxConsumed": lambda a, ctx: a.inbox.consumed,
+    "version": lambda a, ctx: a.version,
+}
+
+TASK_FIELDS: FieldTable = {
+    "id": lambda t, ctx: t.id,
+    "identifier": lambda t, ctx: t.id,
+    "title": lambda t, ctx: t.title,
+    "description": lambda t, ctx: t.description,
+    "status": lambda t, ctx: TASK_STATUS_MAP.get(t.status.value, t.status.value.upper()),
+    "priority": lambda t, ctx: t.priority.value.upper(),
+    "assigneeId": lambda t, ctx: t.assignee_id,
+    "assignee": _task_assignee,
+    "creatorId": lambda t, ctx: t.creator_id,
+    "approvalRequired": lambda t, ctx: False,
+    "dueDate": lambda t, ctx: None,
+    "createdAt": lambda t, ctx: _iso_ms(t.created_at),
+    "updatedAt": lambda t, ctx: _iso_ms(t.updated_at),
+    "completedAt": lambda t, ctx: _iso_ms(t.updated_at) if t.status.value == "done" else None,
+    "rejection": lambda t, ctx: None,
+    "version": lambda t, ctx: t.version,
+}
+
+
 # ── Event mapper ─────────────────────────────────────────────────────────────
 
 
-def map_event(event: SandboxEvent, agents: list[SandboxAgent]) -> dict[str, Any]:
-    actor = next((a for a in agents if a.id == event.agent_id), None) if event.agent_id else None
-    severity_map = {"system": "INFO", "agent_action": "INFO", "error": "ERROR"}
+EVENT_SEVERITY: dict[str, str] = {"system": "INFO", "agent_action": "INFO", "error": "ERROR"}
+
+
+def map_event(event: SandboxEvent, ctx: LookupContext) -> dict[str, Any]:
+    actor = ctx.agent(event.agent_id)
     return {
-        "id": f"evt-{event.timestamp}-{id(event)}",
+        "id": f"evt-{event.id:010d}",
         "type": event.type,
         "actorId": event.agent_id,
         "actor": {"id": actor.id, "name": actor.name} if actor else None,
         "entityType": "task" if event.task_id else ("agent" if event.agent_id else "system"),
         "entityId": event.task_id or event.agent_id or "system",
-        "severity": severity_map.get(event.type, "INFO"),
+        "severity": EVENT_SEVERITY.get(event.type, "INFO"),
         "reasoning": event.message,
         "createdAt": _iso_ms(event.timestamp),
     }
 
 
-# ── Message mapper ───────────────────────────────────────────────────────────
+def map_stream_event(event: SandboxEvent, agent: SandboxAgent | None) -> dict[str, Any]:
+    """Payload of one /api/stream event."""
+    return {
+        "type": event.type,
+        "agentId": event.agent_id,
+        "taskId": event.task_id,
+        "message": event.message,
+        "timestamp": event.timestamp,
+        "agentName": agent.name if agent else None,
+    }
 
 
-def collect_all_messages(agents: list[SandboxAgent]) -> list[ACPMessage]:
-    seen: set[str] = set()
-    result: list[ACPMessage] = []
-    for agent in agents:
-        for msg in agent.recent_messages:
-            if msg.id not in seen:
-                seen.add(msg.id)
-                result.append(msg)
-    result.sort(key=lambda m: m.timestamp)
-    return result
+# ── Message mapper ───────────────────────────────────────────────────────────
 
 
-def map_message(msg: ACPMessage, agents: list[SandboxAgent]) -> dict[str, Any]:
-    from_agent = next((a for a in agents if a.id == msg.from_agent), None)
-    to_agent = next((a for a in agents if a.id == msg.to), None)
+def map_message(msg: ACPMessage, ctx: LookupContext) -> dict[str, Any]:
+    from_agent = ctx.agent(msg.from_agent)
+    to_agent = ctx.agent(msg.to)
     icon = ACP_ICON.get(msg.type.value, "💬")
     return {
         "id": msg.id,
@@ -184,71 +411,75 @@ def map_message(msg: ACPMessage, agents: list[SandboxAgent]) -> dict[str, Any]:
     }
 
 
-# ── Credits generator ────────────────────────────────────────────────────────
-
-
-def generate_credits(sim) -> list[dict[str, Any]]:
-    from .simulation import Simulation
-
-    sim: Simulation = sim
-    credits: list[dict] = []
-    running = 0.0
-    for snap in sim.metrics_history[-100:]:
-        earned = snap.total_credits_earned
-        spent = snap.total_credits_spent
-        running = earned - spent
-        credits.append({
-            "id": f"credit-tick-{snap.tick}",
-            "agentId": "system",
-            "type": "CREDIT" if earned > spent else "DEBIT",
-            "amount": abs(earned - spent),
-            "reason": f"Tick {snap.tick} activity",
-            "balanceAfter": running,
-            "createdAt": _iso_ms(snap.timestamp),
-            "sourceTaskId": None,
-            "triggerType": "system",
-        })
-    for agent in sim.agents:
-        if agent.stats.credits_earned > 0:
-            credits.append({
-                "id": f"credit-{agent.id}-earn",
-                "agentId": agent.id,
-                "type": "CREDIT",
-                "amount": agent.stats.credits_earned,
-                "reason": "Task completion rewards",
-                "balanceAfter": agent.stats.credits_earned - agent.stats.credits_spent,
-                "createdAt": _iso_now(),
-                "sourceTaskId": None,
-                "triggerType": "task_completion",
-            })
-        if agent.stats.credits_spent > 0:
-            credits.append({
-                "id": f"credit-{agent.id}-spend",
-                "agentId": agent.id,
-                "type": "DEBIT",
-                "amount": agent.stats.credits_spent,
-                "reason": "Model inference tokens",
-                "balanceAfter": agent.stats.credits_earned - agent.stats.credits_spent,
-                "createdAt": _iso_now(),
-                "sourceTaskId": None,
-                "triggerType": "model_usage",
-            })
-    return credits
+def map_acp_message(msg: ACPMessage) -> dict[str, Any]:
+    """Raw ACP wire format (``from``/``taskId`` keys), as sent between agents."""
+    return {
+        "id": msg.id,
+        "type": msg.type.value,
+        "from": msg.from_agent,
+        "to": msg.to,
+        "taskId": msg.task_id,
+        "body": msg.body,
+        "reason": msg.reason,
+        "summary": msg.summary,
+        "pct": msg.pct,
+        "timestamp": msg.timestamp,
+    }
 
 
-# ── Helpers ──────────────────────────────────────────────────────────────────
+def map_activity(msg: ACPMessage, ctx: LookupContext) -> dict[str, Any]:
+    return {
+        "id": msg.id,
+        "type": msg.type.value,
+        "from": msg.from_agent,
+        "fromName": ctx.agent_name(msg.from_agent, msg.from_agent),
+        "to": msg.to,
+        "toName": ctx.agent_name(msg.to, msg.to),
+        "body": msg.body,
+        "reason": msg.reason,
+        "summary": msg.summary,
+        "pct": msg.pct,
+        "timestamp": msg.timestamp,
+    }
+
+
+# ── Metrics mapper ───────────────────────────────────────────────────────────
+
 
+def map_metrics_snapshot(snap: MetricsSnapshot) -> dict[str, Any]:
+    return {
+        "tick": snap.tick,
+        "timestamp": snap.timestamp,
+        "active_agents": snap.active_agents,
+        "total_tasks": snap.total_tasks,
+        "tasks_done": snap.tasks_done,
+        "tasks_in_progress": snap.tasks_in_progress,
+        "tasks_in_review": snap.tasks_in_review,
+        "total_credits_earned": snap.total_credits_earned,
+        "total_credits_spent": snap.total_credits_spent,
+        "message_count": snap.message_count,
+    }
+
+
+# ── Credit mapper ────────────────────────────────────────────────────────────
 
-def _iso_now() -> str:
-    from datetime import datetime, timezone
-    return datetime.now(timezone.utc).isoformat()
 
+def map_credit(entry: CreditEntry) -> dict[str, Any]:
+    return {
+        "id": f"credit-{entry.id}",
+        "agentId": entry.agent_id,
+        "type": "CREDIT" if entry.amount >= 0 else "DEBIT",
+        "amount": abs(entry.amount),
+        "reason": entry.reason,
+        "balanceAfter": entry.balance_after,
+        "createdAt": _iso_ms(entry.timestamp),
+        "sourceTaskId": entry.source_task_id,
+        "triggerType": entry.trigger_type,
+    }
 
-def _iso(ts: float) -> str:
-    from datetime import datetime, timezone
-    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+# ── Helpers ──────────────────────────────────────────────────────────────────
 
 
 def _iso_ms(ts_ms: int) -> str:
-    from datetime import datetime, timezone
     return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).isoformat()
@@ -0,0 +1,277 @@
+"""Streaming ACP protocol metrics: exact counters plus mergeable latency sketches."""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Any
+
+from .types import ACPMessage, ACPType
+
+LATENCY_RELATIVE_ACCURACY = 0.01
+DEFAULT_WINDOW_MS = 300_000
+DEFAULT_WINDOW_SLICES = 10
+DEFAULT_MAX_OPEN_TASKS = 10_000
+
+
+# ── Latency sketch ───────────────────────────────────────────────────────────
+
+
+class LatencySketch:
+    """Log-bucketed histogram with bounded relative error on quantiles.
+
+    Values land in bucket ``ceil(log_gamma(v))``, so any quantile is within
+    ``relative_accuracy`` of the true value regardless of how many samples
+    were added. Sketches with the same accuracy merge by adding bucket
+    counts, which is what the rolling windows rely on.
+    """
+
+    __slots__ = ("relative_accuracy", "_gamma", "_log_gamma", "_buckets", "zeros", "count", "total", "max")
+
+    def __init__(self, relative_accuracy: float = LATENCY_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: dict[int, int] = {}
+        self.zeros = 0  # samples <= 1 ms
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value: int) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value <= 1:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+
+    def merge(self, other: LatencySketch) -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different accuracy")
+        for key, n in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantiles(self, *qs: float) -> list[int]:
+        """Values at each quantile in ``qs`` (ascending), 0 when empty."""
+        if not self.count:
+            return [0] * len(qs)
+        ranks = [q * (self.count - 1) for q in qs]
+        out: list[int] = []
+        seen = self.zeros
+        i = 0
+        while i < len(ranks) and ranks[i] < seen:
+            out.append(0)
+            i += 1
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            while i < len(ranks) and ranks[i] < seen:
+                # Midpoint of (gamma^(key-1), gamma^key], within the relative error.
+                out.append(min(self.max, round(2 * self._gamma**key / (self._gamma + 1))))
+                i += 1
+        out.extend([self.max] * (len(ranks) - i))
+        return out
+
+    def summary(self) -> dict[str, Any]:
+        p50, p95, p99 = self.quantiles(0.5, 0.95, 0.99)
+        return {
+            "count": self.count,
+            "meanMs": self.total // self.count if self.count else 0,
+            "p50Ms": p50,
+            "p95Ms": p95,
+            "p99Ms": p99,
+            "maxMs": self.max,
+        }
+
+
+# ── Counters ─────────────────────────────────────────────────────────────────
+
+
+class AcpCounters:
+    """Message counts by type and escalation reason, plus latency sketches."""
+
+    __slots__ = ("by_type", "escalations_by_reason", "ack_latency", "completion_latency")
+
+    def __init__(self) -> None:
+        self.by_type: dict[ACPType, int] = {}
+        self.escalations_by_reason: dict[str, int] = {}
+        self.ack_latency = LatencySketch()
+        self.completion_latency = LatencySketch()
+
+    def merge(self, other: AcpCounters) -> None:
+        for t, n in other.by_type.items():
+            self.by_type[t] = self.by_type.get(t, 0) + n
+        for reason, n in other.escalations_by_reason.items():
+            self.escalations_by_reason[reason] = self.escalations_by_reason.get(reason, 0) + n
+        self.ack_latency.merge(other.ack_latency)
+        self.completion_latency.merge(other.completion_latency)
+
+    def count(self, type: ACPType) -> int:
+        return self.by_type.get(type, 0)
+
+
+class AcpMetrics:
+    """Consumes every ACP message once; reads never rescan the log.
+
+    Lifetime counters are exact. With ``window_ms`` set, the same counters
+    are also kept per time slice (``window_ms / slices`` wide) and merged on
+    read into a rolling window over the most recent ``window_ms``.
+
+    Delegation times are kept per open task, to measure ACK and completion
+    latency. The simulation retires a task once it is done or rejected
+    (``retire_task``); past ``max_open_tasks`` the oldest open task is
+    dropped, so tasks that never finish cannot grow the table either.
+    """
+
+    __slots__ = (
+        "totals",
+        "window_ms",
+        "max_open_tasks",
+        "_slice_ms",
+        "_slices",
+        "_delegated_at",
+        "_delegated_tasks",
+        "_task_delegations",
+        "_summary",
+    )
+
+    def __init__(self, window_ms: int = 0, slices: int = DEFAULT_WINDOW_SLICES, max_open_tasks: int = DEFAULT_MAX_OPEN_TASKS) -> None:
+        self.totals = AcpCounters()
+        self.window_ms = window_ms
+        self.max_open_tasks = max_open_tasks
+        self._slice_ms = max(1, window_ms // slices) if window_ms else 0
+        self._slices: deque[tuple[int, AcpCounters]] = deque(maxlen=slices + 1)
+        # task_id -> assignee -> timestamp of the delegation, oldest task first.
+        self._delegated_at: dict[str, dict[str, int]] = {}
+        # Distinct tasks delegated so far; retired tasks stay counted.
+        self._delegated_tasks = 0
+        self._task_delegations = 0
+        self._summary: dict[str, Any] | None = None
+
+    def record(self, msg: ACPMessage) -> None:
+        self._summary = None
+        targets = [self.totals]
+        if self._slice_ms:
+            targets.append(self._slice_for(msg.timestamp))
+        for counters in targets:
+            counters.by_type[msg.type] = counters.by_type.get(msg.type, 0) + 1
+
+        if msg.type == ACPType.DELEGATION:
+            if msg.task_id:
+                assignees = self._delegated_at.get(msg.task_id)
+                if assignees is None:
+                    assignees = self._delegated_at[msg.task_id] = {}
+                    self._delegated_tasks += 1
+                    if len(self._delegated_at) > self.max_open_tasks:
+                        del self._delegated_at[next(iter(self._delegated_at))]
+                assignees[msg.to] = msg.timestamp
+                self._task_delegations += 1
+        elif msg.type == ACPType.ACK:
+            assignees = self._delegated_at.get(msg.task_id)
+            delegated = assignees.get(msg.from_agent) if assignees else None
+            if delegated is not None:
+                for counters in targets:
+                    counters.ack_latency.add(msg.timestamp - delegated)
+        elif msg.type == ACPType.COMPLETION:
+            assignees = self._delegated_at.get(msg.task_id)
+            delegated = assignees.pop(msg.from_agent, None) if assignees else None
+            if delegated is not None:
+                for counters in targets:
+                    counters.completion_latency.add(msg.timestamp - delegated)
+        elif msg.type == ACPType.ESCALATION and msg.reason:
+            for counters in targets:
+                counters.escalations_by_reason[msg.reason] = counters.escalations_by_reason.get(msg.reason, 0) + 1
+
+    def _slice_for(self, timestamp: int) -> AcpCounters:
+        start = timestamp - timestamp % self._slice_ms
+        if self._slices and self._slices[-1][0] >= start:
+            return self._slices[-1][1]
+        counters = AcpCounters()
+        self._slices.append((start, counters))
+        return counters
+
+    def retire_task(self, task_id: str) -> None:
+        """Forget the delegation times of a finished task."""
+        self._delegated_at.pop(task_id, None)
+
+    @property
+    def open_tasks(self) -> int:
+        return len(self._delegated_at)
+
+    @property
+    def avg_delegation_depth(self) -> float:
+        tasks = self._delegated_tasks
+        return self._task_delegations / tasks if tasks else 0
+
+    def summary(self) -> dict[str, Any]:
+        """Lifetime counters and latency percentiles; cached until the next message."""
+        if self._summary is None:
+            totals = self.totals
+            self._summary = {
+                "totalAcks": totals.count(ACPType.ACK),
+                "totalEscalations": totals.count(ACPType.ESCALATION),
+                "totalCompletions": totals.count(ACPType.COMPLETION),
+                "totalDelegations": totals.count(ACPType.DELEGATION),
+                "escalationsByReason": dict(totals.escalations_by_reason),
+                "avgDelegationDepth": round(self.avg_delegation_depth, 1),
+                "ackLatency": totals.ack_latency.summary(),
+                "completionLatency": totals.completion_latency.summary(),
+            }
+        return self._summary
+
+    def snapshot(self, now_ms: int) -> AcpMetricsSnapshot:
+        return AcpMetricsSnapshot(self.summary(), self.window(now_ms), self.window_slice(now_ms))
+
+    def window_slice(self, now_ms: int) -> int:
+        """Number of the slice ``now_ms`` falls in; the window can only move when it changes."""
+        return now_ms // self._slice_ms if self._slice_ms else 0
+
+    def window(self, now_ms: int) -> dict[str, Any] | None:
+        """Counters merged over the slices within ``window_ms`` of ``now_ms``."""
+        if not self._slice_ms:
+            return None
+        merged = AcpCounters()
+        horizon = now_ms - self.window_ms
+        for start, counters in self._slices:
+            if start + self._slice_ms > horizon:
+                merged.merge(counters)
+        return {
+            "windowMs": self.window_ms,
+            "messages": sum(merged.by_type.values()),
+            "byType": {t.value: n for t, n in merged.by_type.items()},
+            "escalationsByReason": merged.escalations_by_reason,
+            "ackLatency": merged.ack_latency.summary(),
+            "completionLatency": merged.completion_latency.summary(),
+        }
+
+
+class AcpMetricsSnapshot:
+    """``summary()`` and the rolling window as of one moment, for readers on another thread.
+
+    ``window_slice`` tells cached responses apart when the window has moved
+    on with the clock but no message has arrived.
+    """
+
+    __slots__ = ("_summary", "_window", "window_slice")
+
+    def __init__(self, summary: dict[str, Any], window: dict[str, Any] | None, window_slice: int = 0) -> None:
+        self._summary = summary
+        self._window = window
+        self.window_slice = window_slice
+
+    def summary(self) -> dict[str, Any]:
+        return self._summary
+
+    def window(self) -> dict[str, Any] | None:
+        return self._window
+
+    def snapshot(self, now_ms: int) -> AcpMetricsSnapshot:
+        """Already frozen; lets a replica holding one stand in for ``AcpMetrics``."""
+        return self
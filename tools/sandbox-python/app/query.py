@@ -0,0 +1,306 @@
+"""Secondary indexes and cursor pages behind the filtered list endpoints."""
+
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Callable, Collection, Hashable, Iterable, Iterator, Mapping, Sequence, TypeVar
+
+from .mappers import TASK_STATUS_MAP
+from .types import SandboxAgent, SandboxEvent, SandboxTask
+
+T = TypeVar("T")
+
+Key = Callable[[Any], Hashable]
+
+DEFAULT_PAGE_SIZE = 100
+
+
+# ── Filterable fields ────────────────────────────────────────────────────────
+
+# Filter values match what the API shows for the field, case-insensitively.
+# The exception is the agent ``role``, which takes the roles accepted by
+# POST /api/agents/spawn (the API's ``role`` field shows the domain).
+TASK_FILTERS: dict[str, Key] = {
+    "status": lambda t: TASK_STATUS_MAP.get(t.status.value, t.status.value).lower(),
+    "priority": lambda t: t.priority.value,
+    "assignee": lambda t: t.assignee_id,
+    "creator": lambda t: t.creator_id,
+}
+
+AGENT_FILTERS: dict[str, Key] = {
+    "role": lambda a: a.role.value,
+    "domain": lambda a: a.domain.lower(),
+    "status": lambda a: "active" if a.status.value == "busy" else a.status.value,
+    "parent": lambda a: None if a.parent_id == "human-principal" else a.parent_id,
+}
+
+EVENT_FILTERS: dict[str, Key] = {
+    "type": lambda e: e.type,
+    "agent": lambda e: e.agent_id,
+    "task": lambda e: e.task_id,
+}
+
+# The other fields hold ids and match exactly.
+CASE_INSENSITIVE = frozenset({"status", "priority", "role", "domain"})
+
+
+def parse_filters(fields: Mapping[str, Key], params: Mapping[str, Iterable[str] | str | None]) -> dict[str, frozenset[str]]:
+    """Filters from query values; each may be a string, repeated or comma-separated.
+
+    Fields without values are left out, so an empty result matches everything.
+    """
+    filters = {}
+    for name in fields:
+        values = params.get(name)
+        if not values:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        parsed = {v.strip() for value in values for v in str(value).split(",") if v.strip()}
+        if name in CASE_INSENSITIVE:
+            parsed = {v.lower() for v in parsed}
+        if parsed:
+            filters[name] = frozenset(parsed)
+    return filters
+
+
+def take(items: Iterator[T], limit: int) -> tuple[list[T], bool]:
+    """Up to ``limit`` items, and whether any remain."""
+    page = list(islice(items, max(0, limit) + 1))
+    more = len(page) > limit
+    if more:
+        page.pop()
+    return page, more
+
+
+# ── Scans ────────────────────────────────────────────────────────────────────
+
+
+def _count(groups: Sequence[Sequence[int]], lo: int, hi: int) -> int:
+    return sum(bisect_left(g, hi) - bisect_left(g, lo) for g in groups)
+
+
+def _run(group: Sequence[int], lo: int, hi: int, reverse: bool) -> Iterator[int]:
+    a, b = bisect_left(group, lo), bisect_left(group, hi)
+    return (group[i] for i in (range(b - 1, a - 1, -1) if reverse else range(a, b)))
+
+
+def scan(filters: list[list[Sequence[int]]], lo: int, hi: int, reverse: bool = False) -> Iterator[int]:
+    """Candidate positions in [lo, hi), in order, from the most selective filter.
+
+    Each filter is a list of sorted position lists, one per accepted value,
+    and the lists of one filter are disjoint. Only the filter with the fewest
+    positions in range is walked; callers check the others on the entity.
+    Without filters every position in range is a candidate.
+    """
+    best = min(filters, key=lambda groups: _count(groups, lo, hi), default=None)
+    if best is None:
+        return iter(range(hi - 1, lo - 1, -1) if reverse else range(lo, hi))
+    runs = [_run(g, lo, hi, reverse) for g in best]
+    return runs[0] if len(runs) == 1 else heapq.merge(*runs, reverse=reverse)
+
+
+# ── Entity indexes ───────────────────────────────────────────────────────────
+
+
+class CollectionIndex:
+    """Equality indexes over an append-only entity collection, plus one sorted field.
+
+    Entities are identified by their position in the collection, which is
+    also the order filtered lists are served in. Each filter field keeps a
+    sorted list of positions per value; ``ordered`` (if given) keeps
+    (value, position) pairs sorted for range filters. ``update`` runs after
+    every change to an entity (``Simulation._touch_task``), so the indexes
+    follow the collection instead of being rebuilt per query.
+    """
+
+    __slots__ = ("keys", "ordered", "positions", "_values", "_groups", "_sorted", "_dirty", "_sorted_dirty", "_snapshot")
+
+    def __init__(self, keys: Mapping[str, Key], ordered: Key | None = None) -> None:
+        self.keys = dict(keys)
+        self.ordered = ordered
+        # Entity id -> position; ids are only ever added.
+        self.positions: dict[str, int] = {}
+        self._values: dict[str, tuple] = {}
+        self._groups: dict[str, dict[Hashable, list[int]]] = {name: {} for name in self.keys}
+        self._sorted: list[tuple[Any, int]] = []
+        self._dirty: set[tuple[str, Hashable]] = set()
+        self._sorted_dirty = False
+        self._snapshot: IndexSnapshot | None = None
+
+    def update(self, entity: SandboxAgent | SandboxTask) -> None:
+        """Index a new entity, or move a changed one to its new groups."""
+        position = self.positions.get(entity.id)
+        old = self._values.get(entity.id)
+        if position is None:
+            position = self.positions[entity.id] = len(self.positions)
+        values = tuple(key(entity) for key in self.keys.values())
+        if self.ordered is not None:
+            values += (self.ordered(entity),)
+        if values == old:
+            return
+        self._values[entity.id] = values
+        for i, name in enumerate(self.keys):
+            if old is not None and old[i] == values[i]:
+                continue
+            groups = self._groups[name]
+            if old is not None:
+                group = groups[old[i]]
+                del group[bisect_left(group, position)]
+                if not group:
+                    del groups[old[i]]
+                self._dirty.add((name, old[i]))
+            insort(groups.setdefault(values[i], []), position)
+            self._dirty.add((name, values[i]))
+        if self.ordered is not None and (old is None or old[-1] != values[-1]):
+            if old is not None:
+                del self._sorted[bisect_left(self._sorted, (old[-1], position))]
+            insort(self._sorted, (values[-1], position))
+            self._sorted_dirty = True
+
+    def snapshot(self) -> IndexSnapshot:
+        """Read-only view; groups unchanged since the previous view are shared with it."""
+        previous = self._snapshot
+        if previous is not None and not self._dirty and not self._sorted_dirty:
+            return previous
+        if previous is None:
+            groups = {name: {v: tuple(g) for v, g in by_value.items()} for name, by_value in self._groups.items()}
+        else:
+            groups = {name: dict(by_value) for name, by_value in previous.groups.items()}
+            for name, value in self._dirty:
+                group = self._groups[name].get(value)
+                if group:
+                    groups[name][value] = tuple(group)
+                else:
+                    groups[name].pop(value, None)
+        ordered = tuple(self._sorted) if previous is None or self._sorted_dirty else previous.sorted
+        self._dirty.clear()
+        self._sorted_dirty = False
+        self._snapshot = IndexSnapshot(self.keys, self.ordered, self.positions, groups, ordered)
+        return self._snapshot
+
+    # Read paths take a Simulation as well as a Snapshot; query the current view.
+
+    def position(self, entity_id: str, end: int) -> int | None:
+        return self.snapshot().position(entity_id, end)
+
+    def select(self, entities: Sequence[T], filters: Mapping[str, Collection[Hashable]], since: Any = None, start: int = 0) -> Iterator[T]:
+        return self.snapshot().select(entities, filters, since, start)
+
+
+class IndexSnapshot:
+    """A ``CollectionIndex`` as of one snapshot; queries take that snapshot's entities.
+
+    ``positions`` is shared with the live index, which only adds ids to it,
+    so lookups are bounded by the snapshot's collection length.
+    """
+
+    __slots__ = ("keys", "ordered", "positions", "groups", "sorted")
+
+    def __init__(
+        self,
+        keys: dict[str, Key],
+        ordered: Key | None,
+        positions: dict[str, int],
+        groups: dict[str, dict[Hashable, tuple[int, ...]]],
+        ordered_pairs: tuple[tuple[Any, int], ...],
+    ) -> None:
+        self.keys = keys
+        self.ordered = ordered
+        self.positions = positions
+        self.groups = groups
+        self.sorted = ordered_pairs
+
+    def position(self, entity_id: str, end: int) -> int | None:
+        position = self.positions.get(entity_id)
+        return position if position is not None and position < end else None
+
+    def select(
+        self,
+        entities: Sequence[T],
+        filters: Mapping[str, Collection[Hashable]],
+        since: Any = None,
+        start: int = 0,
+    ) -> Iterator[T]:
+        """Entities from position ``start`` on matching every filter, in collection order.
+
+        ``since`` is an inclusive lower bound on the ``ordered`` field.
+        """
+        end = len(entities)
+        if not filters and since is None:
+            return islice(entities, start, None)
+        candidates = [[self.groups[name].get(v, ()) for v in values] for name, values in filters.items()]
+        if since is not None:
+            first = bisect_left(self.sorted, (since,))
+            # Range hits are in value order; only sort them when they are the fewest.
+            if len(self.sorted) - first < min((_count(c, start, end) for c in candidates), default=end - start):
+                candidates.append([sorted(p for _, p in islice(self.sorted, first, None))])
+        keys, ordered = self.keys, self.ordered
+
+        def accept(entity: T) -> bool:
+            if since is not None and ordered(entity) < since:
+                return False
+            return all(keys[name](entity) in values for name, values in filters.items())
+
+        return (entities[p] for p in scan(candidates, start, end) if accept(entities[p]))
+
+
+# ── Event index ──────────────────────────────────────────────────────────────
+
+
+def _event_id(event: SandboxEvent) -> int:
+    return event.id
+
+
+def _event_time(event: SandboxEvent) -> int:
+    return event.timestamp
+
+
+class EventIndex:
+    """Event log positions by type, agent and task; append-only like the log.
+
+    Snapshots share it and read only positions below their own log length.
+    Event ids and timestamps grow with position, so cursors and time ranges
+    are binary searches over the log itself.
+    """
+
+    __slots__ = ("groups",)
+
+    def __init__(self) -> None:
+        self.groups: dict[str, dict[Hashable, list[int]]] = {name: {} for name in EVENT_FILTERS}
+
+    def add(self, position: int, event: SandboxEvent) -> None:
+        for name, key in EVENT_FILTERS.items():
+            value = key(event)
+            if value is not None:
+                self.groups[name].setdefault(value, []).append(position)
+
+    def select(
+        self,
+        events: Sequence[SandboxEvent],
+        filters: Mapping[str, Collection[Hashable]],
+        start_ms: int | None = None,
+        end_ms: int | None = None,
+        before: int | None = None,
+        newest_first: bool = True,
+    ) -> Iterator[SandboxEvent]:
+        """Matching events, newest first unless ``newest_first`` is False.
+
+        ``start_ms`` is inclusive and ``end_ms`` exclusive; ``before`` is an
+        event id (exclusive), the cursor of the previous page.
+        """
+        lo, hi = 0, len(events)
+        if start_ms is not None:
+            lo = bisect_left(events, start_ms, key=_event_time)
+        if end_ms is not None:
+            hi = bisect_left(events, end_ms, lo, hi, key=_event_time)
+        if before is not None:
+            hi = bisect_left(events, before, lo, hi, key=_event_id)
+        candidates = [[self.groups[name].get(v, ()) for v in values] for name, values in filters.items()]
+
+        def accept(event: SandboxEvent) -> bool:
+            return all(EVENT_FILTERS[name](event) in values for name, values in filters.items())
+
+        return (events[p] for p in scan(candidates, lo, hi, reverse=newest_first) if accept(events[p]))
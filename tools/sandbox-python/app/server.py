@@ -6,39 +6,100 @@ import asyncio
 import json
 import os
 import re
-from pathlib import Path
-from typing import Any
-
+import zlib
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Sequence
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sse_starlette.sse import EventSourceResponse
 
 from .agents import create_all_agents
+from .cache import ResponseCache, normalize_variables
+from .encoding import FastJSONResponse, dumps, dumps_array, iter_json, sse_frame
+from .engine import Engine, Snapshot
+from .graphql import DocumentCache, GraphQLSyntaxError, Selection, compile_plan, field_arguments, query_hash, select_data
 from .mappers import (
-    collect_all_messages,
-    generate_credits,
+    LookupContext,
+    encode_agent,
+    encode_task,
+    map_acp_message,
+    map_activity,
     map_agent,
+    map_credit,
     map_event,
     map_message,
+    map_metrics_snapshot,
     map_task,
+    select_agent,
+    select_task,
+    stream_task,
+    trust_score,
+)
+from .metrics import DEFAULT_WINDOW_MS
+from .query import AGENT_FILTERS, DEFAULT_PAGE_SIZE, EVENT_FILTERS, TASK_FILTERS, IndexSnapshot, parse_filters, take
+from .shared import DEFAULT_POLL_MS, Replica
+from .simulation import Simulation
+from .stream import (
+    DEFAULT_CLIENT_BUFFER,
+    DEFAULT_HEARTBEAT_S,
+    DEFAULT_REPLAY_EVENTS,
+    EVENT,
+    WS_CODECS,
+    BroadcastHub,
+    msgpack,
+    parse_filter,
+    run_heartbeats,
 )
-from .simulation import Simulation, _make_acp, _now_ms, _push_message
-from .types import ACPType, SandboxEvent
+from .types import DEFAULT_INBOX_CAPACITY, ACPType, Inbox, InboxPolicy, TaskStatus
 
 # ── App setup ────────────────────────────────────────────────────────────────
 
 
+def simulation_from_env() -> Simulation:
+    """The simulation configured by the environment; also used by the engine process."""
+    return Simulation(
+        create_all_agents(),
+        tick_interval_ms=int(os.environ.get("TICK_INTERVAL_MS", "5000")),
+        activity_window=int(os.environ.get("TASK_ACTIVITY_WINDOW", "50")),
+        activity_history=int(os.environ.get("TASK_ACTIVITY_HISTORY", "1000")),
+        change_retention=int(os.environ.get("CHANGE_LOG_RETENTION", "10000")),
+        acp_window_ms=int(os.environ.get("ACP_METRICS_WINDOW_MS", str(DEFAULT_WINDOW_MS))),
+        stream_buffer=int(os.environ.get("STREAM_CLIENT_BUFFER", str(DEFAULT_CLIENT_BUFFER))),
+        stream_replay=int(os.environ.get("STREAM_REPLAY_EVENTS", str(DEFAULT_REPLAY_EVENTS))),
+        inbox_capacity=int(os.environ.get("INBOX_CAPACITY", str(DEFAULT_INBOX_CAPACITY))),
+        inbox_policy=InboxPolicy(os.environ.get("INBOX_POLICY", InboxPolicy.DROP_OLDEST.value)),
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global sim
-    agents = create_all_agents()
-    tick_ms = int(os.environ.get("TICK_INTERVAL_MS", "5000"))
-    sim = Simulation(agents, tick_interval_ms=tick_ms)
-    asyncio.create_task(sim.run())
+    global sim, engine, replica
+    engine_dir = os.environ.get("SANDBOX_ENGINE_DIR")
+    tasks = []
+    if engine_dir:
+        # A worker of ``run.py``: the engine runs in another process.
+        replica = Replica(
+            Path(engine_dir),
+            activity_window=int(os.environ.get("TASK_ACTIVITY_WINDOW", "50")),
+            activity_history=int(os.environ.get("TASK_ACTIVITY_HISTORY", "1000")),
+            stream_buffer=int(os.environ.get("STREAM_CLIENT_BUFFER", str(DEFAULT_CLIENT_BUFFER))),
+            stream_replay=int(os.environ.get("STREAM_REPLAY_EVENTS", str(DEFAULT_REPLAY_EVENTS))),
+        )
+        await replica.wait_ready()
+        tasks.append(asyncio.create_task(replica.run(int(os.environ.get("SNAPSHOT_POLL_MS", str(DEFAULT_POLL_MS))))))
+    else:
+        sim = simulation_from_env()
+        engine = Engine(sim, asyncio.get_running_loop())
+        engine.start()
+    heartbeat_s = float(os.environ.get("STREAM_HEARTBEAT_S", str(DEFAULT_HEARTBEAT_S)))
+    tasks.append(asyncio.create_task(run_heartbeats(get_hub, heartbeat_s)))
     print(f"\n🌐 BikiniBottom Sandbox (FastAPI): http://0.0.0.0:{PORT}")
 
     if SERVE_DASHBOARD and Path(DASHBOARD_DIR).is_dir():
@@ -46,15 +107,21 @@ async def lifespan(app: FastAPI):
         print(f"   Serving dashboard from {DASHBOARD_DIR}")
 
     yield
+    for task in tasks:
+        task.cancel()
+    if engine is not None:
+        engine.stop()
+    engine = replica = None
 
 
-app = FastAPI(title="BikiniBottom Sandbox", version="0.1.0", lifespan=lifespan)
+app = FastAPI(title="BikiniBottom Sandbox", version="0.1.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 PORT = int(os.environ.get("SANDBOX_PORT", "3333"))
@@ -64,6 +131,12 @@ SERVE_DASHBOARD = os.environ.get("SERVE_DASHBOARD", "0") == "1"
 # ── Simulation singleton ────────────────────────────────────────────────────
 
 sim: Simulation | None = None
+# Runs ``sim`` on its own thread once the app has started; without it (tests,
+# embedding) reads and writes go straight to ``sim`` on the calling thread.
+engine: Engine | None = None
+# Set instead of both in a multi-worker deployment: this process mirrors
+# the engine process's state and forwards writes to it.
+replica: Replica | None = None
 
 
 def get_sim() -> Simulation:
@@ -71,67 +144,420 @@ def get_sim() -> Simulation:
     return sim
 
 
+def get_state() -> Snapshot:
+    """The latest published snapshot; every read endpoint serves from this."""
+    if engine is not None:
+        return engine.snapshot
+    if replica is not None:
+        return replica.snapshot
+    return get_sim().snapshot()
+
+
+def get_hub() -> BroadcastHub:
+    """The hub this process's stream clients subscribe to."""
+    if replica is not None:
+        return replica.hub
+    return get_sim().hub
+
+
+async def command(op: str, **args: Any) -> Any:
+    """Apply the write ``WRITES[op]`` to the simulation, between ticks on the engine thread.
+
+    Arguments must be JSON values: with several workers they are sent to the
+    engine process, which runs nothing but the writes in ``WRITES``.
+    """
+    write = partial(WRITES[op], **args)
+    if engine is not None:
+        return await engine.submit(write)
+    if replica is not None:
+        return await replica.submit(op, args)
+    return write(get_sim())
+
+
+def lookup_context(s: Snapshot) -> LookupContext:
+    return LookupContext(s.agents, s.agents_by_id)
+
+
+# ── Response cache ───────────────────────────────────────────────────────────
+
+response_cache = ResponseCache(int(os.environ.get("RESPONSE_CACHE_SIZE", "256")))
+
+
+def make_etag(tag: str, op: str, variables: Any) -> str:
+    """Strong ETag for one operation at one state tag."""
+    key = f"{op}\n{normalize_variables(variables)}".encode("utf-8")
+    return f'"{tag}-{zlib.crc32(key):08x}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def cached_json(
+    request: Request,
+    op: str,
+    variables: Any,
+    build: Callable[[Snapshot], Any | bytes],
+    depends_on: tuple[str, ...] = (),
+    vary: Callable[[Snapshot], Any] | None = None,
+) -> Response:
+    """Serve ``build(sim)`` with an ETag, from the response cache where possible.
+
+    ``depends_on`` names the simulation collections the response is built
+    from; the ETag and cache entry only change when one of them does (no
+    collections means any state change). ``vary`` returns anything else the
+    response depends on, which is added to the tag. A matching If-None-Match
+    gets an empty 304. ``build`` may return already-encoded bytes.
+    """
+    s = get_state()
+    tag = s.collection_tag(*depends_on)
+    if vary is not None:
+        tag = f"{tag}.{vary(s)}"
+    etag = make_etag(tag, op, variables)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    payload = response_cache.get_or_compute(op, variables, tag, lambda: _encode(build(s)))
+    return Response(payload, media_type="application/json", headers=headers)
+
+
+def _encode(content: Any) -> bytes:
+    return content if isinstance(content, bytes) else dumps(content)
+
+
+# ── Streamed responses ───────────────────────────────────────────────────────
+
+STREAM_MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+
+def stream_format(request: Request, stream: str | None) -> str | None:
+    """``json`` or ``ndjson`` when the client asked for a streamed list, else None.
+
+    Asked for with ``?stream=json|ndjson`` or ``Accept: application/x-ndjson``;
+    raises ValueError for an unknown ``stream`` value.
+    """
+    if stream is None:
+        return "ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else None
+    if stream not in STREAM_MEDIA_TYPES:
+        raise ValueError(stream)
+    return stream
+
+
+def streamed_json(
+    request: Request,
+    op: str,
+    variables: Any,
+    items: Callable[[Snapshot], Iterable[bytes]],
+    depends_on: tuple[str, ...],
+    fmt: str,
+) -> Response:
+    """Like ``cached_json`` for lists, but encoded while it is sent.
+
+    Elements are generated from the snapshot chunk by chunk instead of
+    being built, encoded and cached whole, so memory stays bounded and the
+    first bytes go out at once. Reads through the snapshot stop at its own
+    version, so ticks during the transfer do not change the response.
+    """
+    s = get_state()
+    etag = make_etag(s.collection_tag(*depends_on), op, {"stream": fmt, "variables": variables})
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(iter_json(items(s), ndjson=fmt == "ndjson"), media_type=STREAM_MEDIA_TYPES[fmt], headers=headers)
+
+
+STREAM_ERROR = {"error": "stream must be json or ndjson, without cursor or limit"}
+
+
 # ── GraphQL-compatible endpoint ──────────────────────────────────────────────
 
 
+# Operations returning agent/task projections under a single root field; their
+# selections are applied per entity and memoized until the entity changes.
+ENTITY_OPERATIONS = {"Agents", "Agent", "Tasks", "Task", "TrustLeaderboard"}
+
+# Collections each operation reads; unknown operations depend on everything.
+GRAPHQL_DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    "Agents": ("agents",),
+    "Agent": ("agents",),
+    "AgentReputation": ("agents",),
+    "TrustLeaderboard": ("agents",),
+    "AgentsDelta": ("agents",),
+    "Tasks": ("tasks", "agents"),
+    "Task": ("tasks", "agents"),
+    "TasksDelta": ("tasks", "agents"),
+    "CreditHistory": ("agents",),
+    "Credits": ("agents",),
+    "Events": ("events", "agents"),
+    "Messages": ("messages", "agents"),
+    "Conversations": ("messages", "agents"),
+}
+
+
+document_cache = DocumentCache(int(os.environ.get("GRAPHQL_DOCUMENT_CACHE_SIZE", "512")))
+
+
+GRAPHQL_MAX_BATCH = int(os.environ.get("GRAPHQL_MAX_BATCH", "20"))
+
+
 @app.post("/graphql")
-async def graphql(request: Request) -> JSONResponse:
+async def graphql(request: Request) -> Response:
     body = await request.json()
-    query = body.get("query", "")
-    variables = body.get("variables", {})
-    op_match = re.search(r"(?:query|mutation)\s+(\w+)", query)
-    op = op_match.group(1) if op_match else ""
-    result = handle_graphql(op, variables, get_sim())
-    return JSONResponse({"data": result})
-
+    if isinstance(body, list):
+        return graphql_batch_response(request, body)
+    return graphql_response(request, body)
+
+
+@app.get("/graphql")
+async def graphql_get(
+    request: Request,
+    query: str = "",
+    variables: str | None = None,
+    operationName: str | None = None,
+    extensions: str | None = None,
+) -> Response:
+    """GraphQL over GET, so plain HTTP caches can revalidate reads."""
+    try:
+        body = {
+            "query": query,
+            "variables": json.loads(variables) if variables else {},
+            "operationName": operationName,
+            "extensions": json.loads(extensions) if extensions else {},
+        }
+    except ValueError:
+        return GraphQLRequestError("variables and extensions must be JSON", "BAD_REQUEST", 400).response()
+    return graphql_response(request, body)
+
+
+# Arguments the handlers do arithmetic or comparisons with.
+INT_ARGUMENTS = ("limit", "offset", "updatedSince")
+
+
+class GraphQLRequestError(Exception):
+    def __init__(self, message: str, code: str, status_code: int = 200) -> None:
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+
+    def payload(self) -> dict[str, Any]:
+        return {"errors": [{"message": str(self), "extensions": {"code": self.code}}]}
+
+    def response(self) -> Response:
+        return FastJSONResponse(self.payload(), status_code=self.status_code)
+
+
+@dataclass(slots=True, kw_only=True)
+class PreparedOperation:
+    """A parsed GraphQL request, ready to run against a simulation."""
+
+    key: str
+    variables: dict
+    depends_on: tuple[str, ...]
+    build: Callable[[Snapshot, LookupContext], dict[str, Any]]
+
+
+def prepare_graphql(body: dict) -> PreparedOperation:
+    """Resolve a request body to its operation; raises GraphQLRequestError.
+
+    Parsed documents are cached by SHA-256, which also serves automatic
+    persisted queries: a body with ``extensions.persistedQuery.sha256Hash``
+    and no ``query`` runs the document previously sent under that hash.
+    """
+    query = body.get("query") or ""
+    variables = body.get("variables") or {}
+    persisted = (body.get("extensions") or {}).get("persistedQuery") or {}
+    digest = persisted.get("sha256Hash")
+    try:
+        if digest and not query:
+            document = document_cache.get(digest)
+            if document is None:
+                raise GraphQLRequestError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        elif digest and digest != query_hash(query):
+            raise GraphQLRequestError("provided sha does not match query", "INVALID_SHA256", 400)
+        else:
+            digest, document = document_cache.parse(query)
+    except GraphQLSyntaxError as exc:
+        raise GraphQLRequestError(str(exc), "GRAPHQL_PARSE_FAILED", 400) from None
+
+    operation = document.operation(body.get("operationName"))
+    if operation is None:
+        raise GraphQLRequestError("Unknown or ambiguous operation", "BAD_REQUEST", 400)
+
+    # Root field arguments (literal or from variables) override same-named
+    # variables; unset optional arguments fall back to handler defaults.
+    args = dict(variables)
+    for root in operation.selections:
+        args.update((k, v) for k, v in field_arguments(root, variables).items() if v is not None)
+    for name in INT_ARGUMENTS:
+        if args.get(name) is not None and type(args[name]) is not int:
+            raise GraphQLRequestError(f"{name} must be an integer", "BAD_USER_INPUT", 400)
+    op = operation.name
+    roots = operation.selections
+    if op in ENTITY_OPERATIONS and len(roots) == 1 and roots[0].selections and not roots[0].directives:
+        root = roots[0]
+        selection = Selection(compile_plan(root.selections, variables))
+
+        def build(s: Snapshot, ctx: LookupContext) -> dict[str, Any]:
+            result = handle_graphql(op, args, s, ctx, selection=selection)
+            return {"data": {root.alias: next(iter(result.values()))}}
+    else:
 
-def handle_graphql(op: str, variables: dict, sim: Simulation) -> dict[str, Any]:
+        def build(s: Snapshot, ctx: LookupContext) -> dict[str, Any]:
+            return {"data": select_data(handle_graphql(op, args, s, ctx), roots, variables)}
+
+    return PreparedOperation(
+        key=f"graphql:{digest}:{op}",
+        variables=variables,
+        depends_on=GRAPHQL_DEPENDENCIES.get(op, ()),
+        build=build,
+    )
+
+
+def graphql_response(request: Request, body: dict) -> Response:
+    """Execute one GraphQL request body."""
+    try:
+        prepared = prepare_graphql(body)
+    except GraphQLRequestError as exc:
+        return exc.response()
+    return cached_json(
+        request,
+        prepared.key,
+        prepared.variables,
+        lambda s: prepared.build(s, lookup_context(s)),
+        prepared.depends_on,
+    )
+
+
+def graphql_batch_response(request: Request, bodies: list) -> Response:
+    """Execute an array of GraphQL request bodies; the response is an array of results.
+
+    All operations read one snapshot and share one lookup context. Each
+    entry still goes through the response cache; the batch gets one ETag.
+    """
+    if not bodies or len(bodies) > GRAPHQL_MAX_BATCH:
+        return GraphQLRequestError(f"Batch must hold 1-{GRAPHQL_MAX_BATCH} operations", "BAD_REQUEST", 400).response()
+    entries: list[PreparedOperation | GraphQLRequestError] = []
+    for body in bodies:
+        try:
+            if not isinstance(body, dict):
+                raise GraphQLRequestError("Batch entries must be objects", "BAD_REQUEST", 400)
+            entries.append(prepare_graphql(body))
+        except GraphQLRequestError as exc:
+            entries.append(exc)
+
+    prepared = [e for e in entries if isinstance(e, PreparedOperation)]
+    if any(not p.depends_on for p in prepared):
+        depends_on: tuple[str, ...] = ()
+    else:
+        depends_on = tuple(sorted({c for p in prepared for c in p.depends_on}))
+    s = get_state()
+    etag = make_etag(
+        s.collection_tag(*depends_on),
+        "graphql-batch:" + ",".join(e.key if isinstance(e, PreparedOperation) else e.code for e in entries),
+        [e.variables for e in prepared],
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    ctx = lookup_context(s)
+    parts = []
+    for entry in entries:
+        if isinstance(entry, GraphQLRequestError):
+            parts.append(dumps(entry.payload()))
+            continue
+        tag = s.collection_tag(*entry.depends_on)
+        parts.append(response_cache.get_or_compute(entry.key, entry.variables, tag, lambda e=entry: dumps(e.build(s, ctx))))
+    return Response(dumps_array(parts), media_type="application/json", headers=headers)
+
+
+def handle_graphql(
+    op: str,
+    variables: dict,
+    sim: Snapshot,
+    ctx: LookupContext | None = None,
+    selection: Selection | None = None,
+) -> dict[str, Any]:
+    """Run ``op``; with ``selection``, agent and task results come back already selected."""
+    ctx = ctx or lookup_context(sim)
     agents = sim.agents
     tasks = sim.tasks
     events = sim.events
+    if selection is None:
+        project_agent = lambda a: map_agent(a, ctx)  # noqa: E731
+        project_task = lambda t: map_task(t, ctx)  # noqa: E731
+    else:
+        project_agent = lambda a: select_agent(a, ctx, selection)  # noqa: E731
+        project_task = lambda t: select_task(t, ctx, selection)  # noqa: E731
 
     if op == "Agents":
-        return {"agents": [map_agent(a, agents) for a in agents]}
+        return {"agents": [project_agent(a) for a in agents]}
 
     if op == "Agent":
-        agent = next((a for a in agents if a.id == variables.get("id")), None)
-        return {"agent": map_agent(agent, agents) if agent else None}
+        agent = ctx.agent(variables.get("id"))
+        return {"agent": project_agent(agent) if agent else None}
+
+    if op == "AgentsDelta":
+        return {"agentsDelta": delta(sim, "agents", str(variables.get("since", "")), ctx)}
 
     if op == "Tasks":
-        return {"tasks": [map_task(t, agents) for t in tasks]}
+        # Filters as on /api/tasks; ``after`` is the id of the last task of the previous page.
+        filters = parse_filters(TASK_FILTERS, {
+            "status": variables.get("status"),
+            "priority": variables.get("priority"),
+            "assignee": variables.get("assigneeId"),
+            "creator": variables.get("creatorId"),
+        })
+        start = 0
+        if variables.get("after"):
+            position = sim.task_index.position(str(variables["after"]), len(tasks))
+            if position is None:
+                return {"tasks": []}
+            start = position + 1
+        matches = sim.task_index.select(tasks, filters, variables.get("updatedSince"), start)
+        if variables.get("limit") is not None:
+            matches = islice(matches, max(0, variables["limit"]))
+        return {"tasks": [project_task(t) for t in matches]}
+
+    if op == "TasksDelta":
+        return {"tasksDelta": delta(sim, "tasks", str(variables.get("since", "")), ctx)}
 
     if op == "Task":
-        task = next((t for t in tasks if t.id == variables.get("id")), None)
-        return {"task": map_task(task, agents) if task else None}
+        task = sim.tasks_by_id.get(variables.get("id"))
+        return {"task": project_task(task) if task else None}
 
     if op in ("CreditHistory", "Credits"):
-        credits = generate_credits(sim)
-        agent_id = variables.get("agentId")
-        if agent_id:
-            credits = [c for c in credits if c["agentId"] == agent_id]
-        credits.sort(key=lambda c: c["createdAt"], reverse=True)
-        offset = variables.get("offset", 0)
-        limit = variables.get("limit", 50)
-        return {"creditHistory": credits[offset : offset + limit]}
+        # Newest first; pass the last item's ``cursor`` as ``after`` for the next page.
+        after = str(variables.get("after") or "")
+        if after and not after.isdigit():
+            return {"creditHistory": []}
+        page, _ = sim.credits.page(
+            variables.get("agentId") or None,
+            int(after) if after else None,
+            variables.get("limit", 50),
+            variables.get("offset", 0),
+        )
+        return {"creditHistory": [{**map_credit(e), "cursor": str(e.id)} for e in page]}
 
     if op == "Events":
         limit = variables.get("limit", 50)
-        mapped = [map_event(e, agents) for e in events[-limit:]]
+        mapped = [map_event(e, ctx) for e in events[-limit:]]
         mapped.reverse()
         return {"events": mapped}
 
     if op == "Messages":
         limit = variables.get("limit", 50)
-        all_msgs = collect_all_messages(agents)
-        mapped = [map_message(m, agents) for m in all_msgs]
-        mapped.sort(key=lambda m: m["createdAt"], reverse=True)
-        return {"messages": mapped[:limit]}
+        return {"messages": [map_message(m, ctx) for m in sim.messages.recent(limit)]}
 
     if op == "AgentReputation":
-        agent = next((a for a in agents if a.id == variables.get("id")), None)
+        agent = ctx.agent(variables.get("id"))
         if not agent:
             return {"agentReputation": None}
-        ts = min(100, 30 + agent.level * 7 + agent.stats.tasks_completed * 2)
+        ts = trust_score(agent)
         return {
             "agentReputation": {
                 "trustScore": ts,
@@ -145,169 +571,444 @@ def handle_graphql(op: str, variables: dict, sim: Simulation) -> dict[str, Any]:
         }
 
     if op == "TrustLeaderboard":
-        mapped = sorted([map_agent(a, agents) for a in agents], key=lambda a: a["trustScore"], reverse=True)
-        return {"trustLeaderboard": mapped[:10]}
+        leaders = sorted(agents, key=trust_score, reverse=True)
+        return {"trustLeaderboard": [project_agent(a) for a in leaders[:10]]}
 
     if op == "Conversations":
-        all_msgs = collect_all_messages(agents)
-        pairs: dict[str, list] = {}
-        for m in all_msgs:
-            key = "::".join(sorted([m.from_agent, m.to]))
-            pairs.setdefault(key, []).append(m)
+        # Newest first; pass the last item's ``cursor`` as ``after`` for the next page.
+        after = str(variables.get("after") or "")
+        if after and not after.isdigit():
+            return {"conversations": []}
+        page = sim.messages.conversations.recent(variables.get("limit"), int(after) if after else None)
         convos = []
-        for key, msgs in pairs.items():
-            a_id, b_id = key.split("::")
-            agent_a = next((a for a in agents if a.id == a_id), None)
-            agent_b = next((a for a in agents if a.id == b_id), None)
-            last = msgs[-1]
+        for conv in page:
+            last = sim.messages[conv.last]
+            agent_a = ctx.agent(conv.a)
+            agent_b = ctx.agent(conv.b)
             convos.append({
-                "id": f"conv-{key}",
+                "id": f"conv-{conv.a}::{conv.b}",
                 "participants": [
-                    {"id": agent_a.id, "name": agent_a.name} if agent_a else {"id": a_id, "name": a_id},
-                    {"id": agent_b.id, "name": agent_b.name} if agent_b else {"id": b_id, "name": b_id},
+                    {"id": agent_a.id, "name": agent_a.name} if agent_a else {"id": conv.a, "name": conv.a},
+                    {"id": agent_b.id, "name": agent_b.name} if agent_b else {"id": conv.b, "name": conv.b},
                 ],
                 "lastMessage": last.body or last.summary or last.type.value,
                 "lastMessageAt": _iso_ms(last.timestamp),
-                "messageCount": len(msgs),
+                "messageCount": conv.count,
+                "cursor": str(conv.last),
             })
-        convos.sort(key=lambda c: c["lastMessageAt"], reverse=True)
         return {"conversations": convos}
 
     return {}
 
 
+def delta(sim: Snapshot, collection: str, since: str, ctx: LookupContext | None = None) -> dict[str, Any]:
+    """Entities of ``collection`` created, updated or removed after cursor ``since``.
+
+    ``cursor`` in the result is what to pass as ``since`` next time. When the
+    cursor is from another epoch or older than the retained change history,
+    ``full`` is true and ``created`` holds the whole collection.
+    """
+    ctx = ctx or lookup_context(sim)
+    if collection == "agents":
+        by_id, everything, project = sim.agents_by_id, sim.agents, map_agent
+    else:
+        by_id, everything, project = sim.tasks_by_id, sim.tasks, map_task
+    cursor = sim.collection_tag(collection)
+    try:
+        version = sim.cursor_version(since)
+    except ValueError:
+        return {"error": "invalid cursor"}
+    changes = sim.changes[collection].since(version) if version is not None else None
+    if changes is None:
+        return {"cursor": cursor, "full": True, "created": [project(e, ctx) for e in everything], "updated": [], "removed": []}
+    created, updated, removed = changes
+    return {
+        "cursor": cursor,
+        "full": False,
+        "created": [project(by_id[i], ctx) for i in created],
+        "updated": [project(by_id[i], ctx) for i in updated],
+        "removed": removed,
+    }
+
+
 # ── SSE stream ───────────────────────────────────────────────────────────────
 
 
-@app.get("/api/stream")
-async def sse_stream(request: Request, task: str | None = None, agent: str | None = None):
-    s = get_sim()
-    queue: asyncio.Queue[SandboxEvent] = asyncio.Queue()
+CONNECTED_FRAME = sse_frame(dumps({"type": "connected", "message": "Stream connected"}))
 
-    def listener(event: SandboxEvent):
-        if task and event.task_id != task:
-            return
-        if agent and event.agent_id != agent:
-            return
-        queue.put_nowait(event)
 
-    unsub = s.on_event(listener)
+@app.get("/api/stream")
+async def sse_stream(
+    request: Request,
+    task: list[str] | None = Query(None),
+    agent: list[str] | None = Query(None),
+    type: list[str] | None = Query(None),
+    org: list[str] | None = Query(None),
+    batch: bool = False,
+    coalesce: bool = False,
+):
+    """Each filter may be repeated or comma-separated; an event must match every filter given.
+
+    Reconnecting clients send ``Last-Event-ID`` and get only the events they missed.
+    ``batch`` sends one frame per tick; ``coalesce`` also keeps only the last event per task.
+    """
+    hub = get_hub()
+    sub = hub.subscribe(
+        parse_filter(agents=agent, tasks=task, types=type, orgs=org, kinds=[EVENT]),
+        request.headers.get("last-event-id"),
+        batch=batch,
+        coalesce=coalesce,
+    )
 
     async def event_generator():
-        yield {"data": json.dumps({"type": "connected", "message": "Stream connected"})}
+        yield CONNECTED_FRAME
         try:
             while True:
                 if await request.is_disconnected():
                     break
-                try:
-                    event = await asyncio.wait_for(queue.get(), timeout=30)
-                    yield {
-                        "data": json.dumps({
-                            "type": event.type,
-                            "agentId": event.agent_id,
-                            "taskId": event.task_id,
-                            "message": event.message,
-                            "timestamp": event.timestamp,
-                            "agentName": next((a.name for a in s.agents if a.id == event.agent_id), None) if event.agent_id else None,
-                        })
-                    }
-                except asyncio.TimeoutError:
-                    yield {"data": json.dumps({"type": "heartbeat"})}
+                chunk = await sub.next()
+                if chunk is None:
+                    break
+                yield chunk
         finally:
-            unsub()
-
-    return EventSourceResponse(event_generator())
+            hub.unsubscribe(sub)
+
+    # Keep-alives come from the hub's shared heartbeat, not a per-connection ping task.
+    return EventSourceResponse(event_generator(), ping=0)
+
+
+# ── WebSocket stream ─────────────────────────────────────────────────────────
+
+WS_CONNECTED = {"type": "connected", "message": "Stream connected"}
+WS_FILTER_KEYS = ("agents", "tasks", "types", "orgs", "kinds")
+
+
+def _ws_codec(websocket: WebSocket, encoding: str | None):
+    """The codec named by the first supported subprotocol offered, else ``encoding``."""
+    for protocol in websocket.scope.get("subprotocols", ()):
+        if protocol in WS_CODECS:
+            return protocol, WS_CODECS[protocol]
+    return None, WS_CODECS.get(encoding or "json")
+
+
+def _ws_control(message: dict[str, Any]) -> dict[str, Any] | None:
+    """Decode a client control message sent as JSON text or msgpack bytes."""
+    try:
+        if message.get("text") is not None:
+            op = json.loads(message["text"])
+        elif message.get("bytes") is not None and msgpack is not None:
+            op = msgpack.unpackb(message["bytes"])
+        else:
+            return None
+    except ValueError:
+        return None
+    return op if isinstance(op, dict) else None
+
+
+def _ws_values(op: dict[str, Any]) -> dict[str, list[str]]:
+    out = {}
+    for key in WS_FILTER_KEYS:
+        values = op.get(key)
+        if isinstance(values, str):
+            values = [values]
+        if isinstance(values, list):
+            out[key] = [str(v) for v in values]
+    return out
+
+
+@app.websocket("/api/ws")
+async def ws_stream(
+    websocket: WebSocket,
+    task: list[str] | None = Query(None),
+    agent: list[str] | None = Query(None),
+    type: list[str] | None = Query(None),
+    org: list[str] | None = Query(None),
+    kind: list[str] | None = Query(None),
+    encoding: str | None = None,
+    lastEventId: str | None = None,
+    batch: bool = False,
+    coalesce: bool = False,
+):
+    """Events and ACP messages over one socket, as JSON text or msgpack binary frames.
+
+    The encoding comes from the ``json`` / ``msgpack`` subprotocol or ``?encoding=``.
+    Filters work as on ``/api/stream`` plus ``kind`` (event, acp). Clients change
+    them in place with ``{"op": "subscribe" | "unsubscribe", "agents": [...]}``
+    or replace them with ``{"op": "filter", ...}``.
+    """
+    protocol, codec = _ws_codec(websocket, encoding)
+    if codec is None:
+        await websocket.close(code=1003, reason="unsupported encoding")
+        return
+    await websocket.accept(subprotocol=protocol)
+    hub = get_hub()
+    sub = hub.subscribe(
+        parse_filter(agents=agent, tasks=task, types=type, orgs=org, kinds=kind),
+        lastEventId,
+        batch=batch,
+        coalesce=coalesce,
+        codec=codec,
+    )
+    send = websocket.send_bytes if codec.binary else (lambda frame: websocket.send_text(frame.decode()))
+
+    async def sender() -> None:
+        await send(codec.control(WS_CONNECTED))
+        while await sub.wait():
+            for frame in sub.take():
+                await send(frame)
+        await websocket.close(code=1013, reason="slow consumer")
+
+    async def receiver() -> None:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            op = _ws_control(message)
+            if op is None or sub.closed:
+                continue
+            values = _ws_values(op)
+            if op.get("op") == "subscribe":
+                hub.refilter(sub, sub.filter.changed(add=values))
+            elif op.get("op") == "unsubscribe":
+                hub.refilter(sub, sub.filter.changed(remove=values))
+            elif op.get("op") == "filter":
+                hub.refilter(sub, parse_filter(**values))
+
+    tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            # A send or receive on a socket the client already closed.
+            if isinstance(t.exception(), (WebSocketDisconnect, RuntimeError)):
+                continue
+            t.result()
+    finally:
+        for t in tasks:
+            t.cancel()
+        hub.unsubscribe(sub)
 
 
 # ── REST endpoints ───────────────────────────────────────────────────────────
 
 
 @app.get("/api/state")
-async def state():
-    s = get_sim()
-    return {
-        "tick": s.tick,
-        "agentCount": len(s.agents),
-        "taskCount": len(s.tasks),
-        "eventCount": len(s.events),
-        "tasksDone": sum(1 for t in s.tasks if t.status.value == "done"),
-    }
+async def state(request: Request):
+    def build(s: Snapshot):
+        return {
+            "tick": s.tick,
+            "agentCount": len(s.agents),
+            "taskCount": len(s.tasks),
+            "eventCount": len(s.events),
+            "tasksDone": sum(1 for t in s.tasks if t.status.value == "done"),
+        }
+
+    return cached_json(request, "/api/state", None, build)
+
+
+def list_page(
+    index: IndexSnapshot,
+    entities: Sequence[Any],
+    filters: dict[str, frozenset[str]],
+    encode: Callable[[Any], bytes],
+    cursor: str | None,
+    limit: int | None,
+    since: int | None = None,
+) -> bytes | dict[str, Any]:
+    """Filtered entities as a plain list, or a ``{items, nextCursor}`` page.
+
+    A page is returned when ``cursor`` or ``limit`` is given; ``cursor`` is
+    the id of the last item of the previous page.
+    """
+    start = 0
+    if cursor:
+        position = index.position(cursor, len(entities))
+        if position is None:
+            return {"error": "invalid cursor"}
+        start = position + 1
+    matches = index.select(entities, filters, since, start)
+    if cursor is None and limit is None:
+        return dumps_array([encode(e) for e in matches])
+    page, more = take(matches, DEFAULT_PAGE_SIZE if limit is None else limit)
+    return _page([encode(e) for e in page], page[-1].id if more and page else None)
+
+
+def _page(items: list[bytes], next_cursor: str | int | None) -> bytes:
+    return b'{"items":' + dumps_array(items) + b',"nextCursor":' + dumps(str(next_cursor) if next_cursor is not None else None) + b"}"
 
 
 @app.get("/api/agents")
-async def agents_list():
-    s = get_sim()
-    return [map_agent(a, s.agents) for a in s.agents]
+async def agents_list(
+    request: Request,
+    since: str | None = None,
+    role: list[str] | None = Query(None),
+    domain: list[str] | None = Query(None),
+    status: list[str] | None = Query(None),
+    parent: list[str] | None = Query(None),
+    cursor: str | None = None,
+    limit: int | None = None,
+):
+    """All agents, or with ``since`` only the changes after that cursor.
+
+    ``role``, ``domain``, ``status`` and ``parent`` filter the list; each may
+    be repeated or comma-separated. Pass ``cursor`` and/or ``limit`` to page it.
+    """
+    if since is not None:
+        return cached_json(request, "/api/agents", {"since": since}, lambda s: delta(s, "agents", since), ("agents",))
+    filters = parse_filters(AGENT_FILTERS, {"role": role, "domain": domain, "status": status, "parent": parent})
+    variables = {**{k: sorted(v) for k, v in filters.items()}, "cursor": cursor, "limit": limit}
+
+    def build(s: Snapshot):
+        ctx = lookup_context(s)
+        return list_page(s.agent_index, s.agents, filters, lambda a: encode_agent(a, ctx), cursor, limit)
+
+    return cached_json(request, "/api/agents", variables, build, ("agents",))
 
 
 @app.get("/api/tasks")
-async def tasks_list():
-    s = get_sim()
-    return [map_task(t, s.agents) for t in s.tasks]
+async def tasks_list(
+    request: Request,
+    since: str | None = None,
+    status: list[str] | None = Query(None),
+    priority: list[str] | None = Query(None),
+    assignee: list[str] | None = Query(None),
+    creator: list[str] | None = Query(None),
+    updatedSince: int | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+    stream: str | None = None,
+):
+    """All tasks, or with ``since`` only the changes after that cursor.
+
+    ``status``, ``priority``, ``assignee`` and ``creator`` filter the list;
+    each may be repeated or comma-separated. ``updatedSince`` (epoch ms)
+    keeps tasks updated at or after that time. Pass ``cursor`` and/or
+    ``limit`` to page it, or ``stream`` to have the whole list streamed.
+    """
+    if since is not None:
+        return cached_json(request, "/api/tasks", {"since": since}, lambda s: delta(s, "tasks", since), ("tasks", "agents"))
+    filters = parse_filters(TASK_FILTERS, {"status": status, "priority": priority, "assignee": assignee, "creator": creator})
+    variables = {**{k: sorted(v) for k, v in filters.items()}, "updatedSince": updatedSince, "cursor": cursor, "limit": limit}
+    try:
+        fmt = stream_format(request, stream)
+    except ValueError:
+        return STREAM_ERROR
+    if fmt is not None:
+        if cursor is not None or limit is not None:
+            return STREAM_ERROR
+
+        def items(s: Snapshot) -> Iterable[bytes]:
+            ctx = lookup_context(s)
+            return (stream_task(t, ctx) for t in s.task_index.select(s.tasks, filters, updatedSince))
+
+        return streamed_json(request, "/api/tasks", variables, items, ("tasks", "agents"), fmt)
+
+    def build(s: Snapshot):
+        ctx = lookup_context(s)
+        return list_page(s.task_index, s.tasks, filters, lambda t: encode_task(t, ctx), cursor, limit, updatedSince)
+
+    return cached_json(request, "/api/tasks", variables, build, ("tasks", "agents"))
 
 
 @app.get("/api/events")
-async def events_list():
-    s = get_sim()
-    return [map_event(e, s.agents) for e in s.events[-100:]]
+async def events_list(
+    request: Request,
+    type: list[str] | None = Query(None),
+    agent: list[str] | None = Query(None),
+    task: list[str] | None = Query(None),
+    start: int | None = Query(None, alias="from"),
+    end: int | None = Query(None, alias="to"),
+    cursor: str | None = None,
+    limit: int | None = None,
+    stream: str | None = None,
+):
+    """The latest 100 events, oldest first.
+
+    ``type``, ``agent`` and ``task`` filter them (repeated or comma-separated),
+    ``from``/``to`` bound their timestamp (epoch ms, ``to`` exclusive). Pass
+    ``cursor`` and/or ``limit`` to page backwards through the whole log, or
+    ``stream`` to have every matching event streamed, oldest first.
+    """
+    if cursor and not cursor.isdigit():
+        return {"error": "invalid cursor"}
+    filters = parse_filters(EVENT_FILTERS, {"type": type, "agent": agent, "task": task})
+    variables = {**{k: sorted(v) for k, v in filters.items()}, "from": start, "to": end, "cursor": cursor, "limit": limit}
+    try:
+        fmt = stream_format(request, stream)
+    except ValueError:
+        return STREAM_ERROR
+    if fmt is not None:
+        if cursor is not None or limit is not None:
+            return STREAM_ERROR
+
+        def items(s: Snapshot) -> Iterable[bytes]:
+            ctx = lookup_context(s)
+            matches = s.event_index.select(s.events, filters, start, end, newest_first=False)
+            return (dumps(map_event(e, ctx)) for e in matches)
+
+        return streamed_json(request, "/api/events", variables, items, ("events", "agents"), fmt)
+
+    def build(s: Snapshot):
+        ctx = lookup_context(s)
+        matches = s.event_index.select(s.events, filters, start, end, int(cursor) if cursor else None)
+        page, more = take(matches, DEFAULT_PAGE_SIZE if limit is None else limit)
+        page.reverse()
+        items = [map_event(e, ctx) for e in page]
+        if cursor is None and limit is None:
+            return items
+        return {"items": items, "nextCursor": str(page[0].id) if more and page else None}
+
+    return cached_json(request, "/api/events", variables, build, ("events", "agents"))
 
 
 @app.get("/api/metrics")
-async def metrics():
-    return get_sim().metrics_history
+async def metrics(request: Request, stream: str | None = None):
+    """The whole metrics history; ``stream`` sends it as it is encoded."""
+    try:
+        fmt = stream_format(request, stream)
+    except ValueError:
+        return STREAM_ERROR
+    if fmt is not None:
+        items = lambda s: (dumps(map_metrics_snapshot(m)) for m in s.metrics_history)  # noqa: E731
+        return streamed_json(request, "/api/metrics", None, items, ("metrics",), fmt)
+    return cached_json(request, "/api/metrics", None, lambda s: [map_metrics_snapshot(m) for m in s.metrics_history], ("metrics",))
+
+
+@app.get("/api/metrics/cache")
+async def cache_metrics():
+    return response_cache.stats()
+
+
+@app.get("/api/metrics/stream")
+async def stream_metrics():
+    return get_hub().stats()
+
+
+@app.get("/api/metrics/engine")
+async def engine_metrics():
+    if engine is not None:
+        return engine.stats()
+    if replica is not None:
+        return replica.stats()
+    return {"running": False}
 
 
 @app.get("/api/metrics/acp")
-async def acp_metrics():
-    s = get_sim()
-    all_msgs = collect_all_messages(s.agents)
-
-    total_acks = total_escalations = total_completions = total_delegations = 0
-    delegation_ts: dict[str, int] = {}
-    ack_latencies: list[int] = []
-    escalations_by_reason: dict[str, int] = {}
-
-    for msg in all_msgs:
-        t = msg.type.value
-        if t == "ack":
-            total_acks += 1
-            key = f"{msg.task_id}::{msg.from_agent}"
-            if key in delegation_ts:
-                ack_latencies.append(msg.timestamp - delegation_ts[key])
-        elif t == "delegation":
-            total_delegations += 1
-            delegation_ts[f"{msg.task_id}::{msg.to}"] = msg.timestamp
-        elif t == "escalation":
-            total_escalations += 1
-            if msg.reason:
-                escalations_by_reason[msg.reason] = escalations_by_reason.get(msg.reason, 0) + 1
-        elif t == "completion":
-            total_completions += 1
-
-    task_delegation_counts: dict[str, int] = {}
-    for msg in all_msgs:
-        if msg.type.value == "delegation" and msg.task_id:
-            task_delegation_counts[msg.task_id] = task_delegation_counts.get(msg.task_id, 0) + 1
-
-    depths = list(task_delegation_counts.values())
-    avg_depth = sum(depths) / len(depths) if depths else 0
-
-    non_backlog = [t for t in s.tasks if t.status.value != "backlog"]
-    done_tasks = [t for t in s.tasks if t.status.value == "done"]
-    completion_rate = len(done_tasks) / len(non_backlog) if non_backlog else 0
-    escalation_rate = total_escalations / len(s.tasks) if s.tasks else 0
-    avg_ack_latency = sum(ack_latencies) // len(ack_latencies) if ack_latencies else 0
+async def acp_metrics(request: Request):
+    # The rolling window moves with the clock as well as with new messages.
+    return cached_json(request, "/api/metrics/acp", None, _acp_metrics, ("messages", "tasks"), vary=lambda s: s.acp.window_slice)
+
 
+def _acp_metrics(s: Snapshot) -> dict[str, Any]:
+    acp = s.acp.summary()
+    counts = s.task_status_counts
+    task_count = len(s.tasks)
+    started = task_count - counts.get(TaskStatus.BACKLOG, 0)
     return {
-        "ackLatencyMs": avg_ack_latency,
-        "escalationRate": round(escalation_rate, 2),
-        "avgDelegationDepth": round(avg_depth, 1),
-        "completionRate": round(completion_rate, 2),
-        "totalAcks": total_acks,
-        "totalEscalations": total_escalations,
-        "totalCompletions": total_completions,
-        "totalDelegations": total_delegations,
-        "escalationsByReason": escalations_by_reason,
+        **acp,
+        "ackLatencyMs": acp["ackLatency"]["meanMs"],
+        "escalationRate": round(acp["totalEscalations"] / task_count, 2) if task_count else 0,
+        "completionRate": round(counts.get(TaskStatus.DONE, 0) / started, 2) if started else 0,
+        "window": s.acp.window(),
     }
 
 
@@ -317,17 +1018,18 @@ async def send_order(request: Request):
     message = body.get("message")
     if not message:
         return {"error": "message required"}
+    return await command("order", message=message)
+
 
-    s = get_sim()
+def _order(s: Simulation, message: str) -> dict[str, Any]:
     coo = next((a for a in s.agents if a.role.value == "coo" or a.level >= 10), None)
     if not coo:
         return {"error": "COO not found"}
 
-    order_msg = _make_acp(ACPType.DELEGATION, "human-principal", coo.id, body=f"[PRIORITY ORDER FROM HUMAN PRINCIPAL]: {message}")
-    coo.recent_messages.append(order_msg)
-    coo.inbox.append(order_msg)
+    order_msg = s.make_acp(ACPType.DELEGATION, "human-principal", coo.id, body=f"[PRIORITY ORDER FROM HUMAN PRINCIPAL]: {message}")
+    s.push_message(order_msg)
 
-    s.events.append(SandboxEvent(type="human_order", agent_id=coo.id, message=f"📢 Human Principal: {message}"))
+    s.add_event("human_order", f"📢 Human Principal: {message}", agent_id=coo.id)
     s.process_order(message)
 
     return {"ok": True, "message": f"Order delivered to {coo.name}"}
@@ -335,9 +1037,15 @@ async def send_order(request: Request):
 
 @app.post("/api/restart")
 async def restart(mode: str = "organic"):
-    await get_sim().restart(mode)
-    s = get_sim()
-    return {"ok": True, "agentCount": len(s.agents), "mode": mode}
+    return {"ok": True, "agentCount": await command("reset", mode=mode), "mode": mode}
+
+
+def _reset(s: Simulation, mode: str) -> int:
+    s.reset(mode)
+    return len(s.agents)
+
+
+INBOX_POLICIES = tuple(p.value for p in InboxPolicy)
 
 
 @app.post("/api/agents/spawn")
@@ -347,18 +1055,29 @@ async def spawn_agent(request: Request):
     if not name:
         return {"error": "name required"}
 
-    s = get_sim()
-    from .agents import make_agent
-    from .types import AgentRole
+    capacity, policy = body.get("inboxCapacity"), body.get("inboxPolicy")
+    if capacity is not None and (type(capacity) is not int or capacity < 1):
+        return {"error": "inboxCapacity must be a positive integer"}
+    if policy is not None and policy not in INBOX_POLICIES:
+        return {"error": f"inboxPolicy must be one of {', '.join(INBOX_POLICIES)}"}
 
     aid = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
-    if any(a.id == aid for a in s.agents):
+    if not await command("spawn", aid=aid, name=name, body=body):
         return {"error": f'Agent "{aid}" already exists'}
+    state = get_state()
+    return {"ok": True, "agent": map_agent(state.agents_by_id[aid], lookup_context(state))}
+
+
+def _spawn(s: Simulation, aid: str, name: str, body: dict[str, Any]) -> bool:
+    from .agents import make_agent
+    from .types import AgentRole
+
+    if aid in s.agents_by_id:
+        return False
 
     role = body.get("role", "worker")
     domain = body.get("domain", "Engineering")
     level = body.get("level", 4)
-
     coo = next((a for a in s.agents if a.role.value == "coo" or a.level >= 10), None)
     if role == "lead":
         parent_id = coo.id if coo else None
@@ -369,30 +1088,40 @@ async def spawn_agent(request: Request):
     new_agent = make_agent(aid, name, AgentRole(role), level, domain, parent_id)
     new_agent.avatar = body.get("avatar")
     new_agent.avatar_color = body.get("avatarColor")
-    s.agents.append(new_agent)
+    inbox = Inbox(body.get("inboxCapacity", s.inbox_capacity), InboxPolicy(body.get("inboxPolicy", s.inbox_policy)))
+    s.add_agent(new_agent, inbox)
 
-    event = SandboxEvent(type="agent_spawned", agent_id=new_agent.id, message=f"🐣 {new_agent.name} has joined the team!")
-    s.events.append(event)
-    s._emit(event)
-
-    return {"ok": True, "agent": map_agent(new_agent, s.agents)}
+    s.add_event("agent_spawned", f"🐣 {new_agent.name} has joined the team!", agent_id=new_agent.id)
+    return True
 
 
 @app.get("/api/speed")
 async def get_speed():
-    return {"tickIntervalMs": get_sim().tick_interval_ms}
+    return {"tickIntervalMs": get_state().tick_interval_ms}
 
 
 @app.put("/api/speed")
 async def set_speed(request: Request):
     body = await request.json()
-    s = get_sim()
+    return {"ok": True, "tickIntervalMs": await command("speed", body=body)}
+
+
+def _set_speed(s: Simulation, body: dict[str, Any]) -> int:
     if "tickIntervalMs" in body:
         s.tick_interval_ms = max(100, min(10000, int(body["tickIntervalMs"])))
     elif "speed" in body:
         base = 800 if hasattr(s, "scenario_engine") else 5000
         s.tick_interval_ms = max(100, round(base / float(body["speed"])))
-    return {"ok": True, "tickIntervalMs": s.tick_interval_ms}
+    return s.tick_interval_ms
+
+
+# Every write a request can make, by name; the engine process runs only these.
+WRITES: dict[str, Callable[..., Any]] = {
+    "order": _order,
+    "reset": _reset,
+    "spawn": _spawn,
+    "speed": _set_speed,
+}
 
 
 @app.get("/api/models")
@@ -407,38 +1136,36 @@ async def models():
 
 
 @app.get("/api/task/{task_id}/activity")
-async def task_activity(task_id: str):
-    s = get_sim()
-    task = next((t for t in s.tasks if t.id == task_id), None)
-    if task:
-        return [
-            {
-                "id": m.id,
-                "type": m.type.value,
-                "from": m.from_agent,
-                "fromName": next((a.name for a in s.agents if a.id == m.from_agent), m.from_agent),
-                "to": m.to,
-                "toName": next((a.name for a in s.agents if a.id == m.to), m.to),
-                "body": m.body,
-                "reason": m.reason,
-                "summary": m.summary,
-                "pct": m.pct,
-                "timestamp": m.timestamp,
-            }
-            for m in task.activity_log
-        ]
-    return []
+async def task_activity(task_id: str, cursor: str | None = None, limit: int | None = None):
+    """Hot window as a plain list; pass ``cursor`` and/or ``limit`` to page the full history."""
+    s = get_state()
+    if cursor is None and limit is None:
+        ctx = lookup_context(s)
+        return FastJSONResponse([map_activity(m, ctx) for m in s.messages.for_task(task_id)])
+    if cursor and not cursor.isdigit():
+        return {"error": "invalid cursor"}
+
+    page, next_cursor = s.messages.task_page(task_id, int(cursor) if cursor else None, limit or 50)
+    activity = s.messages.task_activity(task_id)
+    ctx = lookup_context(s)
+    return FastJSONResponse({
+        "items": [map_activity(m, ctx) for m in page],
+        "nextCursor": str(next_cursor) if next_cursor is not None else None,
+        "total": activity.total if activity else 0,
+        "compacted": {
+            "count": activity.compacted,
+            "expired": activity.expired,
+            "byType": activity.compacted_by_type,
+            "from": activity.compacted_from,
+            "to": activity.compacted_to,
+        } if activity else None,
+    })
 
 
 @app.get("/api/agent/{agent_id}/messages")
 async def agent_messages(agent_id: str):
-    s = get_sim()
-    all_msgs = collect_all_messages(s.agents)
-    return [
-        m.model_dump(by_alias=True)
-        for m in all_msgs
-        if m.from_agent == agent_id or m.to == agent_id
-    ]
+    s = get_state()
+    return FastJSONResponse([map_acp_message(m) for m in s.messages.for_agent(agent_id)])
 
 
 # ── Dashboard static file serving ───────────────────────────────────────────
@@ -0,0 +1,591 @@
+"""Multi-worker serving: one engine process publishes state that worker processes mirror.
+
+The engine process owns the simulation (see ``Engine``). After every tick or
+command it appends a record to the journal with what changed: frozen copies
+of changed agents and tasks, the entries appended to each log and the
+stream items. It then atomically replaces ``state.bin``, a small header with
+the versions, change logs, ACP summary and how much of the journal is
+committed. The journal is split into segment files, each starting with a
+checkpoint of the whole state, so a worker that starts late reads the
+latest segment rather than the whole history. Workers map the journal
+read-only, replay new records into a local ``Replica`` and serve reads from
+its snapshots, so reads scale with the number of workers. Writes are
+forwarded to the engine over a Unix socket in the same directory, and
+answered once the worker's replica has caught up with the write. Commands
+on the socket are a name plus JSON arguments, and the engine only runs the
+writes it was given by name, so nothing a client sends is unpickled.
+
+Reads are not served zero-copy from the shared mapping: the records are
+pickled Python objects, which have to be unpickled before the read paths,
+indexes and projection caches can use them. The mapping is only how records
+reach the workers, and each worker holds its own copy of the state, so
+memory grows with the number of workers (about N times the engine's state
+for N workers, plus the engine's own).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, BinaryIO, Callable
+
+from .encoding import dumps
+from .engine import Engine, Snapshot, StateView
+from .metrics import AcpMetricsSnapshot
+from .query import AGENT_FILTERS, TASK_FILTERS, CollectionIndex, EventIndex
+from .store import DEFAULT_ACTIVITY_HISTORY, DEFAULT_ACTIVITY_WINDOW, ChangeLog, CreditLedger, MessageLog
+from .stream import DEFAULT_CLIENT_BUFFER, DEFAULT_REPLAY_EVENTS, BroadcastHub, StreamItem
+from .types import ACPMessage, CreditEntry, MetricsSnapshot, SandboxAgent, SandboxEvent, SandboxTask, TaskStatus
+
+log = logging.getLogger(__name__)
+
+STATE_FILE = "state.bin"
+JOURNAL_FILE = "journal.{}.bin"
+SOCKET_FILE = "engine.sock"
+DEFAULT_POLL_MS = 20
+DEFAULT_SEGMENT_BYTES = 64 * 2**20
+
+# Journal records are a little-endian length then a pickle; socket messages
+# the same length then JSON.
+_LENGTH = struct.Struct("<Q")
+_MAX_MESSAGE = 1 << 20
+
+
+class CommandError(Exception):
+    """A write that failed in the engine process; ``type`` names the exception it raised."""
+
+    def __init__(self, type: str, message: str) -> None:
+        super().__init__(message)
+        self.type = type
+
+
+# ── Wire format ──────────────────────────────────────────────────────────────
+
+
+@dataclass(slots=True, kw_only=True)
+class SharedState:
+    """Header replaced after every publish; ``journal_end`` bytes of journal ``segment`` are committed."""
+
+    epoch: str
+    version: int
+    generation: int
+    tick: int
+    tick_interval_ms: int
+    collection_versions: dict[str, int]
+    task_status_counts: dict[TaskStatus, int]
+    changes: dict[str, ChangeLog]
+    acp: AcpMetricsSnapshot
+    segment: int
+    journal_end: int
+
+
+@dataclass(slots=True, kw_only=True)
+class JournalRecord:
+    """Everything that changed between two snapshots.
+
+    A ``full`` record holds the whole state and replaces every collection
+    and log: the first record of each journal segment, and the first after
+    the simulation was reset (a new ``generation``).
+    """
+
+    full: bool
+    generation: int
+    agents: list[SandboxAgent]
+    tasks: list[SandboxTask]
+    events: list[SandboxEvent]
+    messages: list[ACPMessage]
+    credits: list[CreditEntry]
+    metrics: list[MetricsSnapshot]
+    items: list[tuple]  # StreamItem fields: id, kind, type, agents, task_id, data
+    tick: int | None  # set when the record closes a tick
+
+
+def _frame(payload: Any) -> bytes:
+    data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    return _LENGTH.pack(len(data)) + data
+
+
+def _message(payload: Any) -> bytes:
+    data = dumps(payload)
+    return _LENGTH.pack(len(data)) + data
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Any:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    if length > _MAX_MESSAGE:
+        raise ConnectionError(f"message of {length} bytes")
+    return json.loads(await reader.readexactly(length))
+
+
+# ── Engine side ──────────────────────────────────────────────────────────────
+
+
+class Publisher:
+    """Writes each snapshot as a journal record plus a new state header.
+
+    Changed entities are found by identity: snapshots share the frozen copy
+    of every entity that did not change, so anything not shared with the
+    previous snapshot goes into the record.
+
+    Once the current segment has grown ``segment_bytes`` past its
+    checkpoint, the next segment is started with a checkpoint of the
+    snapshot just published. The segment before the previous one is then
+    deleted; replicas one segment behind finish reading the previous one.
+    """
+
+    __slots__ = ("directory", "segment_bytes", "segment", "_journal", "_checkpoint_end", "_previous", "_seq")
+
+    def __init__(self, directory: Path, segment_bytes: int = DEFAULT_SEGMENT_BYTES) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        for stale in directory.glob(JOURNAL_FILE.format("*")):
+            stale.unlink()
+        self.segment = 0
+        self._journal = open(directory / JOURNAL_FILE.format(0), "wb")
+        self._checkpoint_end = 0
+        self._previous: Snapshot | None = None
+        self._seq = 0
+
+    def close(self) -> None:
+        self._journal.close()
+
+    def publish(self, snap: Snapshot, items: list[StreamItem], tick: int | None = None) -> None:
+        prev = self._previous
+        if prev is not None and (prev.epoch, prev.generation) != (snap.epoch, snap.generation):
+            prev = None
+        # The first publish is a full record, which makes it segment 0's checkpoint.
+        self._journal.write(_frame(_record(snap, prev, items, tick)))
+        self._journal.flush()
+        if self._journal.tell() - self._checkpoint_end >= self.segment_bytes:
+            self._start_segment(snap)
+        state = SharedState(
+            epoch=snap.epoch,
+            version=snap.version,
+            generation=snap.generation,
+            tick=snap.tick,
+            tick_interval_ms=snap.tick_interval_ms,
+            collection_versions=snap.collection_versions,
+            task_status_counts=snap.task_status_counts,
+            changes=snap.changes,
+            acp=snap.acp,
+            segment=self.segment,
+            journal_end=self._journal.tell(),
+        )
+        self._seq += 1
+        tmp = self.directory / (STATE_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_LENGTH.pack(self._seq))
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.directory / STATE_FILE)
+        self._previous = snap
+
+    def _start_segment(self, snap: Snapshot) -> None:
+        self._journal.close()
+        self.segment += 1
+        self._journal = open(self.directory / JOURNAL_FILE.format(self.segment), "wb")
+        self._journal.write(_frame(_record(snap, None, [], None)))
+        self._journal.flush()
+        self._checkpoint_end = self._journal.tell()
+        (self.directory / JOURNAL_FILE.format(self.segment - 2)).unlink(missing_ok=True)
+
+
+def _record(snap: Snapshot, prev: Snapshot | None, items: list[StreamItem], tick: int | None) -> JournalRecord:
+    """What changed since ``prev``; everything when it is None."""
+    return JournalRecord(
+        full=prev is None,
+        generation=snap.generation,
+        agents=_changed(snap.agents, prev.agents if prev else (), prev.agents_by_id if prev else {}),
+        tasks=_changed(snap.tasks, prev.tasks if prev else (), prev.tasks_by_id if prev else {}),
+        events=snap.events[len(prev.events) if prev else 0 :],
+        messages=[snap.messages[i] for i in range(len(prev.messages) if prev else 0, len(snap.messages))],
+        credits=[snap.credits[i] for i in range(len(prev.credits) if prev else 0, len(snap.credits))],
+        metrics=snap.metrics_history[len(prev.metrics_history) if prev else 0 :],
+        items=[(i.id, i.kind, i.type, i.agents, i.task_id, i.data) for i in items],
+        tick=tick,
+    )
+
+
+def _changed(entities: tuple, previous: tuple, previous_by_id: dict) -> list:
+    if entities is previous:
+        return []
+    return [e for e in entities if previous_by_id.get(e.id) is not e]
+
+
+class SharedEngine(Engine):
+    """An ``Engine`` whose snapshots go to the shared files instead of a local hub."""
+
+    __slots__ = ("publisher",)
+
+    def __init__(self, sim: Any, loop: asyncio.AbstractEventLoop, publisher: Publisher) -> None:
+        super().__init__(sim, loop)
+        self.publisher = publisher
+        publisher.publish(self.snapshot, [])
+
+    def _deliver(self, snapshot: Snapshot, items: list[StreamItem], tick: int | None) -> None:
+        self.snapshot = snapshot
+        self.publisher.publish(snapshot, items, tick)
+
+
+async def serve_engine(
+    directory: Path,
+    sim: Any,
+    writes: dict[str, Callable[..., Any]],
+    segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+) -> None:
+    """Run ``sim`` and answer worker commands until cancelled.
+
+    A command ``{"op", "args"}`` runs ``writes[op](sim, **args)``; the reply
+    is ``{"result", "error", "version"}``, all JSON.
+    """
+    engine = SharedEngine(sim, asyncio.get_running_loop(), Publisher(directory, segment_bytes))
+    engine.start()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await _read_message(reader)
+                try:
+                    write = writes.get(command["op"])
+                    if write is None:
+                        raise ValueError(f"unknown command {command['op']!r}")
+                    result, error = await engine.submit(partial(write, **command["args"])), None
+                except Exception as exc:
+                    result, error = None, {"type": type(exc).__name__, "message": str(exc)}
+                writer.write(_message({"result": result, "error": error, "version": engine.snapshot.version}))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    path = directory / SOCKET_FILE
+    server = await asyncio.start_unix_server(handle, path=str(path))
+    os.chmod(path, 0o600)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        engine.stop()
+        engine.publisher.close()
+
+
+def run_engine(directory: str) -> None:
+    """Entry point of the engine process started by ``start_engine_process``."""
+    from .server import WRITES, simulation_from_env
+
+    segment_bytes = int(os.environ.get("JOURNAL_SEGMENT_MB", str(DEFAULT_SEGMENT_BYTES // 2**20))) * 2**20
+    asyncio.run(serve_engine(Path(directory), simulation_from_env(), WRITES, segment_bytes))
+
+
+def start_engine_process(directory: str | None = None) -> Path:
+    """Start the engine in a child process; returns the directory workers attach to."""
+    import multiprocessing
+
+    path = Path(directory or tempfile.mkdtemp(prefix="bikinibottom-"))
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # mkdir leaves an existing directory's mode alone; only this user may reach the socket.
+    os.chmod(path, 0o700)
+    process = multiprocessing.get_context("spawn").Process(target=run_engine, args=(str(path),), name="simulation-engine", daemon=True)
+    process.start()
+    return path
+
+
+# ── Worker side ──────────────────────────────────────────────────────────────
+
+
+class Replica(StateView):
+    """A worker's copy of the engine's state, kept current from the shared files.
+
+    Exposes the same attributes as ``Simulation`` so ``Snapshot.of`` can
+    snapshot it; entities arrive already frozen and are never modified here.
+    Stream items are republished into the worker's own hub after the
+    snapshot that contains them.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        activity_window: int = DEFAULT_ACTIVITY_WINDOW,
+        activity_history: int = DEFAULT_ACTIVITY_HISTORY,
+        stream_buffer: int = DEFAULT_CLIENT_BUFFER,
+        stream_replay: int = DEFAULT_REPLAY_EVENTS,
+    ) -> None:
+        self.directory = directory
+        self.activity_window = activity_window
+        self.activity_history = activity_history
+        self.epoch = ""
+        self.generation = -1
+        self.version = 0
+        self.tick = 0
+        self.tick_interval_ms = 0
+        self.collection_versions: dict[str, int] = {}
+        self.task_status_counts: dict[TaskStatus, int] = {}
+        self.changes: dict[str, ChangeLog] = {}
+        self.acp: AcpMetricsSnapshot | None = None
+        self._reset_logs()
+        self.snapshot: Snapshot | None = None
+        self.hub = BroadcastHub(stream_buffer, lineage=lambda agent_id: self.snapshot.lineage(agent_id), replay=stream_replay)
+        self._seq = -1
+        # The journal segment being read, its open file and mapping, and how far it has been read.
+        self._segment = -1
+        self._file: BinaryIO | None = None
+        self._mm: mmap.mmap | None = None
+        self._offset = 0
+        self._connection: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._lock = asyncio.Lock()
+        # One ``_load`` thread at a time: it owns the journal position.
+        self._loading = asyncio.Lock()
+        # Set by ``refresh`` when it applied something, then replaced; ``_wake``
+        # cuts the ``run`` loop's sleep short for a waiting write.
+        self._refreshed = asyncio.Event()
+        self._wake = asyncio.Event()
+        self.refreshes = 0
+        # Set while ``run`` polls; ``last_error`` is its latest failed refresh, if the last one failed.
+        self.running = False
+        self.refresh_errors = 0
+        self.last_error: Exception | None = None
+
+    def _reset_logs(self) -> None:
+        self.agents: list[SandboxAgent] = []
+        self.agents_by_id: dict[str, SandboxAgent] = {}
+        self.tasks: list[SandboxTask] = []
+        self.tasks_by_id: dict[str, SandboxTask] = {}
+        self.events: list[SandboxEvent] = []
+        self.metrics_history: list[MetricsSnapshot] = []
+        self.messages = MessageLog(self.activity_window, self.activity_history)
+        self.credits = CreditLedger()
+        self.agent_index = CollectionIndex(AGENT_FILTERS)
+        self.task_index = CollectionIndex(TASK_FILTERS, ordered=lambda t: t.updated_at)
+        self.event_index = EventIndex()
+
+    def refresh(self) -> bool:
+        """Apply everything published since the last call; False when nothing was."""
+        return self._apply_update(self._load())
+
+    async def update(self) -> bool:
+        """``refresh``, with the files read and unpickled off the event loop."""
+        async with self._loading:
+            return self._apply_update(await asyncio.to_thread(self._load))
+
+    def _load(self) -> tuple[int, SharedState, list[JournalRecord]] | None:
+        """Read the state header and the journal records after it; None when nothing is new.
+
+        Touches only the journal position, so it can run on another thread.
+        """
+        try:
+            with open(self.directory / STATE_FILE, "rb") as f:
+                (seq,) = _LENGTH.unpack(f.read(_LENGTH.size))
+                if seq == self._seq:
+                    return None
+                state: SharedState = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if state.epoch != self.epoch:
+            # A new engine process: its journal starts over.
+            self._resync()
+        try:
+            records = self._read_journal(state.segment, state.journal_end)
+        except FileNotFoundError:
+            # Already replaced by a newer segment; the next header names it.
+            return None
+        return seq, state, records
+
+    def _apply_update(self, update: tuple[int, SharedState, list[JournalRecord]] | None) -> bool:
+        if update is None:
+            return False
+        seq, state, records = update
+        if state.epoch != self.epoch:
+            self.epoch = self.hub.epoch = state.epoch
+            self.generation = -1
+            self.snapshot = None
+        deliveries = [self._apply(record) for record in records]
+        self.version = state.version
+        self.tick = state.tick
+        self.tick_interval_ms = state.tick_interval_ms
+        self.collection_versions = state.collection_versions
+        self.task_status_counts = state.task_status_counts
+        self.changes = state.changes
+        self.acp = state.acp
+        self._seq = seq
+        self.snapshot = Snapshot.of(self, self.snapshot, frozen=True)
+        self.refreshes += 1
+        self._notify()
+        hub = self.hub
+        for items, tick in deliveries:
+            for item in items:
+                hub.publish(item)
+            if tick is not None:
+                hub.flush(tick)
+        return True
+
+    def _notify(self) -> None:
+        refreshed, self._refreshed = self._refreshed, asyncio.Event()
+        refreshed.set()
+
+    def _resync(self) -> None:
+        """Start over from the current segment's checkpoint on the next load."""
+        self._close_segment()
+        self._segment = -1
+        self._seq = -1
+
+    def _read_journal(self, segment: int, end: int) -> list[JournalRecord]:
+        """Records up to ``end`` of ``segment``, from where the last call stopped.
+
+        Moving on to the next segment, the rest of the current one is read
+        and the new checkpoint skipped. A replica that is new or further
+        behind starts from the checkpoint instead.
+        """
+        records: list[JournalRecord] = []
+        if segment != self._segment:
+            journal = open(self.directory / JOURNAL_FILE.format(segment), "rb")
+            if self._file is not None and self._segment == segment - 1:
+                # The open file stays readable even once the engine has deleted it.
+                records = self._read_records(None)
+                (length,) = _LENGTH.unpack(journal.read(_LENGTH.size))
+                offset = _LENGTH.size + length
+            else:
+                offset = 0
+            self._close_segment()
+            self._file, self._segment, self._offset = journal, segment, offset
+        return records + self._read_records(end)
+
+    def _read_records(self, end: int | None) -> list[JournalRecord]:
+        """Records of the open segment from ``_offset`` to ``end``, or to the end of the file."""
+        if end is None:
+            end = os.fstat(self._file.fileno()).st_size
+        if self._offset >= end:
+            return []
+        if self._mm is None or len(self._mm) < end:
+            if self._mm is not None:
+                self._mm.close()
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        records = []
+        with memoryview(self._mm) as view:
+            offset = self._offset
+            while offset < end:
+                (length,) = _LENGTH.unpack_from(view, offset)
+                offset += _LENGTH.size
+                records.append(pickle.loads(view[offset : offset + length]))
+                offset += length
+        self._offset = offset
+        return records
+
+    def _close_segment(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _apply(self, record: JournalRecord) -> tuple[list[StreamItem], int | None]:
+        if record.full:
+            self.generation = record.generation
+            self._reset_logs()
+        for collection, by_id, index, entities in (
+            (self.agents, self.agents_by_id, self.agent_index, record.agents),
+            (self.tasks, self.tasks_by_id, self.task_index, record.tasks),
+        ):
+            for entity in entities:
+                position = index.positions.get(entity.id)
+                if position is None:
+                    collection.append(entity)
+                else:
+                    collection[position] = entity
+                by_id[entity.id] = entity
+                index.update(entity)
+        for event in record.events:
+            self.event_index.add(len(self.events), event)
+            self.events.append(event)
+        self.metrics_history.extend(record.metrics)
+        for msg in record.messages:
+            self.messages.append(msg)
+        for entry in record.credits:
+            self.credits.append(entry)
+        return [StreamItem(*fields) for fields in record.items], record.tick
+
+    async def wait_ready(self, timeout: float = 30.0) -> None:
+        """Wait for the engine's first publish."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not await self.update() and self.snapshot is None:
+            if loop.time() > deadline:
+                raise TimeoutError(f"no engine state in {self.directory}")
+            await asyncio.sleep(0.05)
+
+    async def run(self, interval_ms: int = DEFAULT_POLL_MS) -> None:
+        """Refresh every ``interval_ms``, or at once when a write is waiting for its version.
+
+        A refresh that fails is logged and counted, the replica starts over
+        from the latest checkpoint, and writes waiting for a version fail.
+        """
+        self.running = True
+        try:
+            while True:
+                try:
+                    await self.update()
+                    self.last_error = None
+                except Exception as exc:
+                    self.refresh_errors += 1
+                    self.last_error = exc
+                    log.exception("replica refresh failed")
+                    self._resync()
+                    self._notify()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), interval_ms / 1000)
+                except TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            self.running = False
+            self._notify()
+
+    async def submit(self, op: str, args: dict[str, Any]) -> Any:
+        """Run the engine's write ``op`` with JSON ``args``; returns once this replica reflects it.
+
+        Catching up is left to the ``run`` loop, which must be running.
+        Raises ``CommandError`` when the write raised in the engine process.
+        """
+        async with self._lock:
+            if self._connection is None:
+                self._connection = await asyncio.open_unix_connection(str(self.directory / SOCKET_FILE))
+            reader, writer = self._connection
+            try:
+                writer.write(_message({"op": op, "args": args}))
+                await writer.drain()
+                reply = await _read_message(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self._connection = None
+                raise
+        while self.version < reply["version"]:
+            if not self.running:
+                raise RuntimeError("replica is not refreshing")
+            refreshed = self._refreshed
+            self._wake.set()
+            await refreshed.wait()
+            if self.last_error is not None and self.version < reply["version"]:
+                raise RuntimeError("replica refresh failed") from self.last_error
+        if reply["error"] is not None:
+            raise CommandError(**reply["error"])
+        return reply["result"]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "mode": "replica",
+            "pid": os.getpid(),
+            "refreshes": self.refreshes,
+            "refreshErrors": self.refresh_errors,
+            "journalSegment": self._segment,
+            "journalBytes": self._offset,
+            "snapshotVersion": self.version,
+        }
@@ -5,15 +5,25 @@ from __future__ import annotations
 import asyncio
 import random
 import time
-from typing import Callable
+import uuid
 
 from .agents import make_agent
+from .engine import Snapshot, StateView
+from .mappers import map_acp_message, map_stream_event
+from .metrics import DEFAULT_WINDOW_MS, AcpMetrics
+from .query import AGENT_FILTERS, TASK_FILTERS, CollectionIndex, EventIndex
+from .store import DEFAULT_ACTIVITY_HISTORY, DEFAULT_ACTIVITY_WINDOW, DEFAULT_CHANGE_RETENTION, ChangeLog, CreditLedger, MessageLog
+from .stream import ACP, DEFAULT_CLIENT_BUFFER, DEFAULT_REPLAY_EVENTS, EVENT, BroadcastHub, StreamItem
 from .types import (
     ACPMessage,
+    DEFAULT_INBOX_CAPACITY,
     ACPType,
     AgentRole,
     AgentStats,
     AgentStatus,
+    IdGenerator,
+    Inbox,
+    InboxPolicy,
     MetricsSnapshot,
     SandboxAgent,
     SandboxEvent,
@@ -21,8 +31,8 @@ from .types import (
     TaskPriority,
     TaskStatus,
     TriggerMode,
-    _acp_id,
     _now_ms,
+    parse_seq,
 )
 
 
@@ -119,18 +129,19 @@ HIRE_FLAVORS = [
 BLOCKED_REASONS = ["Missing requirements", "Dependency not ready", "Need clarification", "Waiting on external service"]
 
 
-# ── Seed tasks ───────────────────────────────────────────────────────────────
+# ── Inboxes ──────────────────────────────────────────────────────────────────
+
+INBOX_DRAIN_PER_TICK = 10
 
-_task_counter = 0
+FINISHED = (TaskStatus.DONE, TaskStatus.REJECTED)
 
+# Collections with their own change version, for per-resource ETags.
+COLLECTIONS = ("agents", "tasks", "events", "messages", "metrics")
 
-def _next_task_id() -> str:
-    global _task_counter
-    _task_counter += 1
-    return f"TASK-{_task_counter:04d}"
 
+# ── Seed tasks ───────────────────────────────────────────────────────────────
 
-def create_seed_tasks() -> list[SandboxTask]:
+def create_seed_tasks(ids: IdGenerator) -> list[SandboxTask]:
     seeds = [
         ("Fix Safari login crash", "Reproduce and fix.", TaskPriority.CRITICAL),
         ("Q1 financial report", "Compile Q1 revenue, expenses, and projections.", TaskPriority.HIGH),
@@ -147,46 +158,74 @@ def create_seed_tasks() -> list[SandboxTask]:
     ]
     now = _now_ms()
     return [
-        SandboxTask(id=_next_task_id(), title=t, description=d, priority=p, creator_id="mr-krabs", created_at=now, updated_at=now)
+        SandboxTask(id=ids.task_id(), title=t, description=d, priority=p, creator_id="mr-krabs", created_at=now, updated_at=now)
         for t, d, p in seeds
     ]
 
 
-# ── Helpers ──────────────────────────────────────────────────────────────────
-
-
-def _push_message(agents: list[SandboxAgent], msg: ACPMessage) -> None:
-    for agent in agents:
-        if agent.id in (msg.from_agent, msg.to):
-            agent.recent_messages.append(msg)
-            if len(agent.recent_messages) > 10:
-                agent.recent_messages = agent.recent_messages[-10:]
-        if agent.id == msg.to and agent.trigger == TriggerMode.EVENT_DRIVEN:
-            if not agent.trigger_on or msg.type in agent.trigger_on:
-                agent.inbox.append(msg)
-
-
-def _make_acp(type: ACPType, from_agent: str, to: str, task_id: str = "", **extra) -> ACPMessage:
-    return ACPMessage(id=_acp_id(), type=type, **{"from": from_agent}, to=to, taskId=task_id, timestamp=_now_ms(), **extra)
-
-
 # ── Simulation ───────────────────────────────────────────────────────────────
 
 
-class Simulation:
+class Simulation(StateView):
     """Deterministic tick-based multi-agent simulation."""
 
-    def __init__(self, agents: list[SandboxAgent], tick_interval_ms: int = 5000):
+    def __init__(
+        self,
+        agents: list[SandboxAgent],
+        tick_interval_ms: int = 5000,
+        activity_window: int = DEFAULT_ACTIVITY_WINDOW,
+        activity_history: int = DEFAULT_ACTIVITY_HISTORY,
+        change_retention: int = DEFAULT_CHANGE_RETENTION,
+        acp_window_ms: int = DEFAULT_WINDOW_MS,
+        stream_buffer: int = DEFAULT_CLIENT_BUFFER,
+        stream_replay: int = DEFAULT_REPLAY_EVENTS,
+        inbox_capacity: int = DEFAULT_INBOX_CAPACITY,
+        inbox_policy: InboxPolicy = InboxPolicy.DROP_OLDEST,
+    ):
+        self.ids = IdGenerator()
+        self.activity_window = activity_window
+        self.activity_history = activity_history
+        # Inbox settings for agents that do not bring their own (see add_agent).
+        self.inbox_capacity = inbox_capacity
+        self.inbox_policy = inbox_policy
         self.agents = agents
+        self.agents_by_id: dict[str, SandboxAgent] = {a.id: a for a in agents}
         self.tasks: list[SandboxTask] = []
+        self.tasks_by_id: dict[str, SandboxTask] = {}
+        self.messages = MessageLog(activity_window, activity_history)
+        self.acp = AcpMetrics(acp_window_ms)
+        self.credits = CreditLedger()
+        # Tasks per status, kept current by _touch_task.
+        self.task_status_counts: dict[TaskStatus, int] = {}
+        self._counted_status: dict[str, TaskStatus] = {}
         self.events: list[SandboxEvent] = []
+        # Filter indexes, kept current by _touch_agent, _touch_task and add_event.
+        self._reset_indexes()
         self.tick = 0
+        # Bumped on every state change; (epoch, version) identifies a state.
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        # Bumped by reset(), which replaces every log instead of appending to it.
+        self.generation = 0
+        # Global version at the last change of each collection.
+        self.collection_versions: dict[str, int] = dict.fromkeys(COLLECTIONS, 0)
+        # Per-entity change history backing the ?since= delta reads.
+        self.changes = {"agents": ChangeLog(change_retention), "tasks": ChangeLog(change_retention)}
         self.tick_interval_ms = tick_interval_ms
         self.metrics_history: list[MetricsSnapshot] = []
-        self._sse_listeners: list[Callable[[SandboxEvent], None]] = []
+        self.hub = BroadcastHub(stream_buffer, lineage=self.lineage, epoch=self.epoch, replay=stream_replay)
+        # Stream items wait here instead of going to the hub while an Engine
+        # runs the simulation on its own thread; it delivers them on the loop.
+        self.outbox: list[StreamItem] | None = None
+        self._last_item_id = 0
+        self._snapshot: Snapshot | None = None
         self._pending_hires: list[str] = []
         self._pending_tasks: list[dict] = []
         self._spawn_queue: list[SandboxAgent] = []
+        # Agents whose inbox changed this tick; touched once when the tick ends.
+        self._inbox_changed: dict[str, SandboxAgent] = {}
+        # Tasks that finished this tick, retired from the ACP metrics when it ends.
+        self._finished_tasks: list[str] = []
         self._running = False
 
         # Staggered spawn: only COO starts active
@@ -196,6 +235,9 @@ class Simulation:
         for a in others:
             a.status = AgentStatus.PENDING
         self._spawn_queue = others
+        for a in agents:
+            a.inbox = self.new_inbox()
+            self._touch_agent(a, created=True)
 
         self._log("🌊 BikiniBottom Sandbox started (FastAPI + deterministic)")
         self._log(f"   {len(agents)} agents | tick interval: {tick_interval_ms}ms")
@@ -203,26 +245,147 @@ class Simulation:
     # ── Event system ─────────────────────────────────────────────────────
 
     def _log(self, msg: str) -> None:
-        event = SandboxEvent(type="system", message=msg)
-        self.events.append(event)
-        self._emit(event)
+        self.add_event("system", msg)
         print(msg)
 
     def _log_agent(self, agent: SandboxAgent, msg: str, task_id: str | None = None) -> None:
-        event = SandboxEvent(type="agent_action", agent_id=agent.id, task_id=task_id, message=msg)
+        self.add_event("agent_action", msg, agent_id=agent.id, task_id=task_id)
+
+    def add_event(self, type: str, message: str, agent_id: str | None = None, task_id: str | None = None) -> SandboxEvent:
+        event = SandboxEvent(id=self.ids.next(), type=type, agent_id=agent_id, task_id=task_id, message=message)
+        self.event_index.add(len(self.events), event)
         self.events.append(event)
+        self._bump("events")
         self._emit(event)
+        return event
 
     def _emit(self, event: SandboxEvent) -> None:
-        for listener in self._sse_listeners:
-            try:
-                listener(event)
-            except Exception:
-                pass
-
-    def on_event(self, callback: Callable[[SandboxEvent], None]) -> Callable[[], None]:
-        self._sse_listeners.append(callback)
-        return lambda: self._sse_listeners.remove(callback)
+        agents = (event.agent_id,) if event.agent_id else ()
+        data = map_stream_event(event, self.agents_by_id.get(event.agent_id))
+        self._publish(StreamItem(event.id, EVENT, event.type, agents, event.task_id, data))
+
+    def _publish(self, item: StreamItem) -> None:
+        self._last_item_id = item.id
+        if self.outbox is None:
+            self.hub.publish(item)
+        else:
+            self.outbox.append(item)
+
+    # ── Agents & messages ────────────────────────────────────────────────
+
+    def new_inbox(self) -> Inbox:
+        return Inbox(self.inbox_capacity, self.inbox_policy)
+
+    def add_agent(self, agent: SandboxAgent, inbox: Inbox | None = None) -> None:
+        """Add ``agent`` with ``inbox``, or an empty inbox with the simulation's settings."""
+        agent.inbox = self.new_inbox() if inbox is None else inbox
+        self.agents.append(agent)
+        self.agents_by_id[agent.id] = agent
+        self._touch_agent(agent, created=True)
+
+    def snapshot(self) -> Snapshot:
+        """Read-only view of the current state; the same object until the state changes."""
+        previous = self._snapshot
+        if previous is None or previous.version != self.version or previous.tick_interval_ms != self.tick_interval_ms:
+            self._snapshot = Snapshot.of(self, previous)
+        return self._snapshot
+
+    def _reset_indexes(self) -> None:
+        self.agent_index = CollectionIndex(AGENT_FILTERS)
+        self.task_index = CollectionIndex(TASK_FILTERS, ordered=lambda t: t.updated_at)
+        self.event_index = EventIndex()
+
+    def _bump(self, *collections: str) -> int:
+        self.version += 1
+        for name in collections:
+            self.collection_versions[name] = self.version
+        return self.version
+
+    def _touch_agent(self, agent: SandboxAgent, created: bool = False) -> None:
+        """Record a change to ``agent`` so its cached API projection is rebuilt."""
+        agent.version = self._bump("agents")
+        agent.updated_at = _now_ms()
+        self.changes["agents"].record(agent.id, agent.version, created=created)
+        self.agent_index.update(agent)
+
+    def _touch_task(self, task: SandboxTask, created: bool = False) -> None:
+        """Record a change to ``task`` so its cached API projection is rebuilt."""
+        task.version = self._bump("tasks")
+        task.updated_at = _now_ms()
+        self.changes["tasks"].record(task.id, task.version, created=created)
+        self.task_index.update(task)
+        previous = self._counted_status.get(task.id)
+        if previous != task.status:
+            counts = self.task_status_counts
+            if previous is not None:
+                counts[previous] -= 1
+            counts[task.status] = counts.get(task.status, 0) + 1
+            self._counted_status[task.id] = task.status
+            if task.status in FINISHED:
+                self._finished_tasks.append(task.id)
+
+    def add_task(self, task: SandboxTask) -> None:
+        self.tasks.append(task)
+        self.tasks_by_id[task.id] = task
+        self._touch_task(task, created=True)
+
+    def make_acp(self, type: ACPType, from_agent: str, to: str, task_id: str = "", **extra) -> ACPMessage:
+        return ACPMessage(id=self.ids.acp_id(), type=type, from_agent=from_agent, to=to, task_id=task_id, timestamp=_now_ms(), **extra)
+
+    def _publish_message(self, msg: ACPMessage) -> None:
+        try:
+            seq = parse_seq(msg.id)
+        except ValueError:
+            seq = 0
+        if seq <= self._last_item_id:
+            # Built outside this simulation's id sequence; stream ids must keep increasing.
+            seq = self.ids.next()
+        data = map_acp_message(msg)
+        self._publish(StreamItem(seq, ACP, msg.type.value, (msg.from_agent, msg.to), msg.task_id or None, data))
+
+    def push_message(self, msg: ACPMessage) -> bool:
+        """Append to the shared message log and deliver to the recipient's inbox.
+
+        Returns False when the recipient's inbox refused the message under the
+        backpressure policy; the sender then sits out its next turn.
+        """
+        self.messages.append(msg)
+        self.acp.record(msg)
+        self._bump("messages")
+        self._publish_message(msg)
+        recipient = self.agents_by_id.get(msg.to)
+        if recipient is not None and recipient.trigger == TriggerMode.EVENT_DRIVEN:
+            if not recipient.trigger_on or msg.type in recipient.trigger_on:
+                delivered = recipient.inbox.push(msg)
+                self._inbox_changed[recipient.id] = recipient
+                if not delivered:
+                    sender = self.agents_by_id.get(msg.from_agent)
+                    if sender is not None:
+                        sender.throttled_until_tick = self.tick + 1
+                    return False
+        return True
+
+    def credit(self, agent: SandboxAgent, amount: float, reason: str, trigger_type: str, task_id: str | None = None) -> None:
+        """Earn (``amount`` > 0) or spend (``amount`` < 0) credits, recorded in the ledger."""
+        self.credits.record(agent.id, amount, reason, trigger_type, task_id, _now_ms())
+        if amount >= 0:
+            agent.stats.credits_earned += amount
+        else:
+            agent.stats.credits_spent -= amount
+        self._touch_agent(agent)
+
+    def _consume_inbox(self, agent: SandboxAgent) -> None:
+        """Drain the agent's inbox; the rules below act on tasks, so drained messages are discarded."""
+        if agent.inbox.drain(INBOX_DRAIN_PER_TICK):
+            agent.last_acted_tick = self.tick
+            self._inbox_changed[agent.id] = agent
+
+    def _flush_inboxes(self) -> None:
+        """Publish inbox counters once per tick instead of once per delivered message."""
+        changed, self._inbox_changed = self._inbox_changed, {}
+        for agent in changed.values():
+            if self.agents_by_id.get(agent.id) is agent:
+                self._touch_agent(agent)
 
     # ── Order processing ─────────────────────────────────────────────────
 
@@ -255,10 +418,10 @@ class Simulation:
             aid = name.lower().replace(" ", "-")
             if not any(a.id == aid for a in self.agents):
                 new_agent = make_agent(aid, name, AgentRole.LEAD, 7, domain, coo.id, f"{domain} department lead")
-                self.agents.append(new_agent)
+                self.add_agent(new_agent)
                 self._log_agent(coo, f'🐣 Hired "{name}" (L7 {domain} lead)')
-                msg = _make_acp(ACPType.DELEGATION, coo.id, new_agent.id, body=random.choice(HIRE_FLAVORS)(name, domain))
-                _push_message(self.agents, msg)
+                msg = self.make_acp(ACPType.DELEGATION, coo.id, new_agent.id, body=random.choice(HIRE_FLAVORS)(name, domain))
+                self.push_message(msg)
                 coo.stats.messages_sent += 1
             return
 
@@ -266,13 +429,13 @@ class Simulation:
         if self._pending_tasks:
             task_def = self._pending_tasks.pop(0)
             task = SandboxTask(
-                id=_next_task_id(),
+                id=self.ids.task_id(),
                 title=task_def["title"],
                 description=task_def["title"],
                 priority=TaskPriority(task_def["priority"]),
                 creator_id=coo.id,
             )
-            self.tasks.append(task)
+            self.add_task(task)
 
             lead = next(
                 (a for a in self.agents if a.parent_id == coo.id and a.domain.lower().startswith(task_def["domain"])),
@@ -282,17 +445,16 @@ class Simulation:
                 task.assignee_id = lead.id
                 task.status = TaskStatus.ASSIGNED
                 lead.task_ids.append(task.id)
+                self._touch_task(task)
 
-                delegation_msg = _make_acp(
+                delegation_msg = self.make_acp(
                     ACPType.DELEGATION, coo.id, lead.id, task.id,
                     body=random.choice(DELEGATION_FLAVORS)(task.title, lead.name),
                 )
-                _push_message(self.agents, delegation_msg)
-                task.activity_log.append(delegation_msg)
+                self.push_message(delegation_msg)
 
-                ack = _make_acp(ACPType.ACK, lead.id, coo.id, task.id, body=f'Acknowledged: "{task.title}"')
-                _push_message(self.agents, ack)
-                task.activity_log.append(ack)
+                ack = self.make_acp(ACPType.ACK, lead.id, coo.id, task.id, body=f'Acknowledged: "{task.title}"')
+                self.push_message(ack)
                 task.acked = True
 
                 self._log_agent(coo, f'📋 Created & delegated "{task.title}" → {lead.name}', task.id)
@@ -312,10 +474,10 @@ class Simulation:
                 task.assignee_id = available.id
                 task.status = TaskStatus.ASSIGNED
                 available.task_ids.append(task.id)
+                self._touch_task(task)
 
-                msg = _make_acp(ACPType.DELEGATION, lead.id, available.id, task.id, body=random.choice(DELEGATION_FLAVORS)(task.title, available.name))
-                _push_message(self.agents, msg)
-                task.activity_log.append(msg)
+                msg = self.make_acp(ACPType.DELEGATION, lead.id, available.id, task.id, body=random.choice(DELEGATION_FLAVORS)(task.title, available.name))
+                self.push_message(msg)
                 lead.stats.messages_sent += 1
                 self._log_agent(lead, f'📋 Assigned "{task.title}" → {available.name}', task.id)
             elif len(workers) < 3:
@@ -324,7 +486,7 @@ class Simulation:
                 aid = name.lower().replace(" ", "-")
                 if not any(a.id == aid for a in self.agents):
                     new_agent = make_agent(aid, name, AgentRole.WORKER, 4, lead.domain, lead.id)
-                    self.agents.append(new_agent)
+                    self.add_agent(new_agent)
                     self._log_agent(lead, f"👥 Hired {new_agent.name}")
                 break
 
@@ -340,15 +502,14 @@ class Simulation:
                 continue
 
             task._stage_tick_count = 0
-            parent = next((a for a in self.agents if a.id == worker.parent_id), None)
+            parent = self.agents_by_id.get(worker.parent_id) if worker.parent_id else None
 
             if task.status == TaskStatus.ASSIGNED:
                 task.status = TaskStatus.IN_PROGRESS
-                task.updated_at = _now_ms()
+                self._touch_task(task)
                 if parent:
-                    msg = _make_acp(ACPType.PROGRESS, worker.id, parent.id, task.id, body=random.choice(PROGRESS_FLAVORS)(task.title), pct=30)
-                    _push_message(self.agents, msg)
-                    task.activity_log.append(msg)
+                    msg = self.make_acp(ACPType.PROGRESS, worker.id, parent.id, task.id, body=random.choice(PROGRESS_FLAVORS)(task.title), pct=30)
+                    self.push_message(msg)
                     worker.stats.messages_sent += 1
                 self._log_agent(worker, f'🔨 Working on "{task.title}" → in_progress', task.id)
 
@@ -356,32 +517,29 @@ class Simulation:
                 if random.random() < 0.10:
                     task.status = TaskStatus.BLOCKED
                     task.blocked_reason = random.choice(BLOCKED_REASONS)
-                    task.updated_at = _now_ms()
+                    self._touch_task(task)
                     if parent:
-                        msg = _make_acp(ACPType.ESCALATION, worker.id, parent.id, task.id, reason="BLOCKED", body=random.choice(ESCALATION_FLAVORS)(task.title, task.blocked_reason))
-                        _push_message(self.agents, msg)
-                        task.activity_log.append(msg)
+                        msg = self.make_acp(ACPType.ESCALATION, worker.id, parent.id, task.id, reason="BLOCKED", body=random.choice(ESCALATION_FLAVORS)(task.title, task.blocked_reason))
+                        self.push_message(msg)
                         worker.stats.messages_sent += 1
                     self._log_agent(worker, f'⬆️ Escalated "{task.title}": {task.blocked_reason}', task.id)
                 else:
                     task.status = TaskStatus.REVIEW
-                    task.updated_at = _now_ms()
+                    self._touch_task(task)
                     if parent:
-                        msg = _make_acp(ACPType.PROGRESS, worker.id, parent.id, task.id, body=f'"{task.title}" ready for review', pct=80)
-                        _push_message(self.agents, msg)
-                        task.activity_log.append(msg)
+                        msg = self.make_acp(ACPType.PROGRESS, worker.id, parent.id, task.id, body=f'"{task.title}" ready for review', pct=80)
+                        self.push_message(msg)
                     self._log_agent(worker, f'📝 "{task.title}" → review', task.id)
 
             elif task.status == TaskStatus.REVIEW:
                 task.status = TaskStatus.DONE
-                task.updated_at = _now_ms()
                 worker.stats.tasks_completed += 1
                 reward = {TaskPriority.CRITICAL: 100, TaskPriority.HIGH: 50}.get(task.priority, 25)
-                worker.stats.credits_earned += reward
+                self._touch_task(task)
+                self.credit(worker, reward, "Task completion reward", "task_completion", task.id)
                 if parent:
-                    msg = _make_acp(ACPType.COMPLETION, worker.id, parent.id, task.id, summary=random.choice(COMPLETION_FLAVORS)(task.title), body=f'Completed: "{task.title}"')
-                    _push_message(self.agents, msg)
-                    task.activity_log.append(msg)
+                    msg = self.make_acp(ACPType.COMPLETION, worker.id, parent.id, task.id, summary=random.choice(COMPLETION_FLAVORS)(task.title), body=f'Completed: "{task.title}"')
+                    self.push_message(msg)
                     worker.stats.messages_sent += 1
                 self._log_agent(worker, f'✅ Completed "{task.title}"', task.id)
 
@@ -393,21 +551,29 @@ class Simulation:
                 task.blocked_reason = None
                 task._blocked_ticks = 0
                 task._stage_tick_count = 0
+                self._touch_task(task)
                 self._log_agent(manager, f'🔓 Unblocked "{task.title}"', task.id)
             else:
                 task._blocked_ticks += 1
 
     async def run_tick(self) -> None:
+        self.step()
+
+    def step(self) -> None:
+        """Advance one tick."""
         self.tick += 1
+        self._bump()
 
         # Staggered spawn
         for _ in range(min(2, len(self._spawn_queue))):
             agent = self._spawn_queue.pop(0)
             agent.status = AgentStatus.ACTIVE
+            self._touch_agent(agent)
             self._log(f"✨ {agent.name} has joined the organization")
 
-        done = sum(1 for t in self.tasks if t.status == TaskStatus.DONE)
-        active = sum(1 for t in self.tasks if t.status != TaskStatus.DONE and t.status != TaskStatus.REJECTED)
+        counts = self.task_status_counts
+        done = counts.get(TaskStatus.DONE, 0)
+        active = len(self.tasks) - done - counts.get(TaskStatus.REJECTED, 0)
         print(f"\n{'═' * 60}\n🕐 TICK {self.tick}  |  Agents: {len(self.agents)}  |  Tasks: {len(self.tasks)} ({done} done, {active} active)\n{'═' * 60}")
 
         sorted_agents = sorted(
@@ -417,6 +583,10 @@ class Simulation:
         )
 
         for agent in sorted_agents:
+            if agent.throttled_until_tick >= self.tick:
+                continue
+            if agent.trigger == TriggerMode.EVENT_DRIVEN:
+                self._consume_inbox(agent)
             if agent.role == AgentRole.COO or agent.level >= 9:
                 self._tick_coo(agent)
                 self._tick_unblock(agent)
@@ -425,6 +595,11 @@ class Simulation:
                 self._tick_unblock(agent)
             else:
                 self._tick_worker(agent)
+        self._flush_inboxes()
+        # Only now: the completion message follows the task's status change.
+        finished, self._finished_tasks = self._finished_tasks, []
+        for task_id in finished:
+            self.acp.retire_task(task_id)
 
         self.metrics_history.append(
             MetricsSnapshot(
@@ -432,29 +607,53 @@ class Simulation:
                 timestamp=_now_ms(),
                 active_agents=sum(1 for a in self.agents if a.status == AgentStatus.ACTIVE),
                 total_tasks=len(self.tasks),
-                tasks_done=sum(1 for t in self.tasks if t.status == TaskStatus.DONE),
-                tasks_in_progress=sum(1 for t in self.tasks if t.status == TaskStatus.IN_PROGRESS),
-                tasks_in_review=sum(1 for t in self.tasks if t.status == TaskStatus.REVIEW),
-                total_credits_earned=sum(a.stats.credits_earned for a in self.agents),
-                total_credits_spent=sum(a.stats.credits_spent for a in self.agents),
+                tasks_done=counts.get(TaskStatus.DONE, 0),
+                tasks_in_progress=counts.get(TaskStatus.IN_PROGRESS, 0),
+                tasks_in_review=counts.get(TaskStatus.REVIEW, 0),
+                total_credits_earned=self.credits.total_earned,
+                total_credits_spent=self.credits.total_spent,
                 message_count=sum(a.stats.messages_sent for a in self.agents),
             )
         )
+        self._bump("metrics")
+        if self.outbox is None:
+            self.hub.flush(self.tick)
 
     async def restart(self, mode: str = "organic") -> None:
+        self.reset(mode)
+
+    def reset(self, mode: str = "organic") -> None:
         from .agents import create_all_agents, create_coo
 
         if mode == "full":
             self.agents = create_all_agents()
         else:
             self.agents = create_coo()
+        self.agents_by_id = {a.id: a for a in self.agents}
+        # Cursors from before the reset cannot be answered with a delta.
+        floor = self._bump(*COLLECTIONS)
+        for log in self.changes.values():
+            log.reset(floor)
+        self._reset_indexes()
+        for a in self.agents:
+            a.inbox = self.new_inbox()
+            self._touch_agent(a, created=True)
         self.tasks = []
+        self.tasks_by_id = {}
+        self.messages = MessageLog(self.activity_window, self.activity_history)
+        self.acp = AcpMetrics(self.acp.window_ms)
+        self.credits = CreditLedger()
+        self.task_status_counts = {}
+        self._counted_status = {}
         self.events = []
         self.metrics_history = []
         self._pending_hires = []
         self._pending_tasks = []
         self._spawn_queue = []
+        self._inbox_changed = {}
+        self._finished_tasks = []
         self.tick = 0
+        self.generation += 1
         self._log(f"🔄 Reset ({mode}) — {len(self.agents)} agents")
 
     async def run(self) -> None:
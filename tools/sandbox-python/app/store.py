@@ -0,0 +1,564 @@
+"""Append-only stores backing the simulation's read paths."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Generic, Iterable, Iterator, Sequence, TypeVar, overload
+
+from .types import ACPMessage, CreditEntry
+
+DEFAULT_ACTIVITY_WINDOW = 50
+DEFAULT_ACTIVITY_HISTORY = 1000
+COLD_PAGE = 256
+DEFAULT_CHANGE_RETENTION = 10_000
+
+T = TypeVar("T")
+
+# Snapshots of these stores are read on the event loop while the engine thread
+# keeps appending. Reads only index lists below the snapshot's end offset, and
+# anything that is mutated in place is copied when the snapshot is taken.
+
+
+# ── Log prefix ───────────────────────────────────────────────────────────────
+
+
+class LogPrefix(Generic[T], Sequence[T]):
+    """Read-only view of the first ``end`` items of an append-only list."""
+
+    __slots__ = ("_items", "end")
+
+    def __init__(self, items: list[T], end: int | None = None) -> None:
+        self._items = items
+        self.end = len(items) if end is None else end
+
+    def __len__(self) -> int:
+        return self.end
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[T]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            items = self._items
+            return [items[i] for i in range(self.end)[index]]
+        if not -self.end <= index < self.end:
+            raise IndexError(index)
+        return self._items[index % self.end]
+
+    def __iter__(self) -> Iterator[T]:
+        items = self._items
+        return (items[i] for i in range(self.end))
+
+
+# ── Task activity ────────────────────────────────────────────────────────────
+
+
+class TaskActivity:
+    """Bounded per-task view over the message log: a hot window, a cold index and a summary.
+
+    The newest ``window`` offsets stay in a hot deque. Older offsets are
+    folded into a summary (count, per-type counts, time range) and kept in
+    ``cold``, pages of ``COLD_PAGE`` 4-byte offsets that history pages are
+    sliced from. At most ``history`` older offsets (rounded up to whole
+    pages) are kept: past that the oldest page is dropped and its messages
+    are only counted in the summary (``expired``). A task therefore holds
+    at most its window, ``history`` offsets and the summary however long it
+    lives; the messages themselves are stored once, in the log.
+    """
+
+    __slots__ = (
+        "hot",
+        "cold",
+        "max_pages",
+        "total",
+        "compacted",
+        "expired",
+        "compacted_by_type",
+        "compacted_from",
+        "compacted_to",
+    )
+
+    def __init__(self, window: int, history: int = DEFAULT_ACTIVITY_HISTORY) -> None:
+        self.hot: deque[int] = deque(maxlen=window)
+        # Oldest first. Full pages never change and the last is only appended
+        # to, so copies share the pages and read the first ``retained`` offsets.
+        self.cold: list[array] = []
+        self.max_pages = max(1, -(-history // COLD_PAGE))
+        self.total = 0
+        self.compacted = 0
+        self.expired = 0
+        self.compacted_by_type: dict[str, int] = {}
+        self.compacted_from: int | None = None
+        self.compacted_to: int | None = None
+
+    @property
+    def retained(self) -> int:
+        """Older offsets still in the cold index."""
+        return self.compacted - self.expired
+
+    def copy(self) -> TaskActivity:
+        clone = TaskActivity(self.hot.maxlen or 0)
+        clone.hot.extend(self.hot)
+        clone.cold = list(self.cold)
+        clone.max_pages = self.max_pages
+        clone.total = self.total
+        clone.compacted = self.compacted
+        clone.expired = self.expired
+        clone.compacted_by_type = dict(self.compacted_by_type)
+        clone.compacted_from = self.compacted_from
+        clone.compacted_to = self.compacted_to
+        return clone
+
+    def _compact(self, offset: int, msg: ACPMessage) -> None:
+        cold = self.cold
+        if not cold or len(cold[-1]) == COLD_PAGE:
+            if len(cold) == self.max_pages:
+                del cold[0]
+                self.expired += COLD_PAGE
+            cold.append(array("I"))
+        cold[-1].append(offset)
+        self.compacted += 1
+        key = msg.type.value
+        self.compacted_by_type[key] = self.compacted_by_type.get(key, 0) + 1
+        if self.compacted_from is None:
+            self.compacted_from = msg.timestamp
+        self.compacted_to = msg.timestamp
+
+
+# ── Conversations ────────────────────────────────────────────────────────────
+
+
+class Conversation:
+    """Summary of the messages exchanged between two agents (``a`` <= ``b``)."""
+
+    __slots__ = ("a", "b", "count", "last")
+
+    def __init__(self, a: str, b: str) -> None:
+        self.a = a
+        self.b = b
+        self.count = 0
+        self.last = -1  # log offset of the latest message
+
+
+class ConversationIndex:
+    """Per-pair summaries kept in recency order, updated on every append.
+
+    The newest conversation is always last, so the top k cost O(k) and
+    pages continue from the offset of the previous page's last message.
+    """
+
+    __slots__ = ("_pairs",)
+
+    def __init__(self) -> None:
+        self._pairs: OrderedDict[tuple[str, str], Conversation] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def record(self, msg: ACPMessage, offset: int) -> None:
+        a, b = msg.from_agent, msg.to
+        key = (a, b) if a <= b else (b, a)
+        conv = self._pairs.get(key)
+        if conv is None:
+            conv = self._pairs[key] = Conversation(*key)
+        else:
+            self._pairs.move_to_end(key)
+        conv.count += 1
+        conv.last = offset
+
+    def get(self, a: str, b: str) -> Conversation | None:
+        return self._pairs.get((a, b) if a <= b else (b, a))
+
+    def copy(self) -> ConversationIndex:
+        clone = ConversationIndex()
+        for key, conv in self._pairs.items():
+            c = clone._pairs[key] = Conversation(conv.a, conv.b)
+            c.count = conv.count
+            c.last = conv.last
+        return clone
+
+    def recent(self, limit: int | None = None, before: int | None = None) -> list[Conversation]:
+        """Newest first. ``before`` skips conversations active at or after that offset."""
+        newest_first: Iterable[Conversation] = reversed(self._pairs.values())
+        if before is not None:
+            newest_first = (c for c in newest_first if c.last < before)
+        return list(islice(newest_first, limit))
+
+
+# ── Message log ──────────────────────────────────────────────────────────────
+
+
+class MessageLog:
+    """Single append-only store for every ACP message.
+
+    Each message is stored once. Per-agent views are lists of integer offsets
+    into the store, appended in send order, so they are already chronological;
+    per-task views are bounded TaskActivity windows and cold indexes; pairs
+    of agents are summarized in a ConversationIndex.
+    """
+
+    __slots__ = ("_messages", "_by_agent", "_by_task", "activity_window", "activity_history", "conversations", "_dirty_tasks", "_snapshot")
+
+    def __init__(self, activity_window: int = DEFAULT_ACTIVITY_WINDOW, activity_history: int = DEFAULT_ACTIVITY_HISTORY) -> None:
+        if activity_window < 1:
+            raise ValueError(f"activity window must be at least 1, not {activity_window}")
+        if activity_history < 0:
+            raise ValueError(f"activity history must not be negative, not {activity_history}")
+        self._messages: list[ACPMessage] = []
+        self._by_agent: dict[str, list[int]] = {}
+        self._by_task: dict[str, TaskActivity] = {}
+        self.activity_window = activity_window
+        self.activity_history = activity_history
+        self.conversations = ConversationIndex()
+        # Tasks whose activity changed since the last snapshot.
+        self._dirty_tasks: set[str] = set()
+        self._snapshot: MessageLogSnapshot | None = None
+
+    def append(self, msg: ACPMessage) -> int:
+        offset = len(self._messages)
+        self._messages.append(msg)
+        self._by_agent.setdefault(msg.from_agent, []).append(offset)
+        if msg.to != msg.from_agent:
+            self._by_agent.setdefault(msg.to, []).append(offset)
+        if msg.task_id:
+            activity = self._by_task.get(msg.task_id)
+            if activity is None:
+                activity = self._by_task[msg.task_id] = TaskActivity(self.activity_window, self.activity_history)
+            if len(activity.hot) == activity.hot.maxlen:
+                oldest = activity.hot[0]
+                activity._compact(oldest, self._messages[oldest])
+            activity.hot.append(offset)
+            activity.total += 1
+            self._dirty_tasks.add(msg.task_id)
+        self.conversations.record(msg, offset)
+        return offset
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __getitem__(self, offset: int) -> ACPMessage:
+        return self._messages[offset]
+
+    def __iter__(self) -> Iterator[ACPMessage]:
+        return iter(self._messages)
+
+    def resolve(self, offsets: Iterable[int]) -> list[ACPMessage]:
+        messages = self._messages
+        return [messages[i] for i in offsets]
+
+    def agent_offsets(self, agent_id: str, end: int | None = None) -> list[int]:
+        offsets = self._by_agent.get(agent_id, [])
+        if end is not None and offsets and offsets[-1] >= end:
+            return offsets[: bisect_left(offsets, end)]
+        return offsets
+
+    def task_activity(self, task_id: str) -> TaskActivity | None:
+        return self._by_task.get(task_id)
+
+    def for_agent(self, agent_id: str, end: int | None = None) -> list[ACPMessage]:
+        return self.resolve(self.agent_offsets(agent_id, end))
+
+    def for_task(self, task_id: str) -> list[ACPMessage]:
+        """The task's hot window, oldest first."""
+        activity = self._by_task.get(task_id)
+        return self.resolve(activity.hot) if activity else []
+
+    def task_page(self, task_id: str, cursor: int | None = None, limit: int = 50) -> tuple[list[ACPMessage], int | None]:
+        """Walk a task's full history backwards, ``limit`` messages at a time.
+
+        ``cursor`` is the offset returned by the previous page (exclusive);
+        None starts from the newest message. Returns the page oldest first and
+        the cursor for the next (older) page, or None when exhausted. Pages
+        end at the oldest offset still indexed; ``expired`` older messages
+        are only in the task's summary.
+        """
+        return self._task_page(self._by_task.get(task_id), cursor, limit)
+
+    def _task_page(self, activity: TaskActivity | None, cursor: int | None, limit: int) -> tuple[list[ACPMessage], int | None]:
+        if activity is None or limit <= 0:
+            return [], None
+        cold, n_cold, hot = activity.cold, activity.retained, list(activity.hot)
+        # Position of the cursor in the task's indexed history (cold offsets, then hot).
+        if cursor is None:
+            end = n_cold + len(hot)
+        elif hot and cursor >= hot[0]:
+            i = bisect_left(hot, cursor)
+            if i == len(hot) or hot[i] != cursor:
+                return [], None
+            end = n_cold + i
+        else:
+            p = bisect_right(cold, cursor, key=lambda page: page[0]) - 1
+            if p < 0:
+                return [], None
+            page, page_end = cold[p], min(COLD_PAGE, n_cold - p * COLD_PAGE)
+            i = bisect_left(page, cursor, 0, page_end)
+            if i == page_end or page[i] != cursor:
+                return [], None
+            end = p * COLD_PAGE + i
+        start = max(0, end - limit)
+        offsets = [cold[i // COLD_PAGE][i % COLD_PAGE] if i < n_cold else hot[i - n_cold] for i in range(start, end)]
+        return self.resolve(offsets), (offsets[0] if start > 0 else None)
+
+    def recent(self, limit: int, end: int | None = None) -> list[ACPMessage]:
+        """Newest-first slice of the last ``limit`` messages (before offset ``end``)."""
+        if limit <= 0:
+            return []
+        if end is None:
+            return self._messages[: -limit - 1 : -1]
+        return self._messages[max(0, end - limit) : end][::-1]
+
+    def snapshot(self) -> MessageLogSnapshot:
+        """Read-only view of the log as it is now.
+
+        Per-task activity is copied only for tasks that changed since the
+        previous snapshot; the others are shared with it.
+        """
+        previous = self._snapshot
+        end = len(self._messages)
+        if previous is not None and previous.end == end:
+            return previous
+        activity = dict(previous._activity) if previous is not None else {}
+        for task_id in self._dirty_tasks:
+            activity[task_id] = self._by_task[task_id].copy()
+        self._dirty_tasks.clear()
+        self._snapshot = MessageLogSnapshot(self, end, activity, self.conversations.copy())
+        return self._snapshot
+
+
+class MessageLogSnapshot:
+    """The parts of ``MessageLog`` the read endpoints use, frozen at ``end`` messages."""
+
+    __slots__ = ("_log", "end", "_activity", "conversations")
+
+    def __init__(self, log: MessageLog, end: int, activity: dict[str, TaskActivity], conversations: ConversationIndex) -> None:
+        self._log = log
+        self.end = end
+        self._activity = activity
+        self.conversations = conversations
+
+    def __len__(self) -> int:
+        return self.end
+
+    def __getitem__(self, offset: int) -> ACPMessage:
+        if not 0 <= offset < self.end:
+            raise IndexError(offset)
+        return self._log[offset]
+
+    def __iter__(self) -> Iterator[ACPMessage]:
+        return iter(LogPrefix(self._log._messages, self.end))
+
+    def task_activity(self, task_id: str) -> TaskActivity | None:
+        return self._activity.get(task_id)
+
+    def for_agent(self, agent_id: str) -> list[ACPMessage]:
+        return self._log.for_agent(agent_id, self.end)
+
+    def for_task(self, task_id: str) -> list[ACPMessage]:
+        activity = self._activity.get(task_id)
+        return self._log.resolve(activity.hot) if activity else []
+
+    def task_page(self, task_id: str, cursor: int | None = None, limit: int = 50) -> tuple[list[ACPMessage], int | None]:
+        return self._log._task_page(self._activity.get(task_id), cursor, limit)
+
+    def recent(self, limit: int) -> list[ACPMessage]:
+        return self._log.recent(limit, self.end)
+
+
+# ── Change log ───────────────────────────────────────────────────────────────
+
+
+class ChangeLog:
+    """Which entities of one collection changed, and at which state version.
+
+    Only the latest change per entity is kept, ordered by version, so a
+    delta costs O(changed entities) and memory is bounded by ``retention``
+    distinct ids. Evicting an entry raises ``floor``: cursors older than the
+    floor can no longer be answered and need a full resync.
+    """
+
+    __slots__ = ("retention", "floor", "_entries")
+
+    def __init__(self, retention: int = DEFAULT_CHANGE_RETENTION) -> None:
+        self.retention = retention
+        self.floor = 0
+        # id -> (version of last change, version of creation or 0, removed)
+        self._entries: OrderedDict[str, tuple[int, int, bool]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, entity_id: str, version: int, *, created: bool = False, removed: bool = False) -> None:
+        previous = self._entries.pop(entity_id, None)
+        created_at = version if created else previous[1] if previous else 0
+        self._entries[entity_id] = (version, created_at, removed)
+        if len(self._entries) > self.retention:
+            _, (evicted, _, _) = self._entries.popitem(last=False)
+            self.floor = evicted
+
+    def copy(self) -> ChangeLog:
+        clone = ChangeLog(self.retention)
+        clone.floor = self.floor
+        clone._entries = self._entries.copy()
+        return clone
+
+    def reset(self, version: int) -> None:
+        """Forget everything; cursors before ``version`` must resync."""
+        self._entries.clear()
+        self.floor = version
+
+    def since(self, version: int) -> tuple[list[str], list[str], list[str]] | None:
+        """(created, updated, removed) ids changed after ``version``, oldest first.
+
+        None when ``version`` predates the retained history.
+        """
+        if version < self.floor:
+            return None
+        created: list[str] = []
+        updated: list[str] = []
+        removed: list[str] = []
+        for entity_id in reversed(self._entries):
+            changed, created_at, gone = self._entries[entity_id]
+            if changed <= version:
+                break
+            if gone:
+                if created_at <= version:
+                    removed.append(entity_id)
+            elif created_at > version:
+                created.append(entity_id)
+            else:
+                updated.append(entity_id)
+        created.reverse()
+        updated.reverse()
+        removed.reverse()
+        return created, updated, removed
+
+
+# ── Credit ledger ────────────────────────────────────────────────────────────
+
+
+class CreditLedger:
+    """Append-only record of every credit earned or spent.
+
+    Entries are stored once; each agent keeps the offsets of its own entries
+    and a running balance, so ``balance_after`` is known at append time and
+    a page of one agent's history costs O(log n + page) however long the
+    ledger grows.
+    """
+
+    __slots__ = ("_entries", "_by_agent", "balances", "total_earned", "total_spent")
+
+    def __init__(self) -> None:
+        self._entries: list[CreditEntry] = []
+        self._by_agent: dict[str, list[int]] = {}
+        self.balances: dict[str, float] = {}
+        self.total_earned: float = 0
+        self.total_spent: float = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, offset: int) -> CreditEntry:
+        return self._entries[offset]
+
+    def record(
+        self,
+        agent_id: str,
+        amount: float,
+        reason: str,
+        trigger_type: str,
+        source_task_id: str | None = None,
+        timestamp: int | None = None,
+    ) -> CreditEntry:
+        """Append a credit (``amount`` > 0) or debit (``amount`` < 0) for one agent."""
+        offset = len(self._entries)
+        balance = self.balances.get(agent_id, 0) + amount
+        self.balances[agent_id] = balance
+        if amount >= 0:
+            self.total_earned += amount
+        else:
+            self.total_spent -= amount
+        entry = CreditEntry(
+            id=offset,
+            agent_id=agent_id,
+            amount=amount,
+            balance_after=balance,
+            reason=reason,
+            trigger_type=trigger_type,
+            source_task_id=source_task_id,
+        )
+        if timestamp is not None:
+            entry.timestamp = timestamp
+        self._entries.append(entry)
+        self._by_agent.setdefault(agent_id, []).append(offset)
+        return entry
+
+    def append(self, entry: CreditEntry) -> None:
+        """Add an entry recorded by another ledger (a replica), keeping its offset and balance."""
+        self._entries.append(entry)
+        self._by_agent.setdefault(entry.agent_id, []).append(entry.id)
+        self.balances[entry.agent_id] = entry.balance_after
+        if entry.amount >= 0:
+            self.total_earned += entry.amount
+        else:
+            self.total_spent -= entry.amount
+
+    def balance(self, agent_id: str) -> float:
+        return self.balances.get(agent_id, 0)
+
+    def page(
+        self, agent_id: str | None = None, before: int | None = None, limit: int = 50, offset: int = 0
+    ) -> tuple[list[CreditEntry], int | None]:
+        """Newest-first page of the whole ledger, or of one agent's entries.
+
+        ``before`` is the cursor returned by the previous page (exclusive);
+        ``offset`` skips further entries. Returns the page and the cursor for
+        the next (older) page, or None when exhausted.
+        """
+        if agent_id is None:
+            end = len(self._entries) if before is None else max(0, min(before, len(self._entries)))
+            end -= offset
+            start = max(0, end - limit)
+            offsets: Iterable[int] = range(end - 1, start - 1, -1) if limit > 0 else ()
+        else:
+            own = self._by_agent.get(agent_id, [])
+            end = len(own) if before is None else bisect_left(own, before)
+            end -= offset
+            start = max(0, end - limit)
+            offsets = reversed(own[start:end]) if limit > 0 and end > 0 else ()
+        entries = self._entries
+        page = [entries[i] for i in offsets]
+        next_cursor = page[-1].id if page and start > 0 else None
+        return page, next_cursor
+
+    def snapshot(self) -> CreditLedgerSnapshot:
+        return CreditLedgerSnapshot(self, len(self._entries))
+
+
+class CreditLedgerSnapshot:
+    """``CreditLedger.page`` over the first ``end`` entries."""
+
+    __slots__ = ("_ledger", "end")
+
+    def __init__(self, ledger: CreditLedger, end: int) -> None:
+        self._ledger = ledger
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end
+
+    def __getitem__(self, offset: int) -> CreditEntry:
+        if not 0 <= offset < self.end:
+            raise IndexError(offset)
+        return self._ledger[offset]
+
+    def page(
+        self, agent_id: str | None = None, before: int | None = None, limit: int = 50, offset: int = 0
+    ) -> tuple[list[CreditEntry], int | None]:
+        before = self.end if before is None else min(before, self.end)
+        return self._ledger.page(agent_id, before, limit, offset)
@@ -0,0 +1,639 @@
+"""Broadcast hub fanning encoded stream frames out to connected clients."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from .encoding import dumps, dumps_array, sse_frame
+
+try:
+    import msgpack
+except ImportError:  # optional: pip install ".[fast]"
+    msgpack = None
+
+DEFAULT_CLIENT_BUFFER = 256
+DEFAULT_REPLAY_EVENTS = 1024
+DEFAULT_HEARTBEAT_S = 30.0
+HEARTBEAT = {"type": "heartbeat"}
+SLOW_CONSUMER = {"type": "disconnected", "reason": "slow consumer"}
+
+# Item kinds: simulation log events and raw ACP messages.
+EVENT = "event"
+ACP = "acp"
+KINDS = (EVENT, ACP)
+
+
+# ── Items ────────────────────────────────────────────────────────────────────
+
+
+class StreamItem:
+    """One published event or ACP message.
+
+    ``id`` is its position in the simulation's id sequence, shared by both
+    kinds, so items sort in creation order. ``key`` is the wire form of that
+    id, set by the hub. Frames are encoded lazily, at most once per codec.
+    """
+
+    __slots__ = ("id", "kind", "type", "agents", "task_id", "data", "key", "_json", "_frames")
+
+    def __init__(self, id: int, kind: str, type: str, agents: tuple[str, ...], task_id: str | None, data: dict[str, Any]) -> None:
+        self.id = id
+        self.kind = kind
+        self.type = type
+        self.agents = agents
+        self.task_id = task_id
+        self.data = data
+        self.key = ""
+        self._json: bytes | None = None
+        self._frames: dict[str, bytes] = {}
+
+    @property
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = dumps(self.data)
+        return self._json
+
+    def frame(self, codec: Codec) -> bytes:
+        frame = self._frames.get(codec.name)
+        if frame is None:
+            frame = self._frames[codec.name] = codec.item(self)
+        return frame
+
+
+# ── Codecs ───────────────────────────────────────────────────────────────────
+
+
+def _tick(tick: int | None) -> bytes:
+    return b"null" if tick is None else str(tick).encode()
+
+
+def batch_payload(tick: int | None, payloads: list[bytes]) -> bytes:
+    """One JSON object carrying several already-encoded events."""
+    return b'{"type":"batch","tick":' + _tick(tick) + b',"events":' + dumps_array(payloads) + b"}"
+
+
+class Codec:
+    """How items and control messages become frames for one kind of connection."""
+
+    name = ""
+    binary = False
+
+    def item(self, item: StreamItem) -> bytes:
+        raise NotImplementedError
+
+    def batch(self, items: list[StreamItem], tick: int | None, id: str) -> bytes:
+        raise NotImplementedError
+
+    def control(self, data: dict[str, Any], id: str | None = None) -> bytes:
+        raise NotImplementedError
+
+
+class SSECodec(Codec):
+    """Server-sent events: ``id:`` line plus the bare JSON payload."""
+
+    name = "sse"
+
+    def item(self, item: StreamItem) -> bytes:
+        return sse_frame(item.json, item.key)
+
+    def batch(self, items: list[StreamItem], tick: int | None, id: str) -> bytes:
+        return sse_frame(batch_payload(tick, [i.json for i in items]), id)
+
+    def control(self, data: dict[str, Any], id: str | None = None) -> bytes:
+        return sse_frame(dumps(data), id)
+
+
+class JSONCodec(Codec):
+    """WebSocket text messages: ``{"id", "kind", "data"}`` envelopes."""
+
+    name = "json"
+
+    def item(self, item: StreamItem) -> bytes:
+        return b'{"id":"' + item.key.encode() + b'","kind":"' + item.kind.encode() + b'","data":' + item.json + b"}"
+
+    def batch(self, items: list[StreamItem], tick: int | None, id: str) -> bytes:
+        head = b'{"id":"' + id.encode() + b'","type":"batch","tick":' + _tick(tick)
+        return head + b',"items":' + dumps_array([i.frame(self) for i in items]) + b"}"
+
+    def control(self, data: dict[str, Any], id: str | None = None) -> bytes:
+        return dumps(data if id is None else {**data, "id": id})
+
+
+class MsgpackCodec(Codec):
+    """WebSocket binary messages: the JSON codec's envelopes, msgpack-encoded."""
+
+    name = "msgpack"
+    binary = True
+
+    def _envelope(self, item: StreamItem) -> dict[str, Any]:
+        return {"id": item.key, "kind": item.kind, "data": item.data}
+
+    def item(self, item: StreamItem) -> bytes:
+        return msgpack.packb(self._envelope(item))
+
+    def batch(self, items: list[StreamItem], tick: int | None, id: str) -> bytes:
+        return msgpack.packb({"id": id, "type": "batch", "tick": tick, "items": [self._envelope(i) for i in items]})
+
+    def control(self, data: dict[str, Any], id: str | None = None) -> bytes:
+        return msgpack.packb(data if id is None else {**data, "id": id})
+
+
+SSE = SSECodec()
+WS_CODECS: dict[str, Codec] = {"json": JSONCodec()}
+if msgpack is not None:
+    WS_CODECS["msgpack"] = MsgpackCodec()
+
+
+# ── Filters ──────────────────────────────────────────────────────────────────
+
+# Most selective first: a filter is indexed under the first dimension it sets.
+INDEXED_DIMENSIONS = ("tasks", "agents", "orgs", "types")
+FILTER_DIMENSIONS = INDEXED_DIMENSIONS + ("kinds",)
+
+
+@dataclass(slots=True, frozen=True)
+class StreamFilter:
+    """Which items a subscriber wants.
+
+    Each dimension is a set of accepted values, or None for "any". An item
+    must match every dimension that is set; an ACP message matches
+    ``agents`` through either its sender or its recipient. ``orgs`` holds
+    agent ids whose whole subtree (the agent and everyone reporting to it)
+    is wanted.
+    """
+
+    agents: frozenset[str] | None = None
+    tasks: frozenset[str] | None = None
+    types: frozenset[str] | None = None
+    orgs: frozenset[str] | None = None
+    kinds: frozenset[str] | None = None
+
+    def matches(self, item: StreamItem, lineage: tuple[str, ...] = ()) -> bool:
+        return (
+            (self.kinds is None or item.kind in self.kinds)
+            and (self.tasks is None or item.task_id in self.tasks)
+            and (self.agents is None or not self.agents.isdisjoint(item.agents))
+            and (self.types is None or item.type in self.types)
+            and (self.orgs is None or not self.orgs.isdisjoint(lineage))
+        )
+
+    def index_key(self) -> tuple[str, frozenset[str]] | None:
+        """The most selective dimension set, used to route items to this filter."""
+        for dimension in INDEXED_DIMENSIONS:
+            values = getattr(self, dimension)
+            if values is not None:
+                return dimension, values
+        return None
+
+    def item_kinds(self) -> tuple[str, ...]:
+        return KINDS if self.kinds is None else tuple(k for k in KINDS if k in self.kinds)
+
+    def changed(self, add: dict[str, Iterable[str]] | None = None, remove: dict[str, Iterable[str]] | None = None) -> StreamFilter:
+        """A copy with values added to or removed from dimensions.
+
+        A dimension left with no values accepts any value again.
+        """
+        dims = {d: getattr(self, d) for d in FILTER_DIMENSIONS}
+        for d, values in (add or {}).items():
+            dims[d] = (dims[d] or frozenset()) | _values(values)
+        for d, values in (remove or {}).items():
+            if dims[d] is not None:
+                dims[d] = dims[d] - _values(values)
+        return StreamFilter(**{d: v or None for d, v in dims.items()})
+
+
+def _values(raw: Iterable[str]) -> frozenset[str]:
+    return frozenset(v.strip() for item in raw for v in item.split(",") if v.strip())
+
+
+def parse_filter(
+    agents: Iterable[str] | None = None,
+    tasks: Iterable[str] | None = None,
+    types: Iterable[str] | None = None,
+    orgs: Iterable[str] | None = None,
+    kinds: Iterable[str] | None = None,
+) -> StreamFilter:
+    """Build a filter from query values; each may be repeated or comma-separated."""
+    return StreamFilter().changed(add={"agents": agents or (), "tasks": tasks or (), "types": types or (), "orgs": orgs or (), "kinds": kinds or ()})
+
+
+# ── Subscriber ───────────────────────────────────────────────────────────────
+
+
+class Subscriber:
+    """One connected client: its filter, codec, delivery mode and a bounded buffer of frames.
+
+    ``push`` runs inside the tick and never blocks: when the buffer is full
+    the oldest frame is dropped. A client that drops more than
+    ``max_dropped`` frames before it next drains its buffer is closed; it
+    can reconnect and resume. ``dropped`` counts every drop, but only the
+    current lag closes a client, so brief stalls now and then do not add up
+    to a disconnect. Frames replayed on resume (``preload``) are held apart
+    and sent first, so however many there are, live frames neither evict
+    them nor count them towards the buffer or the lag. ``batch`` clients get
+    one frame per tick instead of one per item, and ``coalesce`` keeps only
+    the last item per task within that frame.
+    """
+
+    __slots__ = (
+        "filter",
+        "codec",
+        "batch",
+        "coalesce",
+        "capacity",
+        "max_dropped",
+        "_replayed",
+        "_frames",
+        "_wakeup",
+        "idle",
+        "dropped",
+        "lag",
+        "closed",
+    )
+
+    def __init__(
+        self,
+        filter: StreamFilter = StreamFilter(),
+        capacity: int = DEFAULT_CLIENT_BUFFER,
+        max_dropped: int = DEFAULT_CLIENT_BUFFER,
+        batch: bool = False,
+        coalesce: bool = False,
+        codec: Codec = SSE,
+    ) -> None:
+        self.filter = filter
+        self.codec = codec
+        self.batch = batch or coalesce
+        self.coalesce = coalesce
+        self.capacity = capacity
+        self.max_dropped = max_dropped
+        self._replayed: list[bytes] = []
+        self._frames: deque[bytes] = deque()
+        self._wakeup = asyncio.Event()
+        self.idle = True  # nothing pushed since the last heartbeat round
+        self.dropped = 0
+        self.lag = 0  # frames dropped since the buffer was last drained
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._replayed) + len(self._frames)
+
+    def push(self, frame: bytes) -> bool:
+        """Buffer ``frame``; False once the subscriber has been closed as too slow."""
+        if self.closed:
+            return False
+        frames = self._frames
+        if len(frames) >= self.capacity:
+            frames.popleft()
+            self.dropped += 1
+            self.lag += 1
+            if self.lag > self.max_dropped:
+                self._replayed.clear()
+                frames.clear()
+                frames.append(self.codec.control(SLOW_CONSUMER))
+                self.closed = True
+        if not self.closed:
+            frames.append(frame)
+        self.idle = False
+        self._wakeup.set()
+        return not self.closed
+
+    def preload(self, frames: list[bytes]) -> None:
+        """Buffer replayed frames, sent before any live frame; they do not count against the live buffer."""
+        self._replayed.extend(frames)
+        self.idle = False
+        self._wakeup.set()
+
+    def take(self) -> list[bytes]:
+        """Every buffered frame, oldest first."""
+        frames = self._replayed
+        frames.extend(self._frames)
+        self._replayed = []
+        self._frames.clear()
+        self._wakeup.clear()
+        self.lag = 0
+        return frames
+
+    def drain(self) -> bytes:
+        """Every buffered frame as one chunk, so a burst costs one write."""
+        frames = self.take()
+        return frames[0] if len(frames) == 1 else b"".join(frames)
+
+    async def wait(self) -> bool:
+        """Wait for buffered frames; False once closed and drained.
+
+        There is no per-client timer: the hub's shared heartbeat pushes a
+        frame to idle clients, which also wakes this up.
+        """
+        if not self._frames and not self._replayed:
+            if self.closed:
+                return False
+            await self._wakeup.wait()
+        return True
+
+    async def next(self) -> bytes | None:
+        """The buffered frames as one chunk; None once closed and drained."""
+        return self.drain() if await self.wait() else None
+
+
+def coalesce_events(items: list[StreamItem]) -> list[StreamItem]:
+    """Drop items superseded by a later item for the same task, keeping order."""
+    last_for_task = {item.task_id: i for i, item in enumerate(items) if item.task_id}
+    return [item for i, item in enumerate(items) if not item.task_id or last_for_task[item.task_id] == i]
+
+
+async def run_heartbeats(hub: Callable[[], BroadcastHub], interval: float = DEFAULT_HEARTBEAT_S) -> None:
+    """One timer for every connection: each ``interval`` idle clients get a heartbeat."""
+    while True:
+        await asyncio.sleep(interval)
+        hub().heartbeat()
+
+
+# ── Hub ──────────────────────────────────────────────────────────────────────
+
+
+class BroadcastHub:
+    """Registry of subscribers; the tick hands each item over exactly once.
+
+    ``publish`` gives an item the id ``<epoch>.<sequence>`` and only appends
+    its frame to each interested subscriber's buffer, so the tick's cost
+    does not depend on how fast any client reads. Frames are encoded once
+    per codec in use and shared by every subscriber of that codec.
+
+    The last ``replay`` items of each kind are kept in a ring. A client
+    reconnecting with the id of the last item it saw gets just the items it
+    missed; when those have already left the ring (or the id is from
+    another epoch) it gets a ``reset`` frame and must refetch.
+
+    Subscribers are indexed per kind by the most selective dimension of
+    their filter (see ``INDEXED_DIMENSIONS``), so an item is only offered
+    to those listening for its task, one of its agents, one of their
+    managers or its type, plus the unfiltered ones. Routing cost follows
+    the number of candidates, not the number of connected clients.
+    ``lineage`` maps an agent id to itself followed by its managers up to
+    the root.
+
+    Batch subscribers sit outside the index: the tick's items are held
+    until ``flush`` and each distinct (filter, coalesce, codec) gets one
+    batch frame.
+    """
+
+    __slots__ = (
+        "capacity",
+        "max_dropped",
+        "lineage",
+        "epoch",
+        "_all",
+        "_everyone",
+        "_index",
+        "_batched",
+        "_pending",
+        "_org_filters",
+        "_rings",
+        "replay_floor",
+        "last_id",
+        "published",
+        "batches",
+        "heartbeats",
+        "disconnected",
+        "replayed",
+        "resets",
+    )
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CLIENT_BUFFER,
+        max_dropped: int | None = None,
+        lineage: Callable[[str], tuple[str, ...]] | None = None,
+        epoch: str = "",
+        replay: int = DEFAULT_REPLAY_EVENTS,
+    ) -> None:
+        self.capacity = capacity
+        self.max_dropped = capacity if max_dropped is None else max_dropped
+        self.lineage = lineage or (lambda agent_id: (agent_id,))
+        self.epoch = epoch
+        self._all: set[Subscriber] = set()
+        self._everyone: dict[str, set[Subscriber]] = {k: set() for k in KINDS}
+        self._index: dict[str, dict[str, dict[str, set[Subscriber]]]] = {k: {d: {} for d in INDEXED_DIMENSIONS} for k in KINDS}
+        self._batched: set[Subscriber] = set()
+        # Items since the last flush, held only while batch subscribers exist.
+        self._pending: list[StreamItem] = []
+        self._org_filters = 0  # subscribers whose filter needs the item's lineage
+        self._rings: dict[str, deque[StreamItem]] = {k: deque(maxlen=replay) for k in KINDS}
+        # Per kind, id of the newest item that has left the ring; later ids can be replayed.
+        self.replay_floor: dict[str, int] = dict.fromkeys(KINDS, 0)
+        self.last_id = 0
+        self.published = 0
+        self.batches = 0
+        self.heartbeats = 0
+        self.disconnected = 0
+        self.replayed = 0
+        self.resets = 0
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def subscribe(
+        self,
+        filter: StreamFilter = StreamFilter(),
+        last_event_id: str | None = None,
+        batch: bool = False,
+        coalesce: bool = False,
+        codec: Codec = SSE,
+    ) -> Subscriber:
+        """Register a client; with ``last_event_id`` it first receives what it missed."""
+        sub = Subscriber(filter, self.capacity, self.max_dropped, batch, coalesce, codec)
+        if last_event_id:
+            self._resume(sub, last_event_id)
+        self._add(sub)
+        return sub
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}.{seq}"
+
+    def _resume(self, sub: Subscriber, last_event_id: str) -> None:
+        epoch, _, seq = last_event_id.rpartition(".")
+        kinds = sub.filter.item_kinds()
+        if (
+            epoch != self.epoch
+            or not seq.isdigit()
+            or int(seq) > self.last_id
+            or any(int(seq) < self.replay_floor[k] for k in kinds)
+        ):
+            self.resets += 1
+            reset = {"type": "reset", "reason": "events since the last id are no longer available"}
+            sub.preload([sub.codec.control(reset, self.event_id(self.last_id))])
+            return
+        last = int(seq)
+        per_kind: list[list[StreamItem]] = []
+        for kind in kinds:
+            missed: list[StreamItem] = []
+            for item in reversed(self._rings[kind]):
+                if item.id <= last:
+                    break
+                if sub.filter.matches(item, self._lineage(item) if sub.filter.orgs else ()):
+                    missed.append(item)
+            missed.reverse()
+            per_kind.append(missed)
+        items = list(heapq.merge(*per_kind, key=lambda i: i.id))
+        if not items:
+            return
+        self.replayed += len(items)
+        if sub.batch:
+            if sub.coalesce:
+                items = coalesce_events(items)
+            sub.preload([sub.codec.batch(items, None, self.event_id(self.last_id))])
+        else:
+            sub.preload([item.frame(sub.codec) for item in items])
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        if sub not in self._all:
+            return
+        self._all.discard(sub)
+        if sub.filter.orgs is not None:
+            self._org_filters -= 1
+        if sub.batch:
+            self._batched.discard(sub)
+            if not self._batched:
+                self._pending.clear()
+            return
+        key = sub.filter.index_key()
+        for kind in sub.filter.item_kinds():
+            if key is None:
+                self._everyone[kind].discard(sub)
+                continue
+            index = self._index[kind][key[0]]
+            for value in key[1]:
+                subs = index.get(value)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del index[value]
+
+    def refilter(self, sub: Subscriber, filter: StreamFilter) -> None:
+        """Change what a connected subscriber receives."""
+        self.unsubscribe(sub)
+        sub.filter = filter
+        self._add(sub)
+
+    def _add(self, sub: Subscriber) -> None:
+        self._all.add(sub)
+        if sub.filter.orgs is not None:
+            self._org_filters += 1
+        if sub.batch:
+            self._batched.add(sub)
+            return
+        key = sub.filter.index_key()
+        for kind in sub.filter.item_kinds():
+            if key is None:
+                self._everyone[kind].add(sub)
+                continue
+            index = self._index[kind][key[0]]
+            for value in key[1]:
+                index.setdefault(value, set()).add(sub)
+
+    def _lineage(self, item: StreamItem) -> tuple[str, ...]:
+        if len(item.agents) == 1:
+            return self.lineage(item.agents[0])
+        return tuple(a for agent_id in item.agents for a in self.lineage(agent_id))
+
+    def candidates(self, item: StreamItem, lineage: tuple[str, ...]) -> set[Subscriber]:
+        index = self._index[item.kind]
+        found = set(self._everyone[item.kind])
+        for dimension, values in (
+            ("tasks", (item.task_id,) if item.task_id else ()),
+            ("agents", item.agents),
+            ("orgs", lineage),
+            ("types", (item.type,)),
+        ):
+            by_value = index[dimension]
+            if by_value:
+                for value in values:
+                    subs = by_value.get(value)
+                    if subs:
+                        found |= subs
+        return found
+
+    def publish(self, item: StreamItem) -> None:
+        """Keep an item for replay and hand its frame to each interested subscriber."""
+        item.key = self.event_id(item.id)
+        ring = self._rings[item.kind]
+        if len(ring) == ring.maxlen:
+            self.replay_floor[item.kind] = ring[0].id if ring else item.id
+        ring.append(item)
+        self.last_id = item.id
+        self.published += 1
+        if not self._all:
+            return
+        if self._batched:
+            self._pending.append(item)
+        lineage = self._lineage(item) if item.agents and self._org_filters else ()
+        self._deliver((sub, item.frame(sub.codec)) for sub in self.candidates(item, lineage) if sub.filter.matches(item, lineage))
+
+    def flush(self, tick: int | None = None) -> None:
+        """Send batch subscribers one frame with everything published since the last flush."""
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        frame_id = self.event_id(pending[-1].id)
+        lineages: dict[int, tuple[str, ...]] = {}
+        groups: dict[tuple[StreamFilter, bool, str], list[Subscriber]] = {}
+        for sub in self._batched:
+            groups.setdefault((sub.filter, sub.coalesce, sub.codec.name), []).append(sub)
+        deliveries: list[tuple[Subscriber, bytes]] = []
+        for (filter, coalesce, _), subs in groups.items():
+            if filter.orgs is None:
+                items = [i for i in pending if filter.matches(i)]
+            else:
+                items = []
+                for i in pending:
+                    if i.id not in lineages:
+                        lineages[i.id] = self._lineage(i)
+                    if filter.matches(i, lineages[i.id]):
+                        items.append(i)
+            if coalesce:
+                items = coalesce_events(items)
+            if items:
+                frame = subs[0].codec.batch(items, tick, frame_id)
+                self.batches += 1
+                deliveries.extend((sub, frame) for sub in subs)
+        self._deliver(deliveries)
+
+    def heartbeat(self) -> None:
+        """Send a heartbeat to every client that received nothing since the last round."""
+        idle = [sub for sub in self._all if sub.idle]
+        self.heartbeats += len(idle)
+        frames = {sub.codec.name: sub.codec for sub in idle}
+        encoded = {name: codec.control(HEARTBEAT) for name, codec in frames.items()}
+        self._deliver((sub, encoded[sub.codec.name]) for sub in idle)
+        for sub in self._all:
+            sub.idle = True
+
+    def _deliver(self, deliveries: Iterable[tuple[Subscriber, bytes]]) -> None:
+        slow = [sub for sub, frame in deliveries if not sub.push(frame)]
+        for sub in slow:
+            self.unsubscribe(sub)
+            self.disconnected += 1
+
+    def stats(self) -> dict[str, Any]:
+        subscribers = self._all
+        return {
+            "subscribers": len(subscribers),
+            "batchSubscribers": len(self._batched),
+            "byCodec": {name: sum(1 for s in subscribers if s.codec.name == name) for name in ("sse", *WS_CODECS)},
+            "indexed": {d: sum(len(self._index[k][d]) for k in KINDS) for d in INDEXED_DIMENSIONS},
+            "published": self.published,
+            "batches": self.batches,
+            "heartbeats": self.heartbeats,
+            "buffered": sum(len(s) for s in subscribers),
+            "dropped": sum(s.dropped for s in subscribers),
+            "slowDisconnects": self.disconnected,
+            "bufferSize": self.capacity,
+            "replayItems": {k: len(ring) for k, ring in self._rings.items()},
+            "replayed": self.replayed,
+            "resets": self.resets,
+        }
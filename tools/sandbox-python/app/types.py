@@ -3,12 +3,11 @@
 from __future__ import annotations
 
 import time
-import uuid
+from collections import deque
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, Field
-
 
 # ── Enums ────────────────────────────────────────────────────────────────────
 
@@ -70,33 +69,146 @@ class TriggerMode(str, Enum):
     EVENT_DRIVEN = "event-driven"
 
 
+class InboxPolicy(str, Enum):
+    DROP_OLDEST = "drop-oldest"
+    COALESCE_TASK = "coalesce-task"
+    BACKPRESSURE = "backpressure"
+
+
 # ── Models ───────────────────────────────────────────────────────────────────
+#
+# Internal state is kept in slotted dataclasses: no validation, no alias
+# handling, no per-instance __dict__. Conversion to the wire format happens
+# only in mappers.py.
+
+
+class IdGenerator:
+    """Monotonic, per-simulation id source.
+
+    ACP messages and events draw from one integer sequence, so ids sort in
+    creation order across both streams and double as pagination and resume
+    cursors. String forms are zero-padded to stay lexicographically sortable.
+    """
+
+    __slots__ = ("_seq", "_task_seq")
+
+    def __init__(self) -> None:
+        self._seq = 0
+        self._task_seq = 0
+
+    @property
+    def last(self) -> int:
+        return self._seq
+
+    def next(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def acp_id(self) -> str:
+        self._seq += 1
+        return f"acp-{self._seq:010d}"
+
+    def task_id(self) -> str:
+        self._task_seq += 1
+        return f"TASK-{self._task_seq:04d}"
+
+
+def parse_seq(id: str) -> int:
+    """Recover the sequence number from an id produced by IdGenerator."""
+    return int(id.rsplit("-", 1)[-1])
+
+
+# Fallback for messages and events built outside a Simulation (tests, tools).
+_default_ids = IdGenerator()
 
 
 def _acp_id() -> str:
-    return f"acp-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+    return _default_ids.acp_id()
 
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
-class ACPMessage(BaseModel):
-    id: str = Field(default_factory=_acp_id)
+@dataclass(slots=True, kw_only=True)
+class ACPMessage:
+    id: str = field(default_factory=_acp_id)
     type: ACPType
-    from_agent: str = Field(alias="from")
+    from_agent: str
     to: str
-    task_id: str = Field(default="", alias="taskId")
+    task_id: str = ""
     body: Optional[str] = None
     reason: Optional[str] = None
     summary: Optional[str] = None
     pct: Optional[int] = None
-    timestamp: int = Field(default_factory=_now_ms)
-
-    model_config = {"populate_by_name": True}
-
-
-class AgentStats(BaseModel):
+    timestamp: int = field(default_factory=_now_ms)
+
+
+DEFAULT_INBOX_CAPACITY = 50
+
+
+class Inbox:
+    """Bounded per-agent inbox drained once per tick.
+
+    When full, ``policy`` decides what happens to a new message:
+    DROP_OLDEST evicts the head, COALESCE_TASK replaces a queued message for
+    the same task (falling back to evicting the head), and BACKPRESSURE
+    refuses the message so the sender can be throttled.
+    """
+
+    __slots__ = ("capacity", "policy", "_items", "dropped", "coalesced", "rejected", "consumed")
+
+    def __init__(self, capacity: int = DEFAULT_INBOX_CAPACITY, policy: InboxPolicy = InboxPolicy.DROP_OLDEST) -> None:
+        self.capacity = capacity
+        self.policy = policy
+        self._items: deque[ACPMessage] = deque()
+        self.dropped = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.consumed = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def push(self, msg: ACPMessage) -> bool:
+        items = self._items
+        if self.policy == InboxPolicy.COALESCE_TASK and msg.task_id:
+            for i, queued in enumerate(items):
+                if queued.task_id == msg.task_id:
+                    items[i] = msg
+                    self.coalesced += 1
+                    return True
+        if len(items) >= self.capacity:
+            if self.policy == InboxPolicy.BACKPRESSURE:
+                self.rejected += 1
+                return False
+            items.popleft()
+            self.dropped += 1
+        items.append(msg)
+        return True
+
+    def copy(self) -> Inbox:
+        clone = Inbox(self.capacity, self.policy)
+        clone._items = self._items.copy()
+        clone.dropped = self.dropped
+        clone.coalesced = self.coalesced
+        clone.rejected = self.rejected
+        clone.consumed = self.consumed
+        return clone
+
+    def drain(self, limit: int | None = None) -> list[ACPMessage]:
+        items = self._items
+        n = len(items) if limit is None else min(limit, len(items))
+        drained = [items.popleft() for _ in range(n)]
+        self.consumed += n
+        return drained
+
+
+@dataclass(slots=True, kw_only=True)
+class AgentStats:
     tasks_completed: int = 0
     tasks_failed: int = 0
     messages_sent: int = 0
@@ -104,7 +216,8 @@ class AgentStats(BaseModel):
     credits_spent: float = 0
 
 
-class SandboxAgent(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class SandboxAgent:
     id: str
     name: str
     role: AgentRole
@@ -116,16 +229,28 @@ class SandboxAgent(BaseModel):
     parent_id: Optional[str] = None
     status: AgentStatus = AgentStatus.ACTIVE
     system_prompt: str = ""
-    task_ids: list[str] = Field(default_factory=list)
-    recent_messages: list[ACPMessage] = Field(default_factory=list)
+    task_ids: list[str] = field(default_factory=list)
     trigger: TriggerMode = TriggerMode.POLLING
     trigger_on: Optional[list[ACPType]] = None
-    inbox: list[ACPMessage] = Field(default_factory=list)
+    inbox: Inbox = field(default_factory=Inbox)
     last_acted_tick: Optional[int] = None
-    stats: AgentStats = Field(default_factory=AgentStats)
-
-
-class SandboxTask(BaseModel):
+    throttled_until_tick: int = 0
+    stats: AgentStats = field(default_factory=AgentStats)
+    created_at: int = field(default_factory=_now_ms)
+    updated_at: int = field(default_factory=_now_ms)
+
+    # Bumped by the simulation on every change; guards the cached projection,
+    # its encoded bytes and GraphQL selections of it.
+    version: int = 0
+    _projection: Optional[dict] = field(default=None, repr=False, compare=False)
+    _projection_version: int = field(default=-1, repr=False, compare=False)
+    _encoded: Optional[bytes] = field(default=None, repr=False, compare=False)
+    _selections: Optional[dict] = field(default=None, repr=False, compare=False)
+    _selections_version: int = field(default=-1, repr=False, compare=False)
+
+
+@dataclass(slots=True, kw_only=True)
+class SandboxTask:
     id: str
     title: str
     description: str = ""
@@ -133,9 +258,8 @@ class SandboxTask(BaseModel):
     status: TaskStatus = TaskStatus.BACKLOG
     assignee_id: Optional[str] = None
     creator_id: str = ""
-    created_at: int = Field(default_factory=_now_ms)
-    updated_at: int = Field(default_factory=_now_ms)
-    activity_log: list[ACPMessage] = Field(default_factory=list)
+    created_at: int = field(default_factory=_now_ms)
+    updated_at: int = field(default_factory=_now_ms)
     acked: bool = False
     blocked_reason: Optional[str] = None
     epic_id: Optional[str] = None
@@ -144,20 +268,44 @@ class SandboxTask(BaseModel):
     subtask_ids: Optional[list[str]] = None
 
     # Internal tick counters (not serialized to API)
-    _stage_tick_count: int = 0
-    _blocked_ticks: int = 0
-
-
-class SandboxEvent(BaseModel):
+    _stage_tick_count: int = field(default=0, repr=False)
+    _blocked_ticks: int = field(default=0, repr=False)
+
+    # Bumped by the simulation on every change; guards the cached projection,
+    # its encoded bytes and GraphQL selections of it.
+    version: int = 0
+    _projection: Optional[dict] = field(default=None, repr=False, compare=False)
+    _projection_version: int = field(default=-1, repr=False, compare=False)
+    _encoded: Optional[bytes] = field(default=None, repr=False, compare=False)
+    _selections: Optional[dict] = field(default=None, repr=False, compare=False)
+    _selections_version: int = field(default=-1, repr=False, compare=False)
+
+
+@dataclass(slots=True, kw_only=True)
+class SandboxEvent:
+    id: int = field(default_factory=_default_ids.next)
     type: str
     agent_id: Optional[str] = None
     task_id: Optional[str] = None
     message: str
     data: Optional[dict] = None
-    timestamp: int = Field(default_factory=_now_ms)
+    timestamp: int = field(default_factory=_now_ms)
+
+
+@dataclass(slots=True, kw_only=True)
+class CreditEntry:
+    id: int  # offset in the ledger
+    agent_id: str
+    amount: float  # positive when earned, negative when spent
+    balance_after: float
+    reason: str
+    trigger_type: str
+    source_task_id: Optional[str] = None
+    timestamp: int = field(default_factory=_now_ms)
 
 
-class MetricsSnapshot(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class MetricsSnapshot:
     tick: int
     timestamp: int
     active_agents: int
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Read latency while the simulation ticks: inline on the event loop vs the engine thread.
+
+A reader task on the event loop builds the /api/state payload from the
+latest state every millisecond; its latency includes any wait for the loop.
+With ticks inline (``Simulation.run``) a read that arrives mid-tick waits
+for the whole tick; with the engine the tick runs on its own thread and
+reads only contend for the GIL.
+
+Run from tools/sandbox-python:  python benchmarks/bench_engine.py [agents] [seconds]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_mappers import build_sim  # noqa: E402
+
+from app.engine import Engine  # noqa: E402
+from app.types import AgentStatus  # noqa: E402
+
+
+def read_state(snapshot) -> dict:
+    return {"tick": snapshot.tick, "agentCount": len(snapshot.agents), "taskCount": len(snapshot.tasks)}
+
+
+async def measure(n_agents: int, seconds: float, threaded: bool) -> tuple[list[float], int, float]:
+    sim = build_sim(n_agents, n_agents * 10)
+    for agent in sim.agents:
+        agent.status = AgentStatus.ACTIVE
+    sim._spawn_queue = []
+    sim.tick_interval_ms = 100
+    engine = None
+    if threaded:
+        engine = Engine(sim, asyncio.get_running_loop())
+        engine.start()
+        latest = lambda: engine.snapshot  # noqa: E731
+    else:
+        runner = asyncio.create_task(sim.run())
+        latest = sim.snapshot
+    latencies: list[float] = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        read_state(latest())
+        latencies.append((time.perf_counter() - start) * 1000 - 1)
+    if engine is not None:
+        engine.stop()
+    else:
+        sim.stop()
+        runner.cancel()
+    tick_start = time.perf_counter()
+    sim.step()
+    return latencies, sim.tick, (time.perf_counter() - tick_start) * 1000
+
+
+def main(n_agents: int, seconds: float) -> None:
+    print(f"{'mode':>8} {'ticks':>6} {'tick (ms)':>10} {'reads':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+    for threaded in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, ticks, tick_ms = asyncio.run(measure(n_agents, seconds, threaded))
+        q = statistics.quantiles(latencies, n=100)
+        mode = "engine" if threaded else "inline"
+        print(f"{mode:>8} {ticks:>6} {tick_ms:>10.1f} {len(latencies):>7} {q[49]:>9.2f} {q[98]:>9.2f} {max(latencies):>9.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, float(sys.argv[2]) if len(sys.argv) > 2 else 5)
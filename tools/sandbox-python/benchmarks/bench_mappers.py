@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Scaling benchmark for the read path: Tasks, Messages and /api/tasks over growing orgs.
+
+Each step doubles both the agent and the task count; with linear mapping the
+time per call roughly doubles too, with quadratic lookups it quadruples.
+"cold" is the first call, which builds every projection; later calls reuse
+the cached projections of entities that have not changed. /api/tasks is
+measured with an empty response cache (mapping + JSON encoding); "cached" is
+a response cache hit at the same state version. "filtered page" is a later
+page of /api/tasks filtered by status and assignee, served from the indexes;
+it should stay flat as the org grows.
+
+Run from tools/sandbox-python:  python benchmarks/bench_mappers.py [steps]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.requests import Request  # noqa: E402
+
+import app.server as server  # noqa: E402
+from app.agents import make_agent  # noqa: E402
+from app.simulation import Simulation  # noqa: E402
+from app.types import ACPType, AgentRole, SandboxTask, TaskStatus  # noqa: E402
+
+
+def build_sim(n_agents: int, n_tasks: int) -> Simulation:
+    rng = random.Random(42)
+    agents = [make_agent(f"agent-{i}", f"Agent {i}", AgentRole.WORKER, 1 + i % 10, "Engineering") for i in range(n_agents)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = Simulation(agents, tick_interval_ms=100)
+    statuses = list(TaskStatus)
+    for i in range(n_tasks):
+        assignee = agents[rng.randrange(n_agents)]
+        sim.add_task(SandboxTask(id=sim.ids.task_id(), title=f"Task {i}", status=rng.choice(statuses), assignee_id=assignee.id))
+    for _ in range(n_tasks):
+        a, b = rng.sample(agents, 2)
+        sim.push_message(sim.make_acp(ACPType.PROGRESS, a.id, b.id, body="tick"))
+    return sim
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def list_tasks(request: Request, **params):
+    """``server.tasks_list`` called directly, with every query parameter defaulted."""
+    defaults = dict(since=None, status=None, priority=None, assignee=None, creator=None, updatedSince=None, cursor=None, limit=None)
+    return server.tasks_list(request, **{**defaults, **params})
+
+
+def bench(steps: int) -> None:
+    print(
+        f"{'agents':>7} {'tasks':>7} {'Tasks cold (ms)':>16} {'Tasks (ms)':>11} {'Messages (ms)':>14} "
+        f"{'/api/tasks (ms)':>16} {'cached (ms)':>12} {'filtered page (ms)':>19}"
+    )
+    n_agents, n_tasks = 250, 2500
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    for _ in range(steps):
+        sim = build_sim(n_agents, n_tasks)
+        server.sim = sim
+        cold_ms = timed(lambda: server.handle_graphql("Tasks", {}, sim), repeat=1)
+        tasks_ms = timed(lambda: server.handle_graphql("Tasks", {}, sim))
+        messages_ms = timed(lambda: server.handle_graphql("Messages", {"limit": n_tasks}, sim))
+        rest_ms = timed(lambda: (server.response_cache.clear(), asyncio.run(list_tasks(request))))
+        cached_ms = timed(lambda: asyncio.run(list_tasks(request)))
+        # Second page of one assignee's review tasks: two index lookups, no pass over all tasks.
+        assignee = sim.tasks[n_tasks // 2].assignee_id
+        page = asyncio.run(list_tasks(request, status=["review"], assignee=[assignee], limit=20))
+        after = json.loads(page.body)["nextCursor"]
+        page_ms = timed(lambda: (server.response_cache.clear(), asyncio.run(list_tasks(request, status=["review"], assignee=[assignee], cursor=after, limit=20))))
+        print(
+            f"{n_agents:>7} {n_tasks:>7} {cold_ms:>16.1f} {tasks_ms:>11.1f} {messages_ms:>14.1f} "
+            f"{rest_ms:>16.1f} {cached_ms:>12.2f} {page_ms:>19.2f}"
+        )
+        n_agents *= 2
+        n_tasks *= 2
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
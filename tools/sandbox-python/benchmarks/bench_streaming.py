@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""/api/tasks over a large collection: buffered response vs ``?stream=json``.
+
+Each mode starts from a fresh simulation nobody has read yet. "first byte"
+is when the first body chunk is ready (the whole body when buffered);
+"peak" is the most memory allocated on top of the simulation while the
+response is produced, measured in a separate run under tracemalloc.
+
+Run from tools/sandbox-python:  python benchmarks/bench_streaming.py [tasks]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_mappers import build_sim, list_tasks  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+import app.server as server  # noqa: E402
+
+
+async def respond(stream: bool) -> tuple[float, float, int]:
+    """Produce one /api/tasks body; returns (first byte ms, total ms, bytes)."""
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    start = time.perf_counter()
+    response = await list_tasks(request, stream="json" if stream else None)
+    if not stream:
+        elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, elapsed, len(response.body)
+    first = None
+    size = 0
+    async for chunk in response.body_iterator:
+        if first is None:
+            first = (time.perf_counter() - start) * 1000
+        size += len(chunk)
+    return first, (time.perf_counter() - start) * 1000, size
+
+
+def run(n_tasks: int, stream: bool, traced: bool) -> tuple[float, float, int, float]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.sim = build_sim(max(1, n_tasks // 10), n_tasks)
+    server.response_cache.clear()
+    server.sim.snapshot()
+    if traced:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    first, total, size = asyncio.run(respond(stream))
+    peak = 0.0
+    if traced:
+        peak = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+        tracemalloc.stop()
+    return first, total, size, peak
+
+
+def main(n_tasks: int) -> None:
+    print(f"{'mode':>9} {'tasks':>8} {'first byte (ms)':>16} {'total (ms)':>11} {'body (MB)':>10} {'peak (MB)':>10}")
+    for stream in (False, True):
+        first, total, size, _ = run(n_tasks, stream, traced=False)
+        peak = run(n_tasks, stream, traced=True)[3]
+        mode = "streamed" if stream else "buffered"
+        print(f"{mode:>9} {n_tasks:>8} {first:>16.1f} {total:>11.1f} {size / 2**20:>10.1f} {peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for the hot internal types: construction cost and per-object memory.
+
+Run from tools/sandbox-python:  python benchmarks/bench_types.py [N]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.types import (  # noqa: E402
+    ACPMessage,
+    ACPType,
+    AgentRole,
+    MetricsSnapshot,
+    SandboxAgent,
+    SandboxEvent,
+    SandboxTask,
+)
+
+
+def _acp() -> ACPMessage:
+    return ACPMessage(type=ACPType.PROGRESS, from_agent="worker-1", to="lead-1", task_id="TASK-0001", body="Halfway there", pct=50)
+
+
+def _agent() -> SandboxAgent:
+    return SandboxAgent(id="worker-1", name="Worker 1", role=AgentRole.WORKER, level=4, domain="Engineering")
+
+
+def _task() -> SandboxTask:
+    return SandboxTask(id="TASK-0001", title="Fix bug", description="Reproduce and fix.", creator_id="mr-krabs")
+
+
+def _event() -> SandboxEvent:
+    return SandboxEvent(type="agent_action", agent_id="worker-1", task_id="TASK-0001", message="Working")
+
+
+def _snapshot() -> MetricsSnapshot:
+    return MetricsSnapshot(
+        tick=1, timestamp=0, active_agents=32, total_tasks=100, tasks_done=10, tasks_in_progress=20,
+        tasks_in_review=5, total_credits_earned=1000.0, total_credits_spent=0.0, message_count=500,
+    )
+
+
+FACTORIES = {
+    "ACPMessage": _acp,
+    "SandboxAgent": _agent,
+    "SandboxTask": _task,
+    "SandboxEvent": _event,
+    "MetricsSnapshot": _snapshot,
+}
+
+
+def bench(n: int) -> None:
+    print(f"{'type':<16} {'construct (µs)':>15} {'bytes/object':>13}")
+    for name, factory in FACTORIES.items():
+        per_call = min(timeit.repeat(factory, number=n, repeat=3)) / n * 1e6
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        keep = [factory() for _ in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        per_object = (after - before) / len(keep)
+
+        print(f"{name:<16} {per_call:>15.2f} {per_object:>13.0f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
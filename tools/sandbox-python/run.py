@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
-"""Run the BikiniBottom sandbox server."""
+"""Run the BikiniBottom sandbox server.
+
+With ``SANDBOX_WORKERS`` > 1 the simulation runs in its own engine process
+and that many uvicorn workers serve requests from its published state.
+"""
 import os
 import uvicorn
 
 if __name__ == "__main__":
     port = int(os.environ.get("SANDBOX_PORT", "3333"))
+    workers = int(os.environ.get("SANDBOX_WORKERS", "1"))
+    options = {}
+    if workers > 1:
+        from app.shared import start_engine_process
+
+        os.environ["SANDBOX_ENGINE_DIR"] = str(start_engine_process(os.environ.get("SANDBOX_ENGINE_DIR")))
+        options["workers"] = workers
+    else:
+        options["reload"] = os.environ.get("DEV", "0") == "1"
     uvicorn.run(
         "app.server:app",
         host="0.0.0.0",
         port=port,
-        reload=os.environ.get("DEV", "0") == "1",
         log_level="info",
+        **options,
     )
@@ -1,6 +1,8 @@
 """Integration tests for the FastAPI server."""
 
 import asyncio
+import json
+import time
 
 import pytest
 from fastapi.testclient import TestClient
@@ -8,6 +10,7 @@ from fastapi.testclient import TestClient
 from app.agents import create_all_agents
 from app.server import app, get_sim
 from app.simulation import Simulation
+from app.types import ACPType, SandboxTask, TaskPriority
 
 
 @pytest.fixture(autouse=True)
@@ -46,6 +49,8 @@ class TestHealthEndpoints:
         assert len(agents) == 32
         assert agents[0]["id"]
         assert agents[0]["name"]
+        assert agents[0]["inboxCapacity"] > 0
+        assert "inboxDropped" in agents[0]
 
     def test_tasks_list(self, client):
         r = client.get("/api/tasks")
@@ -133,6 +138,11 @@ class TestGraphQL:
         scores = [l["trustScore"] for l in leaders]
         assert scores == sorted(scores, reverse=True)
 
+    def test_trust_leaderboard_builds_only_selected_fields(self, client, setup_sim):
+        r = client.post("/graphql", json={"query": "query TrustLeaderboard { trustLeaderboard { id trustScore } }"})
+        assert len(r.json()["data"]["trustLeaderboard"]) == 10
+        assert all(a._projection is None for a in setup_sim.snapshot().agents)
+
     def test_credit_history(self, client):
         r = client.post("/graphql", json={
             "query": "query CreditHistory { creditHistory { id type amount } }",
@@ -147,6 +157,40 @@ class TestGraphQL:
         assert r.status_code == 200
         assert "conversations" in r.json()["data"]
 
+    def test_only_selected_fields_returned(self, client):
+        r = client.post("/graphql", json={"query": "query Agents { agents { id name } }"})
+        agents = r.json()["data"]["agents"]
+        assert set(agents[0]) == {"id", "name"}
+
+    def test_aliases_nested_and_literal_arguments(self, client):
+        r = client.post("/graphql", json={"query": 'query Agent { boss: agent(id: "mr-krabs") { name lvl: level } }'})
+        assert r.json()["data"] == {"boss": {"name": "Mr. Krabs", "lvl": 10}}
+
+    def test_parse_error(self, client):
+        r = client.post("/graphql", json={"query": "query Agents { agents { id "})
+        assert r.status_code == 400
+        assert r.json()["errors"][0]["extensions"]["code"] == "GRAPHQL_PARSE_FAILED"
+
+    def test_conversations_paginated(self, client, setup_sim):
+        setup_sim.push_message(setup_sim.make_acp(ACPType.PROGRESS, "mr-krabs", "plankton", body="one"))
+        setup_sim.push_message(setup_sim.make_acp(ACPType.PROGRESS, "karen", "plankton", body="two"))
+        query = "query Conversations($limit: Int, $after: String) { conversations(limit: $limit, after: $after) { id lastMessage messageCount cursor } }"
+        first = client.post("/graphql", json={"query": query, "variables": {"limit": 1}}).json()["data"]["conversations"]
+        assert [c["lastMessage"] for c in first] == ["two"]
+        second = client.post("/graphql", json={"query": query, "variables": {"limit": 1, "after": first[0]["cursor"]}}).json()
+        assert second["data"]["conversations"][0]["lastMessage"] == "one"
+
+    def test_credit_history_paginated(self, client, setup_sim):
+        krabs = setup_sim.agents_by_id["mr-krabs"]
+        setup_sim.credit(krabs, 50, "Task completion reward", "task_completion", "TASK-0001")
+        setup_sim.credit(setup_sim.agents_by_id["tech-talent"], 25, "Task completion reward", "task_completion")
+        setup_sim.credit(krabs, -20, "Model inference tokens", "model_usage")
+        query = "query CreditHistory($agentId: ID, $limit: Int, $after: String) { creditHistory(agentId: $agentId, limit: $limit, after: $after) { type amount balanceAfter cursor } }"
+        first = client.post("/graphql", json={"query": query, "variables": {"agentId": "mr-krabs", "limit": 1}}).json()["data"]["creditHistory"]
+        assert [(c["type"], c["amount"], c["balanceAfter"]) for c in first] == [("DEBIT", 20, 30)]
+        second = client.post("/graphql", json={"query": query, "variables": {"agentId": "mr-krabs", "after": first[0]["cursor"]}}).json()
+        assert [(c["type"], c["amount"]) for c in second["data"]["creditHistory"]] == [("CREDIT", 50)]
+
     def test_unknown_operation(self, client):
         r = client.post("/graphql", json={
             "query": "query FooBar { fooBar { id } }",
@@ -155,6 +199,304 @@ class TestGraphQL:
         assert r.json()["data"] == {}
 
 
+class TestBatchedGraphQL:
+    def test_batch_returns_results_in_order(self, client):
+        r = client.post("/graphql", json=[
+            {"query": "query Agents { agents { id } }"},
+            {"query": "query Tasks { tasks { id status } }"},
+            {"query": "query Agent($id: ID!) { agent(id: $id) { name } }", "variables": {"id": "mr-krabs"}},
+        ])
+        assert r.status_code == 200
+        results = r.json()
+        assert len(results) == 3
+        assert len(results[0]["data"]["agents"]) == 32
+        assert "tasks" in results[1]["data"]
+        assert results[2]["data"]["agent"]["name"] == "Mr. Krabs"
+
+    def test_entry_errors_stay_per_entry(self, client):
+        r = client.post("/graphql", json=[{"query": "query Agents { agents { id"}, {"query": "query Agents { agents { id } }"}])
+        first, second = r.json()
+        assert first["errors"][0]["extensions"]["code"] == "GRAPHQL_PARSE_FAILED"
+        assert "agents" in second["data"]
+
+    def test_batch_etag(self, client):
+        batch = [{"query": "query Agents { agents { id } }"}, {"query": "query Events { events { id } }"}]
+        etag = client.post("/graphql", json=batch).headers["etag"]
+        assert client.post("/graphql", json=batch, headers={"If-None-Match": etag}).status_code == 304
+
+    def test_entries_share_response_cache(self, client):
+        from app.server import response_cache
+
+        query = {"query": "query Tasks { tasks { id } }"}
+        single = client.post("/graphql", json=query).content
+        before = response_cache.hits
+        batched = client.post("/graphql", json=[query]).content
+        assert batched == b"[" + single + b"]"
+        assert response_cache.hits == before + 1
+
+    def test_empty_batch_rejected(self, client):
+        assert client.post("/graphql", json=[]).status_code == 400
+
+
+class TestPersistedQueries:
+    QUERY = "query Agents { agents { id } }"
+
+    def _hash_body(self, digest):
+        return {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": digest}}}
+
+    def test_unknown_hash_then_register(self, client):
+        from app.graphql import query_hash
+
+        query = self.QUERY + " # apq"
+        digest = query_hash(query)
+        r = client.post("/graphql", json=self._hash_body(digest))
+        assert r.json()["errors"][0]["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+        client.post("/graphql", json={"query": query, **self._hash_body(digest)})
+        r = client.post("/graphql", json=self._hash_body(digest))
+        assert len(r.json()["data"]["agents"]) == 32
+
+    def test_hash_mismatch(self, client):
+        r = client.post("/graphql", json={"query": self.QUERY, **self._hash_body("0" * 64)})
+        assert r.status_code == 400
+
+    def test_persisted_over_get(self, client):
+        from app.graphql import query_hash
+
+        client.post("/graphql", json={"query": self.QUERY})
+        r = client.get("/graphql", params={"extensions": json.dumps(self._hash_body(query_hash(self.QUERY))["extensions"])})
+        assert r.status_code == 200
+        assert "etag" in r.headers
+
+
+class TestResponseCache:
+    def test_repeated_reads_hit_cache(self, client):
+        from app.server import response_cache
+
+        before = response_cache.hits
+        query = {"query": "query Agents { agents { id } }"}
+        first = client.post("/graphql", json=query)
+        second = client.post("/graphql", json=query)
+        assert first.content == second.content
+        assert response_cache.hits == before + 1
+
+    def test_tick_invalidates(self, client, setup_sim):
+        first = client.get("/api/state").json()
+        asyncio.new_event_loop().run_until_complete(setup_sim.run_tick())
+        second = client.get("/api/state").json()
+        assert second["tick"] == first["tick"] + 1
+
+    def test_mutation_invalidates(self, client):
+        before = len(client.get("/api/agents").json())
+        client.post("/api/agents/spawn", json={"name": "Cache Buster"})
+        assert len(client.get("/api/agents").json()) == before + 1
+
+    def test_cache_metrics(self, client):
+        client.get("/api/tasks")
+        client.get("/api/tasks")
+        stats = client.get("/api/metrics/cache").json()
+        assert stats["hits"] >= 1
+        assert "hitRate" in stats
+
+    def test_stream_metrics(self, client, setup_sim):
+        setup_sim.hub.subscribe()
+        stats = client.get("/api/metrics/stream").json()
+        assert stats["subscribers"] == 1
+        assert stats["bufferSize"] > 0
+
+
+class TestConditionalRequests:
+    def test_etag_and_not_modified(self, client):
+        first = client.get("/api/tasks")
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and etag.endswith('"')
+        r = client.get("/api/tasks", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert r.content == b""
+        assert r.headers["etag"] == etag
+
+    def test_weak_and_listed_validators_match(self, client):
+        etag = client.get("/api/agents").headers["etag"]
+        r = client.get("/api/agents", headers={"If-None-Match": f'"stale", W/{etag}'})
+        assert r.status_code == 304
+
+    def test_etag_per_collection(self, client, setup_sim):
+        agents_etag = client.get("/api/agents").headers["etag"]
+        events_etag = client.get("/api/events").headers["etag"]
+        setup_sim.add_event("system", "Only the event log changed")
+        assert client.get("/api/agents", headers={"If-None-Match": agents_etag}).status_code == 304
+        r = client.get("/api/events", headers={"If-None-Match": events_etag})
+        assert r.status_code == 200
+        assert r.headers["etag"] != events_etag
+
+    def test_tick_changes_state_etag(self, client, setup_sim):
+        etag = client.get("/api/state").headers["etag"]
+        asyncio.new_event_loop().run_until_complete(setup_sim.run_tick())
+        assert client.get("/api/state", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_graphql_etag_depends_on_variables(self, client):
+        query = "query Agent($id: ID!) { agent(id: $id) { id } }"
+        a = client.post("/graphql", json={"query": query, "variables": {"id": "mr-krabs"}})
+        b = client.post("/graphql", json={"query": query, "variables": {"id": "plankton"}})
+        assert a.headers["etag"] != b.headers["etag"]
+        r = client.post("/graphql", json={"query": query, "variables": {"id": "mr-krabs"}}, headers={"If-None-Match": a.headers["etag"]})
+        assert r.status_code == 304
+
+    def test_graphql_get(self, client):
+        r = client.get("/graphql", params={"query": "query Agent { agent { id } }", "variables": '{"id": "mr-krabs"}'})
+        assert r.status_code == 200
+        assert r.json()["data"]["agent"]["id"] == "mr-krabs"
+        r = client.get("/graphql", params={"query": "query Agents { agents { id } }", "variables": "{"})
+        assert r.status_code == 400
+
+
+class TestDeltaSync:
+    def test_delta_after_cursor(self, client, setup_sim):
+        task = SandboxTask(id=setup_sim.ids.task_id(), title="Delta")
+        setup_sim.add_task(task)
+        cursor = client.get("/api/tasks", params={"since": "0"}).json()["cursor"]
+        setup_sim._touch_task(task)
+        data = client.get("/api/tasks", params={"since": cursor}).json()
+        assert data["full"] is False
+        assert [t["id"] for t in data["updated"]] == [task.id]
+        assert data["created"] == [] and data["removed"] == []
+        assert data["cursor"] != cursor
+
+    def test_agents_created(self, client):
+        cursor = client.get("/api/agents", params={"since": "0"}).json()["cursor"]
+        client.post("/api/agents/spawn", json={"name": "Delta Agent"})
+        data = client.get("/api/agents", params={"since": cursor}).json()
+        assert [a["id"] for a in data["created"]] == ["delta-agent"]
+
+    def test_foreign_epoch_gets_full_resync(self, client, setup_sim):
+        data = client.get("/api/agents", params={"since": "deadbeef.5"}).json()
+        assert data["full"] is True
+        assert len(data["created"]) == len(setup_sim.agents)
+
+    def test_restart_forces_full_resync(self, client):
+        cursor = client.get("/api/tasks", params={"since": "0"}).json()["cursor"]
+        client.post("/api/restart")
+        assert client.get("/api/tasks", params={"since": cursor}).json()["full"] is True
+
+    def test_invalid_cursor(self, client):
+        assert client.get("/api/tasks", params={"since": "nope"}).json() == {"error": "invalid cursor"}
+
+    def test_graphql_delta(self, client):
+        r = client.post("/graphql", json={
+            "query": "query TasksDelta($since: String!) { tasksDelta(since: $since) { cursor full created { id } } }",
+            "variables": {"since": "0"},
+        })
+        data = r.json()["data"]["tasksDelta"]
+        assert data["full"] is False
+        assert len(data["created"]) == len(get_sim().tasks)
+
+
+class TestListFilters:
+    def _add_tasks(self, sim, n):
+        tasks = [SandboxTask(id=sim.ids.task_id(), title=f"Filter {i}", assignee_id="tech-talent" if i % 2 else None) for i in range(n)]
+        for task in tasks:
+            sim.add_task(task)
+        return tasks
+
+    def test_tasks_filtered(self, client, setup_sim):
+        ours = self._add_tasks(setup_sim, 6)
+        data = client.get("/api/tasks", params={"assignee": "tech-talent", "status": "BACKLOG"}).json()
+        assert [t["id"] for t in data if t["title"].startswith("Filter")] == [t.id for t in ours[1::2]]
+        assert all(t["assigneeId"] == "tech-talent" and t["status"] == "BACKLOG" for t in data)
+
+    def test_tasks_paged(self, client, setup_sim):
+        self._add_tasks(setup_sim, 5)
+        expected = [t["id"] for t in client.get("/api/tasks").json()]
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/api/tasks", params=params).json()
+            seen += [t["id"] for t in page["items"]]
+            cursor = page["nextCursor"]
+            if cursor is None:
+                break
+        assert seen == expected
+
+    def test_tasks_updated_since(self, client, setup_sim):
+        task = self._add_tasks(setup_sim, 1)[0]
+        data = client.get("/api/tasks", params={"updatedSince": task.updated_at}).json()
+        assert task.id in [t["id"] for t in data]
+        assert all(t["updatedAt"] >= data[0]["updatedAt"] for t in data)
+
+    def test_tasks_invalid_cursor(self, client):
+        assert client.get("/api/tasks", params={"cursor": "TASK-9999"}).json() == {"error": "invalid cursor"}
+
+    def test_agents_filtered(self, client, setup_sim):
+        leads = client.get("/api/agents", params={"role": "LEAD"}).json()
+        assert sorted(a["id"] for a in leads) == sorted(a.id for a in setup_sim.agents if a.role.value == "lead")
+        reports = client.get("/api/agents", params={"parent": "mr-krabs", "limit": 100}).json()
+        assert {a["parentId"] for a in reports["items"]} == {"mr-krabs"}
+        assert reports["nextCursor"] is None
+
+    def test_events_filtered_and_paged(self, client, setup_sim):
+        for i in range(5):
+            setup_sim.add_event("filter_test", f"event {i}")
+        page = client.get("/api/events", params={"type": "filter_test", "limit": 3}).json()
+        assert [e["reasoning"] for e in page["items"]] == ["event 2", "event 3", "event 4"]
+        rest = client.get("/api/events", params={"type": "filter_test", "cursor": page["nextCursor"]}).json()
+        assert [e["reasoning"] for e in rest["items"]] == ["event 0", "event 1"]
+        assert rest["nextCursor"] is None
+
+    def test_events_time_range(self, client, setup_sim):
+        event = setup_sim.add_event("filter_test", "ranged")
+        data = client.get("/api/events", params={"from": event.timestamp, "to": event.timestamp + 1, "type": "filter_test"}).json()
+        assert [e["reasoning"] for e in data] == ["ranged"]
+
+    def test_graphql_tasks_filters(self, client, setup_sim):
+        ours = self._add_tasks(setup_sim, 4)
+        r = client.post("/graphql", json={
+            "query": "query Tasks($assigneeId: ID, $after: ID) { tasks(assigneeId: $assigneeId, after: $after, limit: 1) { id } }",
+            "variables": {"assigneeId": "tech-talent", "after": ours[0].id},
+        })
+        assert r.json()["data"]["tasks"] == [{"id": ours[1].id}]
+
+    @pytest.mark.parametrize("limit", ["10", 2.5, True])
+    def test_graphql_tasks_bad_limit(self, client, limit):
+        r = client.post("/graphql", json={
+            "query": "query Tasks($limit: Int) { tasks(limit: $limit) { id } }",
+            "variables": {"limit": limit},
+        })
+        assert r.status_code == 400
+        assert r.json()["errors"][0]["extensions"]["code"] == "BAD_USER_INPUT"
+
+
+class TestStreamedLists:
+    def test_tasks_json_array(self, client, setup_sim):
+        for i in range(3):
+            setup_sim.add_task(SandboxTask(id=setup_sim.ids.task_id(), title=f"Streamed {i}", priority=TaskPriority.HIGH))
+        r = client.get("/api/tasks", params={"stream": "json"})
+        assert r.headers["content-type"].startswith("application/json")
+        assert r.json() == client.get("/api/tasks").json()
+        filtered = client.get("/api/tasks", params={"stream": "json", "priority": "high"}).json()
+        assert [t["title"] for t in filtered if t["title"].startswith("Streamed")] == ["Streamed 0", "Streamed 1", "Streamed 2"]
+
+    def test_metrics_ndjson_by_accept(self, client):
+        r = client.get("/api/metrics", headers={"Accept": "application/x-ndjson"})
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert lines == client.get("/api/metrics").json()
+
+    def test_events_stream_whole_log(self, client, setup_sim):
+        for i in range(120):
+            setup_sim.add_event("system", f"event {i}")
+        r = client.get("/api/events", params={"stream": "ndjson"})
+        assert len(r.text.splitlines()) == len(setup_sim.events) > 100
+
+    def test_etag_revalidates(self, client):
+        r = client.get("/api/tasks", params={"stream": "ndjson"})
+        etag = r.headers["etag"]
+        assert etag != client.get("/api/tasks").headers["etag"]
+        assert client.get("/api/tasks", params={"stream": "ndjson"}, headers={"If-None-Match": etag}).status_code == 304
+
+    def test_rejects_paging_and_unknown_format(self, client):
+        assert "error" in client.get("/api/tasks", params={"stream": "json", "limit": 5}).json()
+        assert "error" in client.get("/api/metrics", params={"stream": "xml"}).json()
+
+
 class TestOrderEndpoint:
     def test_send_order(self, client):
         r = client.post("/api/order", json={"message": "Build authentication system"})
@@ -198,6 +540,15 @@ class TestSpawnAgent:
         r = client.post("/api/agents/spawn", json={"role": "worker"})
         assert "error" in r.json()
 
+    def test_spawn_with_inbox_settings(self, client):
+        r = client.post("/api/agents/spawn", json={"name": "Inbox Agent", "inboxCapacity": 5, "inboxPolicy": "backpressure"})
+        agent = r.json()["agent"]
+        assert (agent["inboxCapacity"], agent["inboxPolicy"]) == (5, "backpressure")
+
+    def test_spawn_rejects_bad_inbox_settings(self, client):
+        assert "error" in client.post("/api/agents/spawn", json={"name": "Bad Inbox", "inboxCapacity": 0}).json()
+        assert "error" in client.post("/api/agents/spawn", json={"name": "Bad Inbox", "inboxPolicy": "never"}).json()
+
 
 class TestSpeedControl:
     def test_get_speed(self, client):
@@ -234,6 +585,22 @@ class TestACPMetrics:
         assert "totalDelegations" in data
         assert "escalationsByReason" in data
 
+    def test_latency_percentiles(self, client):
+        data = client.get("/api/metrics/acp").json()
+        for key in ("ackLatency", "completionLatency"):
+            assert set(data[key]) == {"count", "meanMs", "p50Ms", "p95Ms", "p99Ms", "maxMs"}
+        assert data["window"]["windowMs"] > 0
+
+    def test_window_etag_moves_with_the_clock(self, client, setup_sim):
+        etag = client.get("/api/metrics/acp").headers["etag"]
+        assert client.get("/api/metrics/acp", headers={"If-None-Match": etag}).status_code == 304
+        # The same messages and tasks, published one window later.
+        later = int(time.time() * 1000) + setup_sim.acp.window_ms
+        setup_sim.snapshot().acp = setup_sim.acp.snapshot(later)
+        r = client.get("/api/metrics/acp", headers={"If-None-Match": etag})
+        assert r.status_code == 200
+        assert r.json()["window"]["messages"] == 0
+
 
 class TestRestart:
     def test_restart_organic(self, client):
@@ -256,8 +623,94 @@ class TestTaskActivity:
         assert r.json() == []
 
 
+    def test_paginated_activity(self, client, setup_sim):
+        sim = setup_sim
+        for i in range(5):
+            sim.push_message(sim.make_acp(ACPType.PROGRESS, "bug-hunter", "tech-talent", "TASK-0042", body=f"step {i}"))
+        r = client.get("/api/task/TASK-0042/activity?cursor=&limit=3")
+        page = r.json()
+        assert [m["body"] for m in page["items"]] == ["step 2", "step 3", "step 4"]
+        assert page["total"] == 5
+        r = client.get(f"/api/task/TASK-0042/activity?cursor={page['nextCursor']}&limit=3")
+        page = r.json()
+        assert [m["body"] for m in page["items"]] == ["step 0", "step 1"]
+        assert page["nextCursor"] is None
+
+    def test_invalid_cursor(self, client):
+        r = client.get("/api/task/TASK-0042/activity?cursor=abc")
+        assert "error" in r.json()
+
+
 class TestAgentMessages:
     def test_agent_messages(self, client):
         r = client.get("/api/agent/mr-krabs/messages")
         assert r.status_code == 200
         assert isinstance(r.json(), list)
+
+
+def _until(condition, timeout=1.0):
+    """Poll for state changed by the server thread."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestWebSocketStream:
+    def _since(self, sim):
+        """Push one ACP message; returns the id to resume from just before it."""
+        last = sim.hub.event_id(sim.hub.last_id)
+        sim.push_message(sim.make_acp(ACPType.PROGRESS, "bug-hunter", "tech-talent", "TASK-0042", body="over the socket"))
+        return last
+
+    def test_json_frames(self, client, setup_sim):
+        last = self._since(setup_sim)
+        with client.websocket_connect(f"/api/ws?kind=acp&lastEventId={last}") as ws:
+            assert ws.receive_json()["type"] == "connected"
+            frame = ws.receive_json()
+            assert (frame["kind"], frame["data"]["body"]) == ("acp", "over the socket")
+            assert frame["id"] == setup_sim.hub.event_id(setup_sim.hub.last_id)
+
+    def test_msgpack_subprotocol(self, client, setup_sim):
+        msgpack = pytest.importorskip("msgpack")
+        last = self._since(setup_sim)
+        with client.websocket_connect(f"/api/ws?agent=tech-talent&lastEventId={last}", subprotocols=["msgpack"]) as ws:
+            assert ws.accepted_subprotocol == "msgpack"
+            assert msgpack.unpackb(ws.receive_bytes())["type"] == "connected"
+            frame = msgpack.unpackb(ws.receive_bytes())
+            assert (frame["kind"], frame["data"]["to"]) == ("acp", "tech-talent")
+
+    def test_unknown_encoding_rejected(self, client):
+        from starlette.websockets import WebSocketDisconnect
+
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/api/ws?encoding=xml") as ws:
+                ws.receive_json()
+        assert exc.value.code == 1003
+
+    def test_control_messages_change_filter(self, client, setup_sim):
+        hub = setup_sim.hub
+        with client.websocket_connect("/api/ws?agent=karen") as ws:
+            ws.receive_json()
+            (sub,) = hub._all
+            ws.send_json({"op": "subscribe", "agents": ["plankton"], "kinds": ["acp"]})
+            ws.send_json({"op": "unsubscribe", "agents": ["karen"]})
+            assert _until(lambda: sub.filter.agents == {"plankton"})
+            assert sub.filter.kinds == {"acp"}
+        assert _until(lambda: len(hub) == 0)
+
+
+class TestEngineThread:
+    def test_writes_visible_to_next_read(self):
+        import app.server as server_module
+
+        with TestClient(app) as client:
+            assert client.get("/api/metrics/engine").json()["running"] is True
+            r = client.post("/api/order", json={"message": "Ship the thing"})
+            assert r.json()["ok"] is True
+            assert any(e["type"] == "human_order" for e in client.get("/api/events").json())
+            r = client.post("/api/agents/spawn", json={"name": "Squidward", "role": "worker"})
+            assert r.json()["agent"]["id"] == "squidward"
+            assert client.put("/api/speed", json={"tickIntervalMs": 250}).json()["tickIntervalMs"] == 250
+            assert client.get("/api/speed").json()["tickIntervalMs"] == 250
+        assert server_module.engine is None
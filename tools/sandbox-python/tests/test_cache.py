@@ -0,0 +1,62 @@
+"""Unit tests for the response cache."""
+
+from app.cache import ResponseCache, normalize_variables
+
+
+class TestNormalizeVariables:
+    def test_key_order_independent(self):
+        assert normalize_variables({"a": 1, "b": 2}) == normalize_variables({"b": 2, "a": 1})
+
+    def test_empty(self):
+        assert normalize_variables(None) == normalize_variables({}) == ""
+
+
+class TestResponseCache:
+    def test_hit_after_miss(self):
+        cache = ResponseCache()
+        calls = []
+        compute = lambda: calls.append(1) or b"[]"
+        assert cache.get_or_compute("Agents", {}, "v1", compute) == b"[]"
+        assert cache.get_or_compute("Agents", {}, "v1", compute) == b"[]"
+        assert len(calls) == 1
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_variables_distinguish_entries(self):
+        cache = ResponseCache()
+        cache.get_or_compute("Events", {"limit": 10}, "v1", lambda: b"10")
+        assert cache.get_or_compute("Events", {"limit": 20}, "v1", lambda: b"20") == b"20"
+        assert cache.misses == 2
+
+    def test_new_state_invalidates(self):
+        cache = ResponseCache()
+        cache.get_or_compute("Agents", None, "v1", lambda: b"old")
+        assert cache.get_or_compute("Agents", None, "v2", lambda: b"new") == b"new"
+        assert cache.invalidations == 1
+        assert len(cache) == 1
+
+    def test_states_tracked_per_entry(self):
+        cache = ResponseCache()
+        cache.get_or_compute("Agents", None, "agents.1", lambda: b"agents")
+        cache.get_or_compute("Tasks", None, "tasks.2", lambda: b"tasks")
+        cache.get_or_compute("Tasks", None, "tasks.3", lambda: b"tasks-new")
+        assert cache.get_or_compute("Agents", None, "agents.1", lambda: b"x") == b"agents"
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.get_or_compute("a", None, "v1", lambda: b"a")
+        cache.get_or_compute("b", None, "v1", lambda: b"b")
+        cache.get_or_compute("a", None, "v1", lambda: b"a")  # refresh a
+        cache.get_or_compute("c", None, "v1", lambda: b"c")  # evicts b
+        assert cache.evictions == 1
+        assert cache.get_or_compute("a", None, "v1", lambda: b"x") == b"a"
+        assert cache.get_or_compute("b", None, "v1", lambda: b"x") == b"x"
+
+    def test_stats(self):
+        cache = ResponseCache(max_entries=8)
+        cache.get_or_compute("a", None, "v1", lambda: b"a")
+        cache.get_or_compute("a", None, "v1", lambda: b"a")
+        stats = cache.stats()
+        assert stats["hitRate"] == 0.5
+        assert stats["entries"] == 1
+        assert stats["maxEntries"] == 8
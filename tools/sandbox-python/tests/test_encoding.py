@@ -0,0 +1,67 @@
+"""Tests for the JSON encoding helpers."""
+
+import json
+
+import pytest
+
+from app.encoding import FastJSONResponse, dumps, dumps_array, iter_json, sse_frame
+
+
+async def _collect(chunks) -> list[bytes]:
+    return [chunk async for chunk in chunks]
+
+
+class TestEncoding:
+    def test_dumps_compact_utf8(self):
+        out = dumps({"name": "Señor Krabs", "n": [1, 2]})
+        assert isinstance(out, bytes)
+        assert json.loads(out) == {"name": "Señor Krabs", "n": [1, 2]}
+        assert b" " not in out.replace("Señor Krabs".encode(), b"")
+
+    def test_dumps_array_of_encoded(self):
+        assert json.loads(dumps_array([dumps({"a": 1}), dumps({"b": 2})])) == [{"a": 1}, {"b": 2}]
+        assert dumps_array([]) == b"[]"
+
+    def test_sse_frame(self):
+        assert sse_frame(b'{"type":"heartbeat"}') == b'data: {"type":"heartbeat"}\r\n\r\n'
+
+    def test_sse_frame_with_id(self):
+        assert sse_frame(b"{}", "ab12.7") == b"id: ab12.7\r\ndata: {}\r\n\r\n"
+
+    def test_response_renders_bytes(self):
+        r = FastJSONResponse({"ok": True})
+        assert json.loads(r.body) == {"ok": True}
+        assert r.media_type == "application/json"
+
+
+class TestIterJson:
+    @pytest.mark.asyncio
+    async def test_array_in_chunks(self):
+        items = [dumps({"n": i}) for i in range(50)]
+        chunks = await _collect(iter_json(iter(items), chunk_bytes=64))
+        assert len(chunks) > 1
+        assert json.loads(b"".join(chunks)) == [{"n": i} for i in range(50)]
+
+    @pytest.mark.asyncio
+    async def test_ndjson(self):
+        chunks = await _collect(iter_json(iter([b"1", b"2"]), ndjson=True))
+        assert b"".join(chunks) == b"1\n2\n"
+
+    @pytest.mark.asyncio
+    async def test_empty(self):
+        assert b"".join(await _collect(iter_json(iter([])))) == b"[]"
+        assert await _collect(iter_json(iter([]), ndjson=True)) == []
+
+    @pytest.mark.asyncio
+    async def test_items_consumed_lazily(self):
+        produced = []
+
+        def items():
+            for i in range(100):
+                produced.append(i)
+                yield b"0" * 10
+
+        chunks = iter_json(items(), chunk_bytes=100)
+        await chunks.__anext__()
+        assert len(produced) < 100
+        await chunks.aclose()
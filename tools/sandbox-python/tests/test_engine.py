@@ -0,0 +1,147 @@
+"""Tests for simulation snapshots and the engine thread."""
+
+import asyncio
+
+import pytest
+
+from app.agents import create_all_agents
+from app.engine import Engine
+from app.simulation import Simulation
+from app.stream import parse_filter
+from app.types import ACPType
+
+
+def _sim(**kwargs) -> Simulation:
+    return Simulation(create_all_agents(), tick_interval_ms=100, **kwargs)
+
+
+class TestSnapshot:
+    def test_cached_until_state_changes(self):
+        sim = _sim()
+        snap = sim.snapshot()
+        assert sim.snapshot() is snap
+        sim.add_event("system", "x")
+        assert sim.snapshot() is not snap
+
+    def test_later_changes_do_not_reach_it(self):
+        sim = _sim()
+        snap = sim.snapshot()
+        agent = sim.agents_by_id["mr-krabs"]
+        sim.credit(agent, 10, "bonus", "manual")
+        sim.add_event("system", "after")
+        assert snap.agents_by_id["mr-krabs"].stats.credits_earned == 0
+        assert sim.snapshot().agents_by_id["mr-krabs"].stats.credits_earned == 10
+        assert snap.events[-1].message != "after"
+        assert len(snap.credits.page()[0]) == 0
+
+    def test_unchanged_entities_shared(self):
+        sim = _sim()
+        first = sim.snapshot()
+        sim.credit(sim.agents_by_id["tech-talent"], 5, "bonus", "manual")
+        second = sim.snapshot()
+        assert second.agents_by_id["tech-talent"] is not first.agents_by_id["tech-talent"]
+        assert second.agents_by_id["mr-krabs"] is first.agents_by_id["mr-krabs"]
+        # Nothing changed in tasks, so the whole collection is reused.
+        assert second.tasks is first.tasks
+
+    def test_message_views_bounded(self):
+        sim = _sim()
+        sim.push_message(sim.make_acp(ACPType.PROGRESS, "karen", "mr-krabs", "TASK-0001", body="before"))
+        snap = sim.snapshot()
+        sim.push_message(sim.make_acp(ACPType.PROGRESS, "karen", "mr-krabs", "TASK-0001", body="after"))
+        assert [m.body for m in snap.messages.for_task("TASK-0001")] == ["before"]
+        assert [m.body for m in snap.messages.task_page("TASK-0001")[0]] == ["before"]
+        assert [m.body for m in snap.messages.recent(5)] == ["before"]
+        assert len(snap.messages.for_agent("karen")) == 1
+        assert snap.messages.conversations.get("karen", "mr-krabs").count == 1
+        assert snap.messages.task_activity("TASK-0001").total == 1
+
+    @pytest.mark.asyncio
+    async def test_tags_match_simulation(self):
+        sim = _sim()
+        await sim.run_tick()
+        snap = sim.snapshot()
+        assert snap.collection_tag("tasks") == sim.collection_tag("tasks")
+        assert snap.lineage("tech-talent") == sim.lineage("tech-talent")
+
+
+class TestEngine:
+    @pytest.mark.asyncio
+    async def test_ticks_publish_snapshots_and_stream(self):
+        sim = _sim()
+        sub = sim.hub.subscribe(batch=True)
+        engine = Engine(sim, asyncio.get_running_loop())
+        engine.start()
+        try:
+            for _ in range(200):
+                if engine.snapshot.tick >= 2:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            engine.stop()
+        assert engine.snapshot.tick >= 2
+        await asyncio.sleep(0)
+        assert len(sub) > 0
+
+    @pytest.mark.asyncio
+    async def test_commands_run_on_engine_thread(self):
+        sim = _sim()
+        sim.tick_interval_ms = 10_000
+        sub = sim.hub.subscribe(parse_filter(types=["human_order"]))
+        engine = Engine(sim, asyncio.get_running_loop())
+        engine.start()
+        try:
+            event = await engine.submit(lambda s: s.add_event("human_order", "hello", agent_id="mr-krabs"))
+            # The command's snapshot is published before its result.
+            assert engine.snapshot.events[-1] is event
+            assert len(sub) == 1
+            with pytest.raises(KeyError):
+                await engine.submit(lambda s: s.agents_by_id["nobody"])
+        finally:
+            engine.stop()
+        assert engine.stats()["commands"] == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_tick_logged_and_ticking_continues(self, caplog):
+        sim = _sim()
+        step = sim.step
+
+        def flaky_step() -> None:
+            step()
+            if sim.tick == 1:
+                raise RuntimeError("bad tick")
+
+        sim.step = flaky_step
+        sim.tick_interval_ms = 1
+        engine = Engine(sim, asyncio.get_running_loop())
+        engine.start()
+        try:
+            for _ in range(200):
+                if engine.snapshot.tick >= 3:
+                    break
+                await asyncio.sleep(0.01)
+            assert await engine.submit(lambda s: s.tick) >= 3
+        finally:
+            engine.stop()
+        assert engine.stats()["tickErrors"] == 1
+        assert "tick 1 failed" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_commands_fail_once_thread_exits(self):
+        sim = _sim()
+        sim.tick_interval_ms = 10_000
+
+        class BrokenEngine(Engine):
+            __slots__ = ()
+
+            def _publish(self, tick=None) -> None:
+                raise RuntimeError("publish failed")
+
+        engine = BrokenEngine(sim, asyncio.get_running_loop())
+        engine.start()
+        with pytest.raises(RuntimeError, match="not running"):
+            await asyncio.wait_for(engine.submit(lambda s: s.tick), 1)
+        with pytest.raises(RuntimeError, match="not running"):
+            await asyncio.wait_for(engine.submit(lambda s: s.tick), 1)
+        assert engine.stats()["running"] is False
+        engine.stop()
@@ -0,0 +1,83 @@
+"""Tests for the GraphQL document parser and field selection."""
+
+import pytest
+
+from app.graphql import DocumentCache, GraphQLSyntaxError, Variable, field_arguments, parse, query_hash, select, select_data
+
+
+class TestParse:
+    def test_operation_name_and_fields(self):
+        doc = parse("query Agents($orgId: ID!) { agents(orgId: $orgId) { id name } }")
+        op = doc.operation()
+        assert (op.type, op.name) == ("query", "Agents")
+        (root,) = op.selections
+        assert root.name == "agents"
+        assert root.arguments == (("orgId", Variable("orgId")),)
+        assert [f.name for f in root.selections] == ["id", "name"]
+
+    def test_aliases_and_literal_arguments(self):
+        op = parse('{ boss: agent(id: "mr-krabs", limit: 5, tags: [A, B], flag: true) { id } }').operation()
+        (root,) = op.selections
+        assert (root.alias, root.name) == ("boss", "agent")
+        assert field_arguments(root, {}) == {"id": "mr-krabs", "limit": 5, "tags": ["A", "B"], "flag": True}
+
+    def test_fragments_inlined_and_merged(self):
+        doc = parse("""
+            query Tasks { tasks { ...TaskFields assignee { name } ... on TaskType { title } } }
+            fragment TaskFields on TaskType { id assignee { id } }
+        """)
+        (root,) = doc.operation("Tasks").selections
+        assert [f.alias for f in root.selections] == ["id", "assignee", "title"]
+        assignee = root.selections[1]
+        assert [f.name for f in assignee.selections] == ["id", "name"]
+
+    def test_comments_and_commas(self):
+        op = parse("# leading comment\nquery Q { a, b # trailing\n c }").operation()
+        assert [f.name for f in op.selections] == ["a", "b", "c"]
+
+    def test_multiple_operations_need_a_name(self):
+        doc = parse("query A { a } query B { b }")
+        assert doc.operation() is None
+        assert doc.operation("B").selections[0].name == "b"
+
+    @pytest.mark.parametrize("source", ["", "query { a", "query Q { ...Missing }", "fragment F on T { ...F } query { ...F }", "query Q { a(x: ) }"])
+    def test_syntax_errors(self, source):
+        with pytest.raises(GraphQLSyntaxError):
+            parse(source)
+
+
+class TestSelect:
+    def test_picks_and_aliases(self):
+        fields = parse("{ x { id label: name missing } }").operation().selections[0].selections
+        rows = [{"id": 1, "name": "a", "extra": True}, {"id": 2, "name": "b"}]
+        assert select(rows, fields, {}) == [{"id": 1, "label": "a", "missing": None}, {"id": 2, "label": "b", "missing": None}]
+
+    def test_nested_and_directives(self):
+        op = parse("query Q($full: Boolean) { t { id assignee { name } desc @include(if: $full) } }").operation()
+        fields = op.selections[0].selections
+        row = {"id": 1, "assignee": {"id": "x", "name": "X"}, "desc": "d"}
+        assert select(row, fields, {"full": False}) == {"id": 1, "assignee": {"name": "X"}}
+        assert select(row, fields, {"full": True})["desc"] == "d"
+
+    def test_select_data_root_names(self):
+        op = parse("{ agents { id } other { id } }").operation()
+        assert select_data({"agents": [{"id": 1, "name": "a"}]}, op.selections, {}) == {"agents": [{"id": 1}]}
+        lone = parse("{ credits { id } }").operation()
+        assert select_data({"creditHistory": [{"id": 1, "x": 2}]}, lone.selections, {}) == {"credits": [{"id": 1}]}
+
+
+class TestDocumentCache:
+    def test_parse_once_per_hash(self):
+        cache = DocumentCache()
+        digest, first = cache.parse("{ a }")
+        assert digest == query_hash("{ a }")
+        assert cache.parse("{ a }")[1] is first
+        assert cache.get(digest) is first
+        assert cache.misses == 1
+
+    def test_lru_bound(self):
+        cache = DocumentCache(max_entries=2)
+        for q in ("{ a }", "{ b }", "{ c }"):
+            cache.parse(q)
+        assert len(cache) == 2
+        assert cache.get(query_hash("{ a }")) is None
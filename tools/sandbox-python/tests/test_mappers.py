@@ -1,17 +1,31 @@
 """Unit tests for API response mappers."""
 
+import json
+
 from app.agents import create_all_agents
+from app.graphql import Selection
 from app.mappers import (
-    collect_all_messages,
-    generate_credits,
+    AGENT_FIELDS,
+    TASK_FIELDS,
+    LookupContext,
+    encode_task,
+    map_acp_message,
     map_agent,
+    map_credit,
     map_event,
+    map_metrics_snapshot,
     map_task,
+    select_agent,
+    select_task,
+    stream_task,
 )
 from app.types import (
     ACPMessage,
     ACPType,
     AgentRole,
+    AgentStatus,
+    CreditEntry,
+    MetricsSnapshot,
     SandboxAgent,
     SandboxEvent,
     SandboxTask,
@@ -25,10 +39,27 @@ def _make_agent(**kwargs) -> SandboxAgent:
     return SandboxAgent(**{**defaults, **kwargs})
 
 
+class TestLookupContext:
+    def test_resolves_agents_by_id(self):
+        agents = create_all_agents()
+        ctx = LookupContext(agents)
+        assert ctx.agent("mr-krabs").name == "Mr. Krabs"
+        assert ctx.agent("nobody") is None
+        assert ctx.agent(None) is None
+        assert ctx.agent_name("nobody", "nobody") == "nobody"
+
+    def test_memoizes_team_and_reputation(self):
+        ctx = LookupContext([])
+        assert ctx.team_id("Engineering") == "team-engineering"
+        assert ctx.team_id("Robotics") == "team-robotics"
+        assert ctx.reputation_level(10) == "ELITE"
+        assert ctx.reputation_level(1) == "NEW"
+
+
 class TestMapAgent:
     def test_maps_basic_fields(self):
         agent = _make_agent(id="sandy", name="Sandy Cheeks", level=6, domain="Engineering")
-        result = map_agent(agent, [agent])
+        result = map_agent(agent, LookupContext([agent]))
         assert result["id"] == "sandy"
         assert result["agentId"] == "sandy"
         assert result["name"] == "Sandy Cheeks"
@@ -36,63 +67,75 @@ class TestMapAgent:
         assert result["domain"] == "Engineering"
 
     def test_status_mapping(self):
-        agent = _make_agent(status="active")
-        result = map_agent(agent, [agent])
+        agent = _make_agent(status=AgentStatus.ACTIVE)
+        result = map_agent(agent, LookupContext([agent]))
         assert result["status"] == "ACTIVE"
 
     def test_busy_maps_to_active(self):
-        agent = _make_agent(status="busy")
-        result = map_agent(agent, [agent])
+        agent = _make_agent(status=AgentStatus.BUSY)
+        result = map_agent(agent, LookupContext([agent]))
         assert result["status"] == "ACTIVE"
 
     def test_trust_score_calculation(self):
         agent = _make_agent(level=10)
         agent.stats.tasks_completed = 5
-        result = map_agent(agent, [agent])
+        result = map_agent(agent, LookupContext([agent]))
         expected = min(100, 30 + 10 * 7 + 5 * 2)
         assert result["trustScore"] == expected
 
     def test_reputation_levels(self):
         for level, expected in [(10, "ELITE"), (7, "VETERAN"), (4, "TRUSTED"), (2, "PROBATION"), (1, "NEW")]:
             agent = _make_agent(level=level)
-            result = map_agent(agent, [agent])
+            result = map_agent(agent, LookupContext([agent]))
             assert result["reputationLevel"] == expected, f"L{level} should be {expected}"
 
     def test_orchestrator_vs_worker_mode(self):
         lead = _make_agent(level=7)
         worker = _make_agent(level=4)
-        assert map_agent(lead, [lead])["mode"] == "ORCHESTRATOR"
-        assert map_agent(worker, [worker])["mode"] == "WORKER"
+        assert map_agent(lead, LookupContext([lead]))["mode"] == "ORCHESTRATOR"
+        assert map_agent(worker, LookupContext([worker]))["mode"] == "WORKER"
 
     def test_avatar_fields_passed_through(self):
         agent = _make_agent(avatar="🦀", avatar_color="#ff0000", avatar_url="/avatars/test.png")
-        result = map_agent(agent, [agent])
+        result = map_agent(agent, LookupContext([agent]))
         assert result["avatar"] == "🦀"
         assert result["avatarColor"] == "#ff0000"
         assert result["avatarUrl"] == "/avatars/test.png"
 
     def test_team_id_from_domain(self):
         agent = _make_agent(domain="Engineering")
-        result = map_agent(agent, [agent])
+        result = map_agent(agent, LookupContext([agent]))
         assert result["teamId"] == "team-engineering"
 
     def test_parent_id_strips_human_principal(self):
         agent = _make_agent(parent_id="human-principal")
-        result = map_agent(agent, [agent])
+        result = map_agent(agent, LookupContext([agent]))
         assert result["parentId"] is None
 
     def test_all_32_agents_map_without_error(self):
         agents = create_all_agents()
         for agent in agents:
-            result = map_agent(agent, agents)
+            result = map_agent(agent, LookupContext(agents))
             assert result["id"] == agent.id
             assert isinstance(result["trustScore"], int)
 
 
+    def test_projection_cached_until_version_changes(self):
+        agent = _make_agent()
+        ctx = LookupContext([agent])
+        first = map_agent(agent, ctx)
+        agent.stats.tasks_completed = 3
+        assert map_agent(agent, ctx) is first
+        agent.version += 1
+        second = map_agent(agent, ctx)
+        assert second is not first
+        assert second["tasksCompleted"] == 3
+
+
 class TestMapTask:
     def test_maps_basic_fields(self):
         task = SandboxTask(id="TASK-0001", title="Fix bug", priority=TaskPriority.HIGH, creator_id="coo")
-        result = map_task(task, [])
+        result = map_task(task, LookupContext([]))
         assert result["id"] == "TASK-0001"
         assert result["title"] == "Fix bug"
         assert result["priority"] == "HIGH"
@@ -109,36 +152,94 @@ class TestMapTask:
         }
         for status, expected in mappings.items():
             task = SandboxTask(id="t", title="t", status=status)
-            assert map_task(task, [])["status"] == expected
+            assert map_task(task, LookupContext([]))["status"] == expected
 
     def test_assignee_resolved(self):
         agent = _make_agent(id="dev-1", name="Dev 1")
         task = SandboxTask(id="t", title="t", assignee_id="dev-1")
-        result = map_task(task, [agent])
+        result = map_task(task, LookupContext([agent]))
         assert result["assignee"]["id"] == "dev-1"
         assert result["assignee"]["name"] == "Dev 1"
 
     def test_no_assignee(self):
         task = SandboxTask(id="t", title="t")
-        result = map_task(task, [])
+        result = map_task(task, LookupContext([]))
         assert result["assignee"] is None
         assert result["assigneeId"] is None
 
     def test_done_has_completed_at(self):
         task = SandboxTask(id="t", title="t", status=TaskStatus.DONE)
-        result = map_task(task, [])
+        result = map_task(task, LookupContext([]))
         assert result["completedAt"] is not None
 
     def test_not_done_no_completed_at(self):
         task = SandboxTask(id="t", title="t", status=TaskStatus.IN_PROGRESS)
-        result = map_task(task, [])
+        result = map_task(task, LookupContext([]))
         assert result["completedAt"] is None
 
 
+    def test_projection_cached_until_version_changes(self):
+        task = SandboxTask(id="t", title="t")
+        ctx = LookupContext([])
+        first = map_task(task, ctx)
+        assert map_task(task, ctx) is first
+        task.status = TaskStatus.DONE
+        task.version += 1
+        assert map_task(task, ctx)["status"] == "DONE"
+
+    def test_selection_memoized_until_version_changes(self):
+        task = SandboxTask(id="t", title="t")
+        ctx = LookupContext([])
+        selection = Selection((("id", "id", None), ("state", "status", None)))
+        first = select_task(task, ctx, selection)
+        assert first == {"id": "t", "state": "BACKLOG"}
+        assert select_task(task, ctx, Selection(selection.plan)) is first
+        task.status = TaskStatus.DONE
+        task.version += 1
+        assert select_task(task, ctx, selection)["state"] == "DONE"
+
+    def test_selection_builds_only_selected_fields(self):
+        task = SandboxTask(id="t", title="t")
+        selected = select_task(task, LookupContext([]), Selection((("name", "title", None), ("missing", "nope", None))))
+        assert selected == {"name": "t", "missing": None}
+        assert task._projection is None
+
+    def test_field_builders_match_projections(self):
+        agents = create_all_agents()
+        ctx = LookupContext(agents)
+        task = SandboxTask(id="t", title="t", assignee_id=agents[0].id, status=TaskStatus.DONE)
+        for entity, fields, project in ((agents[0], AGENT_FIELDS, map_agent), (task, TASK_FIELDS, map_task)):
+            plan = tuple((name, name, None) for name in fields)
+            built = (select_agent if fields is AGENT_FIELDS else select_task)(entity, ctx, Selection(plan))
+            assert built == project(entity, ctx)
+
+    def test_encoded_bytes_follow_projection(self):
+        task = SandboxTask(id="t", title="t")
+        ctx = LookupContext([])
+        first = encode_task(task, ctx)
+        assert encode_task(task, ctx) is first
+        assert json.loads(first) == map_task(task, ctx)
+        task.status = TaskStatus.DONE
+        task.version += 1
+        assert json.loads(encode_task(task, ctx))["status"] == "DONE"
+
+    def test_stream_task_caches_nothing(self):
+        task = SandboxTask(id="t", title="t")
+        ctx = LookupContext([])
+        assert json.loads(stream_task(task, ctx)) == map_task(task, ctx)
+        task.version += 1
+        task._projection = None
+        stream_task(task, ctx)
+        assert task._projection is None and task._encoded is None
+        encoded = encode_task(task, ctx)
+        assert stream_task(task, ctx) is encoded
+
+
 class TestMapEvent:
     def test_maps_system_event(self):
         event = SandboxEvent(type="system", message="Boot")
-        result = map_event(event, [])
+        result = map_event(event, LookupContext([]))
+        assert result["id"] == f"evt-{event.id:010d}"
         assert result["type"] == "system"
         assert result["severity"] == "INFO"
         assert result["reasoning"] == "Boot"
@@ -146,43 +247,43 @@ class TestMapEvent:
     def test_maps_agent_event(self):
         agent = _make_agent(id="dev", name="Dev")
         event = SandboxEvent(type="agent_action", agent_id="dev", message="Working")
-        result = map_event(event, [agent])
+        result = map_event(event, LookupContext([agent]))
         assert result["actor"]["name"] == "Dev"
         assert result["entityType"] == "agent"
 
     def test_task_event_entity_type(self):
         event = SandboxEvent(type="agent_action", agent_id="dev", task_id="TASK-0001", message="Done")
-        result = map_event(event, [])
+        result = map_event(event, LookupContext([]))
         assert result["entityType"] == "task"
         assert result["entityId"] == "TASK-0001"
 
 
-class TestCollectAllMessages:
-    def test_deduplicates(self):
-        msg = ACPMessage(id="msg-1", type=ACPType.ACK, **{"from": "a"}, to="b")
-        agent_a = _make_agent(id="a")
-        agent_b = _make_agent(id="b")
-        agent_a.recent_messages = [msg]
-        agent_b.recent_messages = [msg]
-        result = collect_all_messages([agent_a, agent_b])
-        assert len(result) == 1
-
-    def test_sorted_by_timestamp(self):
-        msg1 = ACPMessage(id="m1", type=ACPType.ACK, **{"from": "a"}, to="b", timestamp=100)
-        msg2 = ACPMessage(id="m2", type=ACPType.ACK, **{"from": "b"}, to="a", timestamp=200)
-        agent = _make_agent(id="a")
-        agent.recent_messages = [msg2, msg1]
-        result = collect_all_messages([agent])
-        assert result[0].timestamp < result[1].timestamp
-
-    def test_empty_agents(self):
-        assert collect_all_messages([]) == []
-
-
-class TestGenerateCredits:
-    def test_empty_sim(self):
-        from app.simulation import Simulation
-        sim = Simulation(create_all_agents(), tick_interval_ms=100)
-        credits = generate_credits(sim)
-        # No metrics yet, but agents with 0 credits → no entries
-        assert isinstance(credits, list)
+class TestMapACPMessage:
+    def test_wire_keys(self):
+        msg = ACPMessage(id="m1", type=ACPType.ESCALATION, from_agent="w", to="l", task_id="TASK-0001", reason="BLOCKED")
+        result = map_acp_message(msg)
+        assert result["from"] == "w"
+        assert result["taskId"] == "TASK-0001"
+        assert result["type"] == "escalation"
+        assert result["reason"] == "BLOCKED"
+
+
+class TestMapMetricsSnapshot:
+    def test_maps_all_fields(self):
+        snap = MetricsSnapshot(
+            tick=3, timestamp=1000, active_agents=5, total_tasks=10, tasks_done=2, tasks_in_progress=3,
+            tasks_in_review=1, total_credits_earned=150.0, total_credits_spent=0.0, message_count=12,
+        )
+        result = map_metrics_snapshot(snap)
+        assert result["tick"] == 3
+        assert result["tasks_done"] == 2
+        assert result["total_credits_earned"] == 150.0
+
+
+class TestMapCredit:
+    def test_debit(self):
+        entry = CreditEntry(id=7, agent_id="a", amount=-12.5, balance_after=37.5, reason="Model inference tokens", trigger_type="model_usage", timestamp=0)
+        result = map_credit(entry)
+        assert result["id"] == "credit-7"
+        assert (result["type"], result["amount"], result["balanceAfter"]) == ("DEBIT", 12.5, 37.5)
+        assert result["createdAt"].startswith("1970-01-01")
@@ -0,0 +1,125 @@
+"""Tests for the streaming ACP metrics."""
+
+import random
+
+import pytest
+
+from app.agents import create_all_agents
+from app.metrics import AcpMetrics, LatencySketch
+from app.simulation import Simulation
+from app.types import ACPMessage, ACPType, SandboxTask, TaskStatus
+
+
+def _msg(type: ACPType, from_agent: str, to: str, task_id: str, ts: int, **extra) -> ACPMessage:
+    return ACPMessage(type=type, from_agent=from_agent, to=to, task_id=task_id, timestamp=ts, **extra)
+
+
+class TestLatencySketch:
+    def test_quantiles_within_relative_error(self):
+        rng = random.Random(7)
+        values = [int(rng.lognormvariate(6, 1.5)) + 2 for _ in range(20_000)]
+        sketch = LatencySketch()
+        for v in values:
+            sketch.add(v)
+        values.sort()
+        for q, got in zip((0.5, 0.95, 0.99), sketch.quantiles(0.5, 0.95, 0.99)):
+            exact = values[int(q * (len(values) - 1))]
+            assert abs(got - exact) <= exact * 0.02 + 1
+
+    def test_merge_equals_combined(self):
+        a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for v in range(1, 500):
+            (a if v % 2 else b).add(v * 3)
+            both.add(v * 3)
+        a.merge(b)
+        assert a.quantiles(0.5, 0.99) == both.quantiles(0.5, 0.99)
+        assert (a.count, a.total, a.max) == (both.count, both.total, both.max)
+
+    def test_empty_and_zero(self):
+        sketch = LatencySketch()
+        assert sketch.summary()["p99Ms"] == 0
+        sketch.add(0)
+        assert sketch.quantiles(0.5) == [0]
+
+
+class TestAcpMetrics:
+    def test_counters_and_latencies(self):
+        m = AcpMetrics()
+        m.record(_msg(ACPType.DELEGATION, "lead", "w", "T1", 1000))
+        m.record(_msg(ACPType.ACK, "w", "lead", "T1", 1200))
+        m.record(_msg(ACPType.ESCALATION, "w", "lead", "T1", 1500, reason="BLOCKED"))
+        m.record(_msg(ACPType.COMPLETION, "w", "lead", "T1", 5000))
+        summary = m.summary()
+        assert (summary["totalDelegations"], summary["totalAcks"], summary["totalCompletions"]) == (1, 1, 1)
+        assert summary["escalationsByReason"] == {"BLOCKED": 1}
+        assert summary["ackLatency"]["meanMs"] == 200
+        assert abs(summary["completionLatency"]["p50Ms"] - 4000) <= 40
+
+    def test_summary_cached_until_next_message(self):
+        m = AcpMetrics()
+        first = m.summary()
+        assert m.summary() is first
+        m.record(_msg(ACPType.PROGRESS, "w", "lead", "T1", 1))
+        assert m.summary() is not first
+
+    def test_open_delegations_bounded(self):
+        m = AcpMetrics(max_open_tasks=2)
+        for i, task in enumerate(("T1", "T2", "T3")):
+            m.record(_msg(ACPType.DELEGATION, "lead", "w", task, i))
+        assert m.open_tasks == 2
+        m.record(_msg(ACPType.ACK, "w", "lead", "T1", 10))
+        assert m.summary()["ackLatency"]["count"] == 0
+        m.retire_task("T2")
+        assert m.open_tasks == 1
+        assert m.summary()["avgDelegationDepth"] == 1
+
+    def test_rolling_window_drops_old_slices(self):
+        m = AcpMetrics(window_ms=1000, slices=10)
+        m.record(_msg(ACPType.PROGRESS, "w", "lead", "T1", 0))
+        m.record(_msg(ACPType.PROGRESS, "w", "lead", "T1", 2500))
+        window = m.window(now_ms=2600)
+        assert window["messages"] == 1
+        assert m.summary()["totalAcks"] == 0
+        assert AcpMetrics().window(now_ms=0) is None
+
+
+class TestSimulationIntegration:
+    @pytest.mark.asyncio
+    async def test_finished_tasks_retired_when_tick_ends(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        task = SandboxTask(id="TASK-9999", title="t", status=TaskStatus.ASSIGNED, assignee_id="tech-talent")
+        sim.add_task(task)
+        sim.push_message(sim.make_acp(ACPType.DELEGATION, "mr-krabs", "tech-talent", task.id))
+        task.status = TaskStatus.DONE
+        sim._touch_task(task)
+        # The completion message follows the status change within a tick.
+        sim.push_message(sim.make_acp(ACPType.COMPLETION, "tech-talent", "mr-krabs", task.id))
+        assert sim.acp.summary()["completionLatency"]["count"] == 1
+        assert sim.acp.open_tasks == 1
+        await sim.run_tick()
+        assert sim.acp.open_tasks == 0
+
+    @pytest.mark.asyncio
+    async def test_matches_full_scan(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        sim.process_order("Build the landing page and fix the login bug")
+        for _ in range(40):
+            await sim.run_tick()
+        summary = sim.acp.summary()
+        by_type = {t: 0 for t in ACPType}
+        for msg in sim.messages:
+            by_type[msg.type] += 1
+        assert summary["totalDelegations"] == by_type[ACPType.DELEGATION]
+        assert summary["totalAcks"] == by_type[ACPType.ACK]
+        assert summary["totalCompletions"] == by_type[ACPType.COMPLETION]
+
+    @pytest.mark.asyncio
+    async def test_task_status_counts_match_recount(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        sim.process_order("Build the landing page and fix the login bug")
+        for _ in range(40):
+            await sim.run_tick()
+        recount: dict[TaskStatus, int] = {}
+        for t in sim.tasks:
+            recount[t.status] = recount.get(t.status, 0) + 1
+        assert {k: v for k, v in sim.task_status_counts.items() if v} == recount
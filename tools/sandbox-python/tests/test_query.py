@@ -0,0 +1,107 @@
+"""Tests for the filter indexes behind the list endpoints."""
+
+from app.query import TASK_FILTERS, CollectionIndex, EventIndex, parse_filters, scan, take
+from app.types import SandboxEvent, SandboxTask, TaskPriority, TaskStatus
+
+
+def _task(n: int, **fields) -> SandboxTask:
+    return SandboxTask(id=f"TASK-{n:04d}", title=f"Task {n}", updated_at=1000 + n, **fields)
+
+
+def _indexed(tasks: list[SandboxTask]) -> CollectionIndex:
+    index = CollectionIndex(TASK_FILTERS, ordered=lambda t: t.updated_at)
+    for task in tasks:
+        index.update(task)
+    return index
+
+
+class TestParseFilters:
+    def test_repeated_and_comma_separated(self):
+        filters = parse_filters(TASK_FILTERS, {"status": ["Done,review", "TODO"], "assignee": "Karen", "creator": None})
+        assert filters == {"status": {"done", "review", "todo"}, "assignee": {"Karen"}}
+
+    def test_empty_values_dropped(self):
+        assert parse_filters(TASK_FILTERS, {"status": [" , "], "priority": []}) == {}
+
+
+class TestScan:
+    def test_walks_most_selective_filter(self):
+        wide = [list(range(0, 100))]
+        narrow = [[3, 50], [7]]
+        assert list(scan([wide, narrow], 0, 100)) == [3, 7, 50]
+        assert list(scan([wide, narrow], 5, 60, reverse=True)) == [50, 7]
+
+    def test_no_filters_is_the_range(self):
+        assert list(scan([], 2, 5)) == [2, 3, 4]
+
+
+class TestCollectionIndex:
+    def test_select_in_collection_order(self):
+        tasks = [_task(i, status=TaskStatus.DONE if i % 3 == 0 else TaskStatus.BACKLOG, assignee_id=f"a{i % 2}") for i in range(12)]
+        snap = _indexed(tasks).snapshot()
+        done = snap.select(tasks, {"status": {"done"}})
+        assert [t.id for t in done] == [t.id for t in tasks if t.status == TaskStatus.DONE]
+        both = snap.select(tasks, {"status": {"done"}, "assignee": {"a1"}})
+        assert [t.id for t in both] == ["TASK-0003", "TASK-0009"]
+        # Pending and assigned both show as TODO in the API.
+        assert list(snap.select(tasks, {"status": {"todo"}})) == []
+
+    def test_moves_between_groups(self):
+        tasks = [_task(i) for i in range(4)]
+        index = _indexed(tasks)
+        before = index.snapshot()
+        tasks[2].priority = TaskPriority.CRITICAL
+        index.update(tasks[2])
+        after = index.snapshot()
+        assert [t.id for t in after.select(tasks, {"priority": {"critical"}})] == ["TASK-0002"]
+        assert [t.id for t in after.select(tasks, {"priority": {"normal"}})] == ["TASK-0000", "TASK-0001", "TASK-0003"]
+        # The earlier view keeps its groups; untouched fields are shared.
+        assert before.groups["priority"][TaskPriority.NORMAL.value] == (0, 1, 2, 3)
+        assert after.groups["status"] is not before.groups["status"]
+        assert after.groups["status"]["backlog"] is before.groups["status"]["backlog"]
+
+    def test_snapshot_reused_until_dirty(self):
+        tasks = [_task(i) for i in range(3)]
+        index = _indexed(tasks)
+        snap = index.snapshot()
+        index.update(tasks[0])
+        assert index.snapshot() is snap
+
+    def test_updated_since_and_start(self):
+        tasks = [_task(i) for i in range(10)]
+        snap = _indexed(tasks).snapshot()
+        assert [t.id for t in snap.select(tasks, {}, since=1007)] == ["TASK-0007", "TASK-0008", "TASK-0009"]
+        assert [t.id for t in snap.select(tasks, {}, since=1002, start=8)] == ["TASK-0008", "TASK-0009"]
+
+    def test_position_bounded_by_snapshot(self):
+        tasks = [_task(i) for i in range(3)]
+        index = _indexed(tasks)
+        snap = index.snapshot()
+        index.update(_task(3))
+        assert snap.position("TASK-0003", len(tasks)) is None
+        assert snap.position("TASK-0001", len(tasks)) == 1
+
+
+class TestEventIndex:
+    def _log(self) -> tuple[list[SandboxEvent], EventIndex]:
+        events, index = [], EventIndex()
+        for i in range(10):
+            event = SandboxEvent(id=100 + i, type="system" if i % 2 else "agent_action", agent_id=f"a{i % 3}", message=str(i), timestamp=1000 + i)
+            index.add(len(events), event)
+            events.append(event)
+        return events, index
+
+    def test_newest_first_with_filters(self):
+        events, index = self._log()
+        found = index.select(events, {"type": {"system"}, "agent": {"a0"}})
+        assert [e.message for e in found] == ["9", "3"]
+
+    def test_time_range_and_cursor(self):
+        events, index = self._log()
+        assert [e.message for e in index.select(events, {}, start_ms=1004, end_ms=1007)] == ["6", "5", "4"]
+        page, more = take(index.select(events, {}, before=105), 3)
+        assert [e.message for e in page] == ["4", "3", "2"] and more
+
+    def test_bounded_by_log_length(self):
+        events, index = self._log()
+        assert [e.message for e in index.select(events[:4], {"type": {"system"}})] == ["3", "1"]
@@ -0,0 +1,193 @@
+"""Tests for the engine process's published state and worker replicas."""
+
+import asyncio
+import stat
+
+import pytest
+
+from app.agents import create_all_agents
+from app.shared import CommandError, Publisher, Replica, serve_engine
+from app.simulation import Simulation
+from app.stream import parse_filter
+
+
+def _sim() -> Simulation:
+    sim = Simulation(create_all_agents(), tick_interval_ms=100)
+    sim.outbox = []
+    return sim
+
+
+def _publish(sim: Simulation, publisher: Publisher, tick: int | None = None) -> None:
+    items, sim.outbox = sim.outbox, []
+    publisher.publish(sim.snapshot(), items, tick)
+
+
+def _bonus(s: Simulation, agent_id: str, amount: int) -> int:
+    s.credit(s.agents_by_id[agent_id], amount, "bonus", "manual")
+    return s.agents_by_id[agent_id].stats.credits_earned
+
+
+def _fail(s: Simulation) -> None:
+    raise ValueError("nope")
+
+
+WRITES = {"bonus": _bonus, "fail": _fail}
+
+
+class TestReplica:
+    @pytest.mark.asyncio
+    async def test_mirrors_published_state(self, tmp_path):
+        sim, publisher = _sim(), Publisher(tmp_path)
+        replica = Replica(tmp_path)
+        assert replica.refresh() is False
+        _publish(sim, publisher)
+        for _ in range(3):
+            sim.step()
+            _publish(sim, publisher, sim.tick)
+        assert replica.refresh() is True
+        assert replica.refresh() is False
+        snap, expected = replica.snapshot, sim.snapshot()
+        assert snap.state_tag == expected.state_tag
+        assert snap.collection_tag("tasks") == expected.collection_tag("tasks")
+        assert [a.id for a in snap.agents] == [a.id for a in expected.agents]
+        assert [(t.id, t.version) for t in snap.tasks] == [(t.id, t.version) for t in expected.tasks]
+        assert [e.id for e in snap.events] == [e.id for e in expected.events]
+        assert len(snap.messages) == len(expected.messages)
+        assert snap.credits.page()[0] == expected.credits.page()[0]
+        assert snap.changes["tasks"].since(0) == expected.changes["tasks"].since(0)
+        assert snap.lineage("tech-talent") == expected.lineage("tech-talent")
+        # Replicas keep their own filter indexes.
+        for status in ("todo", "in_progress", "done"):
+            found = snap.task_index.select(snap.tasks, {"status": {status}})
+            assert [t.id for t in found] == [t.id for t in expected.task_index.select(expected.tasks, {"status": {status}})]
+
+    @pytest.mark.asyncio
+    async def test_only_changed_entities_published(self, tmp_path):
+        sim, publisher = _sim(), Publisher(tmp_path)
+        replica = Replica(tmp_path)
+        _publish(sim, publisher)
+        replica.refresh()
+        before = replica.snapshot
+        sim.credit(sim.agents_by_id["tech-talent"], 5, "bonus", "manual")
+        _publish(sim, publisher)
+        replica.refresh()
+        after = replica.snapshot
+        assert after.agents_by_id["tech-talent"].stats.credits_earned == 5
+        assert after.agents_by_id["mr-krabs"] is before.agents_by_id["mr-krabs"]
+        assert after.tasks is before.tasks
+
+    @pytest.mark.asyncio
+    async def test_stream_items_republished(self, tmp_path):
+        sim, publisher = _sim(), Publisher(tmp_path)
+        replica = Replica(tmp_path)
+        _publish(sim, publisher)
+        replica.refresh()
+        sub = replica.hub.subscribe(parse_filter(types=["system"]))
+        sim.add_event("system", "hello")
+        _publish(sim, publisher)
+        replica.refresh()
+        (frame,) = sub.take()
+        assert b"hello" in frame
+        assert frame.startswith(f"id: {sim.epoch}.".encode())
+        assert replica.snapshot.events[-1].message == "hello"
+
+    @pytest.mark.asyncio
+    async def test_reset_starts_over(self, tmp_path):
+        sim, publisher = _sim(), Publisher(tmp_path)
+        replica = Replica(tmp_path)
+        sim.add_event("system", "old")
+        _publish(sim, publisher)
+        replica.refresh()
+        sim.reset("organic")
+        _publish(sim, publisher)
+        replica.refresh()
+        assert "old" not in [e.message for e in replica.snapshot.events]
+        assert [a.id for a in replica.snapshot.agents] == [a.id for a in sim.agents]
+
+    @pytest.mark.asyncio
+    async def test_segments_rotate_with_checkpoints(self, tmp_path):
+        sim, publisher = _sim(), Publisher(tmp_path, segment_bytes=1)
+        current, behind = Replica(tmp_path), Replica(tmp_path)
+        _publish(sim, publisher)
+        current.refresh()
+        behind.refresh()
+        sub = current.hub.subscribe(parse_filter(types=["system"]))
+        for n in range(4):
+            sim.add_event("system", f"event {n}")
+            _publish(sim, publisher)
+            current.refresh()
+        # Every publish starts a segment; only the last two are kept.
+        assert sorted(p.name for p in tmp_path.glob("journal.*.bin")) == ["journal.4.bin", "journal.5.bin"]
+        # Following along, the replica read every record and skipped the checkpoints.
+        assert len(sub.take()) == 4
+        late = Replica(tmp_path)
+        for replica in (current, behind, late):
+            replica.refresh()
+            assert replica.stats()["journalSegment"] == 5
+            assert [e.message for e in replica.snapshot.events] == [e.message for e in sim.events]
+            assert [(t.id, t.version) for t in replica.snapshot.tasks] == [(t.id, t.version) for t in sim.tasks]
+            assert replica.snapshot.agents_by_id.keys() == sim.agents_by_id.keys()
+
+
+class TestRemoteCommands:
+    @pytest.mark.asyncio
+    async def test_write_visible_when_acknowledged(self, tmp_path):
+        server = asyncio.create_task(serve_engine(tmp_path, Simulation(create_all_agents(), tick_interval_ms=60_000), WRITES))
+        replica = Replica(tmp_path)
+        # A write must wake the refresh loop rather than wait out its interval.
+        refresher = asyncio.create_task(replica.run(60_000))
+        try:
+            await replica.wait_ready(5)
+            for _ in range(100):
+                if (tmp_path / "engine.sock").exists():
+                    break
+                await asyncio.sleep(0.01)
+            assert stat.S_IMODE((tmp_path / "engine.sock").stat().st_mode) == 0o600
+            assert await replica.submit("bonus", {"agent_id": "tech-talent", "amount": 7}) == 7
+            assert replica.snapshot.agents_by_id["tech-talent"].stats.credits_earned == 7
+            with pytest.raises(CommandError, match="nope") as failed:
+                await replica.submit("fail", {})
+            assert failed.value.type == "ValueError"
+            # Only the writes the engine was given by name can run.
+            with pytest.raises(CommandError, match="unknown command"):
+                await replica.submit("exec", {})
+        finally:
+            refresher.cancel()
+            server.cancel()
+            await asyncio.gather(refresher, server, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_fails_waiting_writes(self, tmp_path, caplog):
+        server = asyncio.create_task(serve_engine(tmp_path, Simulation(create_all_agents(), tick_interval_ms=60_000), WRITES))
+        replica = Replica(tmp_path)
+        try:
+            await replica.wait_ready(5)
+            for _ in range(100):
+                if (tmp_path / "engine.sock").exists():
+                    break
+                await asyncio.sleep(0.01)
+            load = replica._load
+
+            def broken():
+                raise OSError("disk gone")
+
+            replica._load = broken
+            refresher = asyncio.create_task(replica.run(60_000))
+            await asyncio.sleep(0)
+            with pytest.raises(RuntimeError, match="refresh failed"):
+                await replica.submit("bonus", {"agent_id": "tech-talent", "amount": 7})
+            stats = replica.stats()
+            assert stats["running"] and stats["refreshErrors"] >= 1
+            assert "replica refresh failed" in caplog.text
+            # Polling carries on and starts over from the checkpoint.
+            replica._load = load
+            assert await replica.submit("bonus", {"agent_id": "tech-talent", "amount": 1}) == 8
+            assert replica.snapshot.agents_by_id["tech-talent"].stats.credits_earned == 8
+            refresher.cancel()
+            await asyncio.gather(refresher, return_exceptions=True)
+            assert not replica.stats()["running"]
+            with pytest.raises(RuntimeError, match="not refreshing"):
+                await replica.submit("bonus", {"agent_id": "tech-talent", "amount": 1})
+        finally:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
@@ -1,15 +1,17 @@
 """Unit tests for the deterministic simulation engine."""
 
+import time
+
 import pytest
 
-from app.agents import create_all_agents, create_coo
+from app.agents import create_all_agents, create_coo, make_agent
 from app.simulation import (
     Simulation,
     detect_domain,
     detect_domains,
     parse_order_into_tasks,
 )
-from app.types import AgentRole, AgentStatus, TaskPriority, TaskStatus
+from app.types import ACPType, AgentRole, AgentStatus, Inbox, InboxPolicy, SandboxTask, TaskPriority, TaskStatus
 
 
 # ── Domain detection ─────────────────────────────────────────────────────────
@@ -225,6 +227,10 @@ class TestWorkProgression:
         if done_count > 0:
             total_credits = sum(a.stats.credits_earned for a in sim.agents)
             assert total_credits > 0
+            assert sim.credits.total_earned == total_credits
+            entry = sim.credits[0]
+            assert entry.trigger_type == "task_completion"
+            assert entry.balance_after == entry.amount
 
     @pytest.mark.asyncio
     async def test_messages_generated_during_work(self):
@@ -240,6 +246,34 @@ class TestWorkProgression:
         total_messages = sum(a.stats.messages_sent for a in sim.agents)
         assert total_messages > 0
 
+    @pytest.mark.asyncio
+    async def test_task_messages_indexed_once(self):
+        agents = create_all_agents()
+        sim = Simulation(agents, tick_interval_ms=100)
+        for _ in range(16):
+            await sim.run_tick()
+
+        sim.process_order("Fix critical login bug")
+        for _ in range(10):
+            await sim.run_tick()
+
+        task = sim.tasks[0]
+        activity = sim.messages.for_task(task.id)
+        assert activity
+        assert all(m.task_id == task.id for m in activity)
+        assert len({m.id for m in sim.messages}) == len(sim.messages)
+
+    def test_unblocked_task_shows_as_updated(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        task = SandboxTask(id="t-blocked", title="Stuck", description="", priority=TaskPriority.HIGH, creator_id="mr-krabs", status=TaskStatus.BLOCKED)
+        sim.add_task(task)
+        before = task.updated_at
+        task._blocked_ticks = 3
+        time.sleep(0.002)
+        sim._tick_unblock(sim.agents_by_id["mr-krabs"])
+        assert task.status == TaskStatus.IN_PROGRESS and task.updated_at > before
+        assert task in list(sim.task_index.select(sim.tasks, {}, before))
+
 
 class TestRestart:
     @pytest.mark.asyncio
@@ -264,24 +298,148 @@ class TestRestart:
         assert sim.tick == 0
 
 
+class TestInboxes:
+    @pytest.mark.asyncio
+    async def test_coo_inbox_drained_each_tick(self):
+        sim = Simulation(create_coo(), tick_interval_ms=100)
+        coo = sim.agents[0]
+        for i in range(5):
+            sim.push_message(sim.make_acp(ACPType.DELEGATION, "human-principal", coo.id, body=f"order {i}"))
+        assert len(coo.inbox) == 5
+        await sim.run_tick()
+        assert len(coo.inbox) == 0
+        assert coo.inbox.consumed == 5
+        assert coo.last_acted_tick == 1
+
+    @pytest.mark.asyncio
+    async def test_deliveries_touch_recipient_once_per_tick(self):
+        sim = Simulation(create_coo(), tick_interval_ms=100)
+        coo = sim.agents[0]
+        agents_version = sim.collection_versions["agents"]
+        for i in range(5):
+            sim.push_message(sim.make_acp(ACPType.DELEGATION, "human-principal", coo.id, body=f"order {i}"))
+        assert sim.collection_versions["agents"] == agents_version
+        before = coo.version
+        await sim.run_tick()
+        assert coo.version > before
+        assert sim.snapshot().agents_by_id[coo.id].inbox.consumed == 5
+
+    def test_coo_inbox_bounded(self):
+        sim = Simulation(create_coo(), tick_interval_ms=100)
+        coo = sim.agents[0]
+        for i in range(coo.inbox.capacity + 10):
+            sim.push_message(sim.make_acp(ACPType.DELEGATION, "human-principal", coo.id, body=f"order {i}"))
+        assert len(coo.inbox) == coo.inbox.capacity
+        assert coo.inbox.dropped == 10
+
+    def test_inbox_settings_apply_to_every_agent(self):
+        sim = Simulation(create_coo(), tick_interval_ms=100, inbox_capacity=3, inbox_policy=InboxPolicy.COALESCE_TASK)
+        sim.add_agent(make_agent("hired", "Hired", AgentRole.WORKER, 4, "Engineering", "mr-krabs"))
+        sim.reset("full")
+        sim.add_agent(make_agent("spawned", "Spawned", AgentRole.WORKER, 4, "Engineering", "mr-krabs"), Inbox(capacity=1))
+        assert {(a.inbox.capacity, a.inbox.policy) for a in sim.agents[:-1]} == {(3, InboxPolicy.COALESCE_TASK)}
+        assert sim.agents[-1].inbox.capacity == 1
+
+    @pytest.mark.asyncio
+    async def test_backpressure_throttles_sender(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        coo = sim.agents_by_id["mr-krabs"]
+        coo.inbox = Inbox(capacity=1, policy=InboxPolicy.BACKPRESSURE)
+        assert sim.push_message(sim.make_acp(ACPType.ESCALATION, "support-lead", coo.id))
+        assert not sim.push_message(sim.make_acp(ACPType.ESCALATION, "support-lead", coo.id))
+        assert sim.agents_by_id["support-lead"].throttled_until_tick == sim.tick + 1
+        assert len(sim.messages) == 2
+
+
+class TestVersions:
+    @pytest.mark.asyncio
+    async def test_changed_entities_get_newer_versions(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        for _ in range(16):
+            await sim.run_tick()
+        sim.process_order("Fix critical login bug")
+        for _ in range(3):
+            await sim.run_tick()
+        task = sim.tasks[0]
+        before = task.version
+        assert before > 0
+        for _ in range(20):
+            await sim.run_tick()
+        if task.status != TaskStatus.ASSIGNED:
+            assert task.version > before
+        assert sim.version >= max(t.version for t in sim.tasks)
+        assert sim.version >= max(a.version for a in sim.agents)
+
+    @pytest.mark.asyncio
+    async def test_spawn_activation_bumps_agent_version(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        pending = sim._spawn_queue[0]
+        before = pending.version
+        await sim.run_tick()
+        assert pending.status == AgentStatus.ACTIVE
+        assert pending.version > before
+
+
+    @pytest.mark.asyncio
+    async def test_collection_tags_move_independently(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        agents_tag = sim.collection_tag("agents")
+        events_tag = sim.collection_tag("events")
+        sim.add_event("system", "hello")
+        assert sim.collection_tag("agents") == agents_tag
+        assert sim.collection_tag("events") != events_tag
+        assert sim.collection_tag() == sim.state_tag
+
+    @pytest.mark.asyncio
+    async def test_restart_changes_every_collection(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        before = {c: sim.collection_tag(c) for c in ("tasks", "messages", "metrics")}
+        await sim.restart()
+        assert all(sim.collection_tag(c) != tag for c, tag in before.items())
+
+class TestIds:
+    @pytest.mark.asyncio
+    async def test_event_ids_monotonic(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        for _ in range(5):
+            await sim.run_tick()
+        ids = [e.id for e in sim.events]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    @pytest.mark.asyncio
+    async def test_ids_survive_restart(self):
+        sim = Simulation(create_coo(), tick_interval_ms=100)
+        last = sim.events[-1].id
+        await sim.restart("organic")
+        assert sim.events[0].id > last
+
+    @pytest.mark.asyncio
+    async def test_task_ids_per_simulation(self):
+        a = Simulation(create_all_agents(), tick_interval_ms=100)
+        b = Simulation(create_all_agents(), tick_interval_ms=100)
+        for sim in (a, b):
+            for _ in range(16):
+                await sim.run_tick()
+            sim.process_order("Fix critical login bug")
+            for _ in range(3):
+                await sim.run_tick()
+        assert a.tasks[0].id == b.tasks[0].id == "TASK-0001"
+
+
 class TestEventSystem:
     @pytest.mark.asyncio
-    async def test_sse_listener_receives_events(self):
+    async def test_hub_subscriber_receives_events(self):
         agents = create_all_agents()
         sim = Simulation(agents, tick_interval_ms=100)
-        received = []
-        sim.on_event(lambda e: received.append(e))
+        sub = sim.hub.subscribe()
         await sim.run_tick()
-        assert len(received) > 0
+        assert len(sub.take()) > 0
 
     @pytest.mark.asyncio
-    async def test_sse_unsubscribe(self):
+    async def test_hub_unsubscribe(self):
         sim = Simulation(create_coo(), tick_interval_ms=100)
-        received = []
-        unsub = sim.on_event(lambda e: received.append(e))
-        unsub()
-        await sim.run_tick()
-        # Should only have events from before unsub (boot events)
-        boot_count = len(received)
+        sub = sim.hub.subscribe()
+        sim.hub.unsubscribe(sub)
         await sim.run_tick()
-        assert len(received) == boot_count  # No new events after unsub
+        assert sub.take() == []
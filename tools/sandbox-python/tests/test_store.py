@@ -0,0 +1,250 @@
+"""Unit tests for the append-only stores."""
+
+import pytest
+
+from app.store import COLD_PAGE, ChangeLog, ConversationIndex, CreditLedger, LogPrefix, MessageLog, TaskActivity
+from app.types import ACPMessage, ACPType
+
+
+def _msg(id: str, from_agent: str = "a", to: str = "b", task_id: str = "") -> ACPMessage:
+    return ACPMessage(id=id, type=ACPType.PROGRESS, from_agent=from_agent, to=to, task_id=task_id)
+
+
+class TestMessageLog:
+    def test_append_returns_offsets(self):
+        log = MessageLog()
+        assert log.append(_msg("m1")) == 0
+        assert log.append(_msg("m2")) == 1
+        assert len(log) == 2
+        assert log[1].id == "m2"
+
+    def test_stored_once_viewed_by_both_agents(self):
+        log = MessageLog()
+        log.append(_msg("m1", "a", "b"))
+        assert [m.id for m in log.for_agent("a")] == ["m1"]
+        assert [m.id for m in log.for_agent("b")] == ["m1"]
+        assert log.for_agent("a")[0] is log.for_agent("b")[0]
+
+    def test_self_message_indexed_once(self):
+        log = MessageLog()
+        log.append(_msg("m1", "a", "a"))
+        assert log.agent_offsets("a") == [0]
+
+    def test_task_view(self):
+        log = MessageLog()
+        log.append(_msg("m1", task_id="TASK-0001"))
+        log.append(_msg("m2"))
+        log.append(_msg("m3", task_id="TASK-0001"))
+        assert [m.id for m in log.for_task("TASK-0001")] == ["m1", "m3"]
+        assert log.for_task("TASK-9999") == []
+
+    def test_full_agent_history(self):
+        log = MessageLog()
+        for i in range(25):
+            log.append(_msg(f"m{i}"))
+        assert len(log.for_agent("a")) == 25
+
+    def test_recent_newest_first(self):
+        log = MessageLog()
+        for i in range(5):
+            log.append(_msg(f"m{i}"))
+        assert [m.id for m in log.recent(2)] == ["m4", "m3"]
+        assert len(log.recent(50)) == 5
+        assert log.recent(0) == []
+
+
+class TestTaskActivity:
+    def test_hot_window_bounded(self):
+        log = MessageLog(activity_window=3)
+        for i in range(10):
+            log.append(_msg(f"m{i}", task_id="TASK-0001"))
+        activity = log.task_activity("TASK-0001")
+        assert isinstance(activity, TaskActivity)
+        assert len(activity.hot) == 3
+        assert [m.id for m in log.for_task("TASK-0001")] == ["m7", "m8", "m9"]
+        assert activity.total == 10
+        assert activity.compacted == 7
+        assert activity.compacted_by_type == {"progress": 7}
+
+    def test_page_walks_full_history(self):
+        log = MessageLog(activity_window=2)
+        for i in range(7):
+            log.append(_msg(f"m{i}", task_id="TASK-0001"))
+            log.append(_msg(f"x{i}", task_id="TASK-0002"))
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = log.task_page("TASK-0001", cursor, limit=3)
+            pages.append([m.id for m in page])
+            if cursor is None:
+                break
+        assert pages == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"]]
+
+    def test_snapshot_pages_stop_at_its_history(self):
+        log = MessageLog(activity_window=2)
+        for i in range(4):
+            log.append(_msg(f"m{i}", task_id="TASK-0001"))
+        snap = log.snapshot()
+        for i in range(4, 8):
+            log.append(_msg(f"m{i}", task_id="TASK-0001"))
+        assert [o for page in log.task_activity("TASK-0001").cold for o in page] == [0, 1, 2, 3, 4, 5]
+        page, cursor = snap.task_page("TASK-0001", limit=3)
+        assert [m.id for m in page] == ["m1", "m2", "m3"]
+        assert [m.id for m in snap.task_page("TASK-0001", cursor)[0]] == ["m0"]
+
+    def test_cold_index_bounded(self):
+        log = MessageLog(activity_window=2, activity_history=2 * COLD_PAGE)
+        for i in range(2 + 3 * COLD_PAGE + 10):
+            log.append(_msg(f"m{i}", task_id="TASK-0001"))
+        snap = log.snapshot()
+        for i in range(2 + 3 * COLD_PAGE + 10, 2 + 4 * COLD_PAGE + 10):
+            log.append(_msg(f"m{i}", task_id="TASK-0001"))
+        activity = log.task_activity("TASK-0001")
+        assert len(activity.cold) == 2
+        assert activity.compacted == 4 * COLD_PAGE + 10
+        assert activity.expired == 3 * COLD_PAGE and activity.retained == COLD_PAGE + 10
+        # Paging ends at the oldest message still indexed.
+        history, cursor = [], None
+        while True:
+            page, cursor = log.task_page("TASK-0001", cursor, limit=100)
+            history[:0] = page
+            if cursor is None:
+                break
+        assert [m.id for m in history] == [f"m{i}" for i in range(3 * COLD_PAGE, 2 + 4 * COLD_PAGE + 10)]
+        # A snapshot keeps the pages it was taken with.
+        page, _ = snap.task_page("TASK-0001", limit=COLD_PAGE + 12)
+        assert page[0].id == f"m{2 * COLD_PAGE}"
+
+    def test_page_rejects_foreign_cursor(self):
+        log = MessageLog()
+        log.append(_msg("m0", task_id="TASK-0001"))
+        log.append(_msg("x0", task_id="TASK-0002"))
+        assert log.task_page("TASK-0001", cursor=1) == ([], None)
+        assert log.task_page("TASK-0001", cursor=99) == ([], None)
+
+    def test_unknown_task(self):
+        log = MessageLog()
+        assert log.task_page("TASK-0001") == ([], None)
+
+    @pytest.mark.parametrize("window", [0, -1])
+    def test_window_must_hold_a_message(self, window):
+        with pytest.raises(ValueError, match="activity window"):
+            MessageLog(activity_window=window)
+
+
+class TestChangeLog:
+    def test_classifies_changes_after_version(self):
+        log = ChangeLog()
+        log.record("a", 1, created=True)
+        log.record("b", 2, created=True)
+        log.record("a", 3)
+        log.record("c", 4, created=True)
+        assert log.since(0) == (["b", "a", "c"], [], [])
+        assert log.since(2) == (["c"], ["a"], [])
+        assert log.since(4) == ([], [], [])
+
+    def test_removed(self):
+        log = ChangeLog()
+        log.record("a", 1, created=True)
+        log.record("b", 2, created=True)
+        log.record("a", 3, removed=True)
+        log.record("b", 4, removed=True)
+        assert log.since(1) == ([], [], ["a"])
+        assert log.since(0) == ([], [], [])
+
+    def test_one_entry_per_entity(self):
+        log = ChangeLog()
+        for v in range(1, 101):
+            log.record("a", v)
+        assert len(log) == 1
+
+    def test_retention_raises_floor(self):
+        log = ChangeLog(retention=2)
+        log.record("a", 1, created=True)
+        log.record("b", 2, created=True)
+        log.record("c", 3, created=True)
+        assert log.floor == 1
+        assert log.since(0) is None
+        assert log.since(1) == (["b", "c"], [], [])
+
+    def test_reset(self):
+        log = ChangeLog()
+        log.record("a", 1, created=True)
+        log.reset(5)
+        assert len(log) == 0
+        assert log.since(4) is None
+        assert log.since(5) == ([], [], [])
+
+
+class TestConversationIndex:
+    def test_updated_on_append(self):
+        log = MessageLog()
+        log.append(_msg("m1", "a", "b"))
+        log.append(_msg("m2", "b", "a"))
+        log.append(_msg("m3", "a", "c"))
+        conv = log.conversations.get("b", "a")
+        assert (conv.a, conv.b, conv.count, conv.last) == ("a", "b", 2, 1)
+        assert len(log.conversations) == 2
+
+    def test_recency_order_and_pages(self):
+        index = ConversationIndex()
+        for offset, (f, t) in enumerate([("a", "b"), ("a", "c"), ("b", "c"), ("b", "a")]):
+            index.record(_msg(f"m{offset}", f, t), offset)
+        assert [(c.a, c.b) for c in index.recent()] == [("a", "b"), ("b", "c"), ("a", "c")]
+        first = index.recent(limit=2)
+        assert [(c.a, c.b) for c in index.recent(limit=2, before=first[-1].last)] == [("a", "c")]
+
+
+class TestCreditLedger:
+    def test_running_balances(self):
+        ledger = CreditLedger()
+        ledger.record("a", 50, "reward", "task_completion")
+        ledger.record("b", 25, "reward", "task_completion")
+        entry = ledger.record("a", -20, "tokens", "model_usage")
+        assert (entry.id, entry.balance_after) == (2, 30)
+        assert (ledger.balance("a"), ledger.balance("b"), ledger.balance("c")) == (30, 25, 0)
+        assert (ledger.total_earned, ledger.total_spent) == (75, 20)
+
+    def test_agent_pages_newest_first(self):
+        ledger = CreditLedger()
+        for i in range(5):
+            ledger.record("a", i, "reward", "task_completion")
+            ledger.record("b", i, "reward", "task_completion")
+        page, cursor = ledger.page("a", limit=2)
+        assert [e.amount for e in page] == [4, 3]
+        page, cursor = ledger.page("a", before=cursor, limit=2)
+        assert [e.amount for e in page] == [2, 1]
+        page, cursor = ledger.page("a", before=cursor, limit=2)
+        assert ([e.amount for e in page], cursor) == ([0], None)
+        assert ledger.page("nobody") == ([], None)
+
+    def test_whole_ledger_with_offset(self):
+        ledger = CreditLedger()
+        for i in range(4):
+            ledger.record("a" if i % 2 else "b", i, "reward", "task_completion")
+        page, cursor = ledger.page(limit=2, offset=1)
+        assert ([e.id for e in page], cursor) == ([2, 1], 1)
+        assert ledger.page(offset=10) == ([], None)
+
+
+class TestSnapshots:
+    def test_log_prefix_ignores_later_appends(self):
+        items = [1, 2, 3]
+        view = LogPrefix(items)
+        items.append(4)
+        assert (len(view), view[-1], view[-2:], list(view)) == (3, 3, [2, 3], [1, 2, 3])
+
+    def test_change_log_copy_is_independent(self):
+        log = ChangeLog()
+        log.record("a", 1, created=True)
+        frozen = log.copy()
+        log.record("b", 2, created=True)
+        assert frozen.since(0) == (["a"], [], [])
+
+    def test_ledger_snapshot_pages_up_to_its_end(self):
+        ledger = CreditLedger()
+        ledger.record("a", 5, "r", "t")
+        snap = ledger.snapshot()
+        ledger.record("a", 7, "r", "t")
+        assert [e.amount for e in snap.page("a")[0]] == [5]
+        assert [e.amount for e in snap.page()[0]] == [5]
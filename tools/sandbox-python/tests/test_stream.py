@@ -0,0 +1,353 @@
+"""Unit tests for the stream broadcast hub."""
+
+import asyncio
+import itertools
+import json
+
+import pytest
+
+from app.agents import create_all_agents
+from app.simulation import Simulation
+from app.stream import (
+    ACP,
+    EVENT,
+    HEARTBEAT,
+    SLOW_CONSUMER,
+    SSE,
+    WS_CODECS,
+    BroadcastHub,
+    StreamFilter,
+    StreamItem,
+    Subscriber,
+    coalesce_events,
+    parse_filter,
+)
+from app.types import ACPType
+
+_ids = itertools.count(1)
+
+
+def _event(agent_id=None, task_id=None, type="agent_action", data=None, id=None) -> StreamItem:
+    agents = (agent_id,) if agent_id else ()
+    return StreamItem(next(_ids) if id is None else id, EVENT, type, agents, task_id, {} if data is None else data)
+
+
+def _payloads(chunk: bytes) -> list[bytes]:
+    return [line[6:] for line in chunk.split(b"\r\n") if line.startswith(b"data: ")]
+
+
+class TestStreamFilter:
+    def test_parse_repeated_and_comma_separated(self):
+        f = parse_filter(agents=["a,b", "c"], types=[""])
+        assert f.agents == {"a", "b", "c"}
+        assert f.types is None and f.tasks is None
+
+    def test_every_dimension_must_match(self):
+        f = StreamFilter(agents=frozenset({"a"}), types=frozenset({"system"}))
+        assert f.matches(_event("a", type="system"))
+        assert not f.matches(_event("a"))
+        assert not f.matches(_event("b", type="system"))
+
+    def test_org_matches_lineage(self):
+        f = StreamFilter(orgs=frozenset({"boss"}))
+        assert f.matches(_event("intern"), ("intern", "lead", "boss"))
+        assert not f.matches(_event("intern"), ("intern", "other"))
+
+    def test_indexed_under_most_selective_dimension(self):
+        f = StreamFilter(agents=frozenset({"a"}), tasks=frozenset({"t"}), types=frozenset({"x"}))
+        assert f.index_key() == ("tasks", frozenset({"t"}))
+        assert StreamFilter().index_key() is None
+
+
+class TestSubscriber:
+    def test_drain_joins_buffered_frames(self):
+        sub = Subscriber()
+        sub.push(b"a")
+        sub.push(b"b")
+        assert sub.drain() == b"ab"
+        assert len(sub) == 0
+
+    def test_full_buffer_drops_oldest(self):
+        sub = Subscriber(capacity=2, max_dropped=5)
+        for frame in (b"1", b"2", b"3"):
+            assert sub.push(frame)
+        assert (sub.drain(), sub.dropped) == (b"23", 1)
+
+    def test_closed_when_too_far_behind(self):
+        sub = Subscriber(capacity=1, max_dropped=1)
+        assert sub.push(b"1") and sub.push(b"2")
+        assert not sub.push(b"3")
+        assert sub.closed
+        assert sub.drain() == SSE.control(SLOW_CONSUMER)
+
+    def test_lag_resets_when_drained(self):
+        sub = Subscriber(capacity=1, max_dropped=1)
+        for _ in range(5):
+            assert sub.push(b"1") and sub.push(b"2")
+            sub.drain()
+        assert sub.dropped == 5
+        assert not sub.closed
+
+    def test_replay_larger_than_buffer_survives_live_pushes(self):
+        sub = Subscriber(capacity=4, max_dropped=4)
+        replayed = [f"r{i}".encode() for i in range(10)]
+        sub.preload(replayed)
+        for i in range(5):
+            assert sub.push(f"l{i}".encode())
+        assert not sub.closed and sub.dropped == 1
+        assert sub.take() == replayed + [b"l1", b"l2", b"l3", b"l4"]
+
+    @pytest.mark.asyncio
+    async def test_next(self):
+        sub = Subscriber()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(sub.next(), 0.01)
+        sub.push(b"x")
+        assert await sub.next() == b"x"
+        sub.closed = True
+        assert await sub.next() is None
+
+
+class TestBroadcastHub:
+    def test_same_bytes_to_every_matching_subscriber(self):
+        hub = BroadcastHub()
+        everyone = hub.subscribe()
+        krabs = hub.subscribe(parse_filter(agents=["mr-krabs"]))
+        other = hub.subscribe(parse_filter(tasks=["TASK-0002"]))
+        hub.publish(_event("mr-krabs", "TASK-0001"))
+        assert everyone._frames[0] is krabs._frames[0]
+        assert len(other) == 0
+
+    def test_routes_only_to_candidates(self):
+        hub = BroadcastHub()
+        subs = [hub.subscribe(parse_filter(agents=[f"agent-{i}"])) for i in range(100)]
+        typed = hub.subscribe(parse_filter(types=["system"]))
+        event = _event("agent-7")
+        assert hub.candidates(event, ()) == {subs[7]}
+        hub.publish(event)
+        assert [i for i, s in enumerate(subs) if len(s)] == [7]
+        assert len(typed) == 0
+
+    def test_multi_value_subscriber_receives_once(self):
+        hub = BroadcastHub(lineage=lambda agent_id: (agent_id, "lead", "boss"))
+        sub = hub.subscribe(parse_filter(orgs=["lead,boss"]))
+        hub.publish(_event("intern"))
+        assert sub.drain().count(b"data: ") == 1
+
+    def test_refilter_and_unsubscribe(self):
+        hub = BroadcastHub()
+        sub = hub.subscribe(parse_filter(tasks=["t1"]))
+        hub.refilter(sub, parse_filter(tasks=["t2"]))
+        hub.publish(_event(task_id="t1", data=1))
+        hub.publish(_event(task_id="t2", data=2))
+        assert _payloads(sub.drain()) == [b"2"]
+        hub.unsubscribe(sub)
+        hub.unsubscribe(sub)
+        assert len(hub) == 0
+        assert hub.stats()["indexed"]["tasks"] == 0
+
+    def test_frames_carry_event_ids(self):
+        hub = BroadcastHub(epoch="e1")
+        sub = hub.subscribe()
+        event = _event()
+        hub.publish(event)
+        assert sub.drain() == f"id: e1.{event.id}\r\ndata: {{}}\r\n\r\n".encode()
+
+    def test_slow_subscriber_removed(self):
+        hub = BroadcastHub(capacity=1, max_dropped=0)
+        slow = hub.subscribe()
+        hub.publish(_event())
+        hub.publish(_event())
+        assert slow.closed
+        assert len(hub) == 0
+        assert hub.stats()["slowDisconnects"] == 1
+
+
+class TestReplay:
+    def _hub(self, replay=8):
+        hub = BroadcastHub(epoch="e1", replay=replay)
+        for i in range(1, 6):
+            hub.publish(_event(f"a{i % 2}", data=i, id=i))
+        return hub
+
+    def test_replays_only_missed_events(self):
+        hub = self._hub()
+        sub = hub.subscribe(last_event_id="e1.3")
+        assert _payloads(sub.drain()) == [b"4", b"5"]
+        assert hub.replayed == 2
+
+    def test_replay_respects_filter(self):
+        hub = self._hub()
+        sub = hub.subscribe(parse_filter(agents=["a1"]), last_event_id="e1.0")
+        assert _payloads(sub.drain()) == [b"1", b"3", b"5"]
+
+    def test_up_to_date_client_gets_nothing(self):
+        hub = self._hub()
+        assert len(hub.subscribe(last_event_id="e1.5")) == 0
+
+    def test_reset_when_gap_exceeds_retention(self):
+        hub = self._hub(replay=2)
+        assert hub.replay_floor[EVENT] == 3
+        assert _payloads(hub.subscribe(last_event_id="e1.3").drain()) == [b"4", b"5"]
+        chunk = hub.subscribe(last_event_id="e1.2").drain()
+        assert chunk.startswith(b"id: e1.5\r\n")
+        assert json.loads(_payloads(chunk)[0])["type"] == "reset"
+
+    def test_reset_on_foreign_or_malformed_id(self):
+        hub = self._hub()
+        for last_event_id in ("other.3", "e1.x", "e1.99", "7"):
+            assert json.loads(_payloads(hub.subscribe(last_event_id=last_event_id).drain())[0])["type"] == "reset"
+        assert hub.resets == 4
+
+
+class TestBatches:
+    def test_one_frame_per_flush(self):
+        hub = BroadcastHub(epoch="e1")
+        sub = hub.subscribe(batch=True)
+        live = hub.subscribe()
+        events = [_event("a", f"t{i}") for i in range(3)]
+        for e in events:
+            hub.publish(e)
+        assert len(sub) == 0 and len(live) == 3
+        hub.flush(7)
+        chunk = sub.drain()
+        assert chunk.startswith(f"id: e1.{events[-1].id}\r\n".encode())
+        batch = json.loads(_payloads(chunk)[0])
+        assert (batch["type"], batch["tick"], len(batch["events"])) == ("batch", 7, 3)
+        hub.flush(8)
+        assert len(sub) == 0
+
+    def test_same_filter_shares_one_frame(self):
+        hub = BroadcastHub()
+        subs = [hub.subscribe(parse_filter(agents=["a"]), batch=True) for _ in range(3)]
+        other = hub.subscribe(parse_filter(agents=["b"]), batch=True)
+        hub.publish(_event("a"))
+        hub.flush(1)
+        assert subs[0]._frames[0] is subs[2]._frames[0]
+        assert len(other) == 0
+        assert hub.batches == 1
+
+    def test_coalesce_keeps_last_update_per_task(self):
+        events = [_event(task_id="t1", data=1), _event(data=2), _event(task_id="t2", data=3), _event(task_id="t1", data=4)]
+        assert [e.data for e in coalesce_events(events)] == [2, 3, 4]
+        hub = BroadcastHub()
+        sub = hub.subscribe(coalesce=True)
+        for event in events:
+            hub.publish(event)
+        hub.flush(1)
+        assert json.loads(_payloads(sub.drain())[0])["events"] == [2, 3, 4]
+
+    def test_batched_replay(self):
+        hub = BroadcastHub(epoch="e1")
+        for i in (1, 2, 3):
+            hub.publish(_event(type="x", data=i, id=i))
+        batch = json.loads(_payloads(hub.subscribe(last_event_id="e1.1", batch=True).drain())[0])
+        assert (batch["tick"], batch["events"]) == (None, [2, 3])
+
+
+class TestHeartbeat:
+    def test_only_idle_subscribers(self):
+        hub = BroadcastHub()
+        busy, idle = hub.subscribe(), hub.subscribe(batch=True)
+        hub.publish(_event())
+        hub.heartbeat()
+        assert busy.drain().count(b"data: ") == 1
+        assert idle.drain() == SSE.control(HEARTBEAT)
+        hub.heartbeat()
+        assert busy.drain() == SSE.control(HEARTBEAT)
+        assert hub.heartbeats == 3
+
+
+class TestSimulationEmit:
+    def test_events_encoded_for_subscribers(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        sub = sim.hub.subscribe(parse_filter(agents=["mr-krabs"]))
+        sim.add_event("agent_action", "hello", agent_id="mr-krabs")
+        sim.add_event("agent_action", "ignored", agent_id="karen")
+        frame = sub.drain()
+        (payload,) = map(json.loads, _payloads(frame))
+        assert (payload["message"], payload["agentName"]) == ("hello", "Mr. Krabs")
+
+    def test_org_subtree(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        worker = next(a for a in sim.agents if sim.lineage(a.id)[-1] == "mr-krabs" and len(sim.lineage(a.id)) > 2)
+        manager = sim.lineage(worker.id)[1]
+        sub = sim.hub.subscribe(parse_filter(orgs=[manager]))
+        sim.add_event("agent_action", "in subtree", agent_id=worker.id)
+        sim.add_event("agent_action", "above it", agent_id="mr-krabs")
+        assert sub.drain().count(b"data: ") == 1
+
+    def test_acp_messages_published(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        sub = sim.hub.subscribe(parse_filter(agents=["karen"], kinds=[ACP]), codec=WS_CODECS["json"])
+        sim.push_message(sim.make_acp(ACPType.ACK, "karen", "mr-krabs", "TASK-0001"))
+        sim.add_event("agent_action", "not a message", agent_id="karen")
+        frame = json.loads(sub.drain())
+        assert (frame["kind"], frame["data"]["type"], frame["data"]["from"]) == ("acp", "ack", "karen")
+
+    @pytest.mark.asyncio
+    async def test_tick_flushes_batches(self):
+        sim = Simulation(create_all_agents(), tick_interval_ms=100)
+        sub = sim.hub.subscribe(batch=True)
+        await sim.run_tick()
+        chunks = _payloads(sub.drain())
+        assert len(chunks) == 1
+        assert json.loads(chunks[0])["tick"] == sim.tick
+
+
+class TestCodecs:
+    def _item(self):
+        item = StreamItem(3, ACP, "delegation", ("boss", "worker"), "t1", {"body": "go"})
+        item.key = "e1.3"
+        return item
+
+    def test_json_envelope(self):
+        codec = WS_CODECS["json"]
+        assert json.loads(self._item().frame(codec)) == {"id": "e1.3", "kind": "acp", "data": {"body": "go"}}
+        batch = json.loads(codec.batch([self._item()], 4, "e1.3"))
+        assert (batch["type"], batch["tick"], batch["items"][0]["kind"]) == ("batch", 4, "acp")
+        assert json.loads(codec.control(HEARTBEAT, "e1.3")) == {"type": "heartbeat", "id": "e1.3"}
+
+    def test_msgpack_envelope(self):
+        msgpack = pytest.importorskip("msgpack")
+        codec = WS_CODECS["msgpack"]
+        assert msgpack.unpackb(self._item().frame(codec)) == {"id": "e1.3", "kind": "acp", "data": {"body": "go"}}
+
+    def test_frames_encoded_once_per_codec(self):
+        item = self._item()
+        assert item.frame(SSE) is item.frame(SSE)
+        assert item.frame(WS_CODECS["json"]) is not item.frame(SSE)
+
+    def test_hub_sends_each_subscriber_its_codec(self):
+        hub = BroadcastHub(epoch="e1")
+        sse, ws = hub.subscribe(), hub.subscribe(codec=WS_CODECS["json"])
+        hub.publish(_event(data={"n": 1}))
+        assert _payloads(sse.drain()) == [b'{"n":1}']
+        assert json.loads(ws.drain())["data"] == {"n": 1}
+        assert hub.stats()["byCodec"]["json"] == 1
+
+
+class TestKinds:
+    def test_acp_matches_sender_or_recipient(self):
+        item = StreamItem(1, ACP, "delegation", ("boss", "worker"), None, {})
+        assert parse_filter(agents=["worker"]).matches(item)
+        assert not parse_filter(agents=["worker"], kinds=[EVENT]).matches(item)
+
+    def test_kind_filter_routes_and_replays_separately(self):
+        hub = BroadcastHub(epoch="e1", replay=2)
+        events, acp = hub.subscribe(parse_filter(kinds=[EVENT])), hub.subscribe(parse_filter(agents=["b"], kinds=[ACP]))
+        hub.publish(_event("b", id=1))
+        hub.publish(StreamItem(2, ACP, "ack", ("a", "b"), None, {}))
+        assert (len(events), len(acp)) == (1, 1)
+        for i in range(3, 6):
+            hub.publish(_event("b", id=i))
+        # The event ring has moved past 2, but ACP-only clients can still resume from it.
+        assert hub.replay_floor == {EVENT: 3, ACP: 0}
+        assert json.loads(_payloads(hub.subscribe(parse_filter(kinds=[EVENT]), "e1.1").drain())[0])["type"] == "reset"
+        assert len(hub.subscribe(parse_filter(kinds=[ACP]), "e1.1")) == 1
+
+    def test_changed_adds_and_removes_values(self):
+        f = parse_filter(agents=["a"]).changed(add={"agents": ["b"], "kinds": ["acp"]})
+        assert (f.agents, f.kinds) == ({"a", "b"}, {"acp"})
+        f = f.changed(remove={"agents": ["a", "b"]})
+        assert f.agents is None and f.index_key() is None
@@ -6,17 +6,21 @@ from app.types import (
     AgentRole,
     AgentStats,
     AgentStatus,
+    IdGenerator,
+    Inbox,
+    InboxPolicy,
     SandboxAgent,
     SandboxTask,
     TaskPriority,
     TaskStatus,
     TriggerMode,
+    parse_seq,
 )
 
 
 class TestACPMessage:
     def test_creates_with_defaults(self):
-        msg = ACPMessage(type=ACPType.ACK, **{"from": "agent-a"}, to="agent-b")
+        msg = ACPMessage(type=ACPType.ACK, from_agent="agent-a", to="agent-b")
         assert msg.id.startswith("acp-")
         assert msg.type == ACPType.ACK
         assert msg.from_agent == "agent-a"
@@ -27,9 +31,9 @@ class TestACPMessage:
     def test_creates_with_all_fields(self):
         msg = ACPMessage(
             type=ACPType.ESCALATION,
-            **{"from": "worker-1"},
+            from_agent="worker-1",
             to="lead-1",
-            taskId="TASK-0001",
+            task_id="TASK-0001",
             body="Blocked on dependency",
             reason="BLOCKED",
             pct=30,
@@ -38,6 +42,10 @@ class TestACPMessage:
         assert msg.reason == "BLOCKED"
         assert msg.pct == 30
 
+    def test_slotted_no_instance_dict(self):
+        msg = ACPMessage(type=ACPType.ACK, from_agent="a", to="b")
+        assert not hasattr(msg, "__dict__")
+
 
 class TestSandboxAgent:
     def test_default_stats(self):
@@ -46,7 +54,7 @@ class TestSandboxAgent:
         assert agent.stats.credits_earned == 0
         assert agent.status == AgentStatus.ACTIVE
         assert agent.trigger == TriggerMode.POLLING
-        assert agent.inbox == []
+        assert len(agent.inbox) == 0
         assert agent.task_ids == []
 
     def test_all_roles_valid(self):
@@ -62,7 +70,6 @@ class TestSandboxTask:
         assert task.priority == TaskPriority.NORMAL
         assert task.assignee_id is None
         assert task.acked is False
-        assert task.activity_log == []
 
     def test_all_statuses(self):
         for status in TaskStatus:
@@ -73,3 +80,68 @@ class TestSandboxTask:
         for priority in TaskPriority:
             task = SandboxTask(id="t", title="t", priority=priority)
             assert task.priority == priority
+
+
+class TestIdGenerator:
+    def test_monotonic_and_sortable(self):
+        ids = IdGenerator()
+        generated = [ids.acp_id() for _ in range(20)]
+        assert generated == sorted(generated)
+        assert len(set(generated)) == 20
+
+    def test_shared_sequence(self):
+        ids = IdGenerator()
+        first = ids.acp_id()
+        event_seq = ids.next()
+        second = ids.acp_id()
+        assert parse_seq(first) < event_seq < parse_seq(second)
+        assert ids.last == parse_seq(second)
+
+    def test_task_ids_independent(self):
+        ids = IdGenerator()
+        ids.acp_id()
+        assert ids.task_id() == "TASK-0001"
+        assert ids.task_id() == "TASK-0002"
+
+    def test_generators_are_independent(self):
+        a, b = IdGenerator(), IdGenerator()
+        a.acp_id()
+        assert b.acp_id() == "acp-0000000001"
+
+
+def _inbox_msg(id: str, task_id: str = "") -> ACPMessage:
+    return ACPMessage(id=id, type=ACPType.ESCALATION, from_agent="w", to="l", task_id=task_id)
+
+
+class TestInbox:
+    def test_drop_oldest_when_full(self):
+        inbox = Inbox(capacity=2)
+        for i in range(3):
+            assert inbox.push(_inbox_msg(f"m{i}"))
+        assert [m.id for m in inbox] == ["m1", "m2"]
+        assert inbox.dropped == 1
+
+    def test_coalesce_by_task(self):
+        inbox = Inbox(capacity=5, policy=InboxPolicy.COALESCE_TASK)
+        inbox.push(_inbox_msg("m1", "TASK-0001"))
+        inbox.push(_inbox_msg("m2", "TASK-0002"))
+        inbox.push(_inbox_msg("m3", "TASK-0001"))
+        assert [m.id for m in inbox] == ["m3", "m2"]
+        assert inbox.coalesced == 1
+
+    def test_backpressure_rejects(self):
+        inbox = Inbox(capacity=1, policy=InboxPolicy.BACKPRESSURE)
+        assert inbox.push(_inbox_msg("m1"))
+        assert not inbox.push(_inbox_msg("m2"))
+        assert [m.id for m in inbox] == ["m1"]
+        assert inbox.rejected == 1
+
+    def test_drain(self):
+        inbox = Inbox()
+        for i in range(5):
+            inbox.push(_inbox_msg(f"m{i}"))
+        assert [m.id for m in inbox.drain(3)] == ["m0", "m1", "m2"]
+        assert len(inbox) == 2
+        assert inbox.consumed == 3
+        inbox.drain()
+        assert len(inbox) == 0